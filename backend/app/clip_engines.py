@@ -0,0 +1,204 @@
+import os, logging
+from typing import Optional
+
+import numpy as np
+
+CLIP_ENGINE = os.getenv("CLIP_ENGINE", "torch")  # torch | int8 | onnx
+CLIP_THREADS = int(os.getenv("CLIP_THREADS", "0"))  # intra-op threads; 0 = library default
+CLIP_INTEROP_THREADS = int(os.getenv("CLIP_INTEROP_THREADS", "0"))  # inter-op threads; 0 = library default
+CLIP_ONNX_DIR = os.getenv("CLIP_ONNX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sceneit", "onnx"))
+CLIP_PARITY_CHECK = os.getenv("CLIP_PARITY_CHECK", "1") == "1"
+# Minimum cosine similarity between the fp32 model and the selected engine on the parity
+# sample. Below this, vectors would drift away from the ones already in the index.
+CLIP_PARITY_MIN_COSINE = float(os.getenv("CLIP_PARITY_MIN_COSINE", "0.99"))
+
+# Engines take processor output with return_tensors="np" and return float32 features.
+
+
+class TorchEngine:
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+        self.parity: Optional[float] = None
+
+    def image_features(self, pixel_values: np.ndarray) -> np.ndarray:
+        import torch
+
+        with torch.inference_mode():
+            feats = self.model.get_image_features(pixel_values=torch.from_numpy(pixel_values))
+        return feats.float().cpu().numpy()
+
+    def text_features(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        import torch
+
+        with torch.inference_mode():
+            feats = self.model.get_text_features(
+                input_ids=torch.from_numpy(input_ids.astype(np.int64)),
+                attention_mask=torch.from_numpy(attention_mask.astype(np.int64)),
+            )
+        return feats.float().cpu().numpy()
+
+
+class Int8Engine(TorchEngine):
+    """fp32 model with every nn.Linear dynamically quantised to int8 (weights int8, activations quantised per batch)."""
+    name = "int8"
+
+    def __init__(self, model):
+        import torch
+
+        super().__init__(torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8))
+
+
+class OnnxEngine:
+    """
+    ONNX Runtime sessions for the image and text towers. The towers are exported from the
+    fp32 model on first use and reused from `onnx_dir` afterwards.
+    """
+    name = "onnx"
+
+    def __init__(self, model, model_name: str, onnx_dir: str = CLIP_ONNX_DIR):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("CLIP_ENGINE=onnx needs the onnxruntime package (pip install onnx onnxruntime)") from e
+        self.parity: Optional[float] = None
+        out_dir = os.path.join(onnx_dir, model_name.replace("/", "__"))
+        image_path = os.path.join(out_dir, "image_tower.onnx")
+        text_path = os.path.join(out_dir, "text_tower.onnx")
+        if not (os.path.exists(image_path) and os.path.exists(text_path)):
+            _export_towers(model, image_path, text_path)
+
+        opts = ort.SessionOptions()
+        if CLIP_THREADS:
+            opts.intra_op_num_threads = CLIP_THREADS
+        if CLIP_INTEROP_THREADS:
+            opts.inter_op_num_threads = CLIP_INTEROP_THREADS
+            opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        providers = ["CPUExecutionProvider"]
+        self.image_sess = ort.InferenceSession(image_path, sess_options=opts, providers=providers)
+        self.text_sess = ort.InferenceSession(text_path, sess_options=opts, providers=providers)
+
+    def image_features(self, pixel_values: np.ndarray) -> np.ndarray:
+        return self.image_sess.run(None, {"pixel_values": pixel_values.astype(np.float32)})[0]
+
+    def text_features(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        return self.text_sess.run(None, {
+            "input_ids": input_ids.astype(np.int64),
+            "attention_mask": attention_mask.astype(np.int64),
+        })[0]
+
+
+def _export_towers(model, image_path: str, text_path: str) -> None:
+    import torch
+
+    class ImageTower(torch.nn.Module):
+        def __init__(self, m):
+            super().__init__()
+            self.m = m
+
+        def forward(self, pixel_values):
+            return self.m.get_image_features(pixel_values=pixel_values)
+
+    class TextTower(torch.nn.Module):
+        def __init__(self, m):
+            super().__init__()
+            self.m = m
+
+        def forward(self, input_ids, attention_mask):
+            return self.m.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    size = model.config.vision_config.image_size
+    logging.info(f"Exporting CLIP towers to ONNX in {os.path.dirname(image_path)}")
+    with torch.no_grad():
+        # Export to a temp name and rename, so a crashed export is never picked up as complete.
+        torch.onnx.export(
+            ImageTower(model), (torch.zeros(1, 3, size, size),), image_path + ".tmp",
+            input_names=["pixel_values"], output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=17,
+        )
+        ids = torch.ones(1, 8, dtype=torch.long)
+        torch.onnx.export(
+            TextTower(model), (ids, torch.ones_like(ids)), text_path + ".tmp",
+            input_names=["input_ids", "attention_mask"], output_names=["text_embeds"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "seq"}, "attention_mask": {0: "batch", 1: "seq"},
+                          "text_embeds": {0: "batch"}},
+            opset_version=17,
+        )
+    os.replace(image_path + ".tmp", image_path)
+    os.replace(text_path + ".tmp", text_path)
+
+
+def configure_threads() -> None:
+    import torch
+
+    if CLIP_THREADS:
+        torch.set_num_threads(CLIP_THREADS)
+    if CLIP_INTEROP_THREADS:
+        try:
+            torch.set_num_interop_threads(CLIP_INTEROP_THREADS)
+        except RuntimeError:
+            # Only settable before torch starts any inter-op work.
+            logging.warning("CLIP_INTEROP_THREADS ignored: torch inter-op pool already started")
+
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return (a * b).sum(axis=1)
+
+
+def parity_check(reference: TorchEngine, candidate, processor) -> float:
+    """Lowest cosine similarity between the two engines over a fixed sample of images and texts."""
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    ramp = np.linspace(0, 255, 224, dtype=np.float32)
+    images = [
+        Image.fromarray(rng.integers(0, 256, (224, 224, 3), dtype=np.uint8)),
+        Image.fromarray(np.stack([np.tile(ramp, (224, 1))] * 3, axis=-1).astype(np.uint8)),
+        Image.fromarray(np.stack([np.tile(ramp[:, None], (1, 224)), np.full((224, 224), 90.0), np.tile(ramp[::-1], (224, 1))], axis=-1).astype(np.uint8)),
+        Image.fromarray(np.full((224, 224, 3), 200, dtype=np.uint8)),
+    ]
+    texts = ["a dog on a couch", "car chase at night", "a man holding a red umbrella", "close-up of a face"]
+    pixels = processor(images=images, return_tensors="np")["pixel_values"]
+    tok = processor(text=texts, return_tensors="np", padding=True)
+    cos = np.concatenate([
+        _cosine_rows(reference.image_features(pixels), candidate.image_features(pixels)),
+        _cosine_rows(
+            reference.text_features(tok["input_ids"], tok["attention_mask"]),
+            candidate.text_features(tok["input_ids"], tok["attention_mask"]),
+        ),
+    ])
+    return float(cos.min())
+
+
+def load_engine(model, processor, model_name: str, engine: str = CLIP_ENGINE):
+    """
+    Build the configured engine from the fp32 model. Non-fp32 engines are parity-checked
+    against it (CLIP_PARITY_CHECK); one that falls below CLIP_PARITY_MIN_COSINE is
+    rejected and the fp32 engine is used instead.
+    """
+    configure_threads()
+    reference = TorchEngine(model)
+    if engine == "torch":
+        return reference
+    if engine == "int8":
+        candidate = Int8Engine(model)
+    elif engine == "onnx":
+        candidate = OnnxEngine(model, model_name)
+    else:
+        raise ValueError(f"Unknown CLIP_ENGINE: {engine}")
+    if not CLIP_PARITY_CHECK:
+        return candidate
+    candidate.parity = parity_check(reference, candidate, processor)
+    if candidate.parity < CLIP_PARITY_MIN_COSINE:
+        logging.error(
+            f"CLIP engine {engine} failed parity (min cosine {candidate.parity:.4f} < {CLIP_PARITY_MIN_COSINE}); "
+            "falling back to fp32 torch"
+        )
+        return reference
+    logging.info(f"CLIP engine {engine} passed parity (min cosine {candidate.parity:.4f})")
+    return candidate
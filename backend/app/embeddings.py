@@ -0,0 +1,339 @@
+import os, asyncio, hashlib, queue, re, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .clip_engines import CLIP_ENGINE, load_engine
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))  # seconds
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR") or None  # optional shared on-disk tier
+
+model_name = "openai/clip-vit-large-patch14"
+EMBED_DIM = 768  # CLIP L/14 projection dim; checked when the model loads
+
+# torch/transformers are imported on first use so routes that never embed
+# (presign, health) don't pay for them.
+_clip = None
+_clip_lock = threading.Lock()
+
+def get_clip():
+    """(processor, engine), loaded once per process on first call; see clip_engines for CLIP_ENGINE."""
+    global _clip
+    if _clip is None:
+        with _clip_lock:
+            if _clip is None:
+                from transformers import CLIPProcessor, CLIPModel
+
+                processor = CLIPProcessor.from_pretrained(model_name)
+                model = CLIPModel.from_pretrained(model_name)
+                model.eval()
+                if model.config.projection_dim != EMBED_DIM:
+                    raise RuntimeError(f"{model_name} has dim {model.config.projection_dim}, expected {EMBED_DIM}")
+                _clip = (processor, load_engine(model, processor, model_name))
+    return _clip
+
+def is_model_loaded() -> bool:
+    return _clip is not None
+
+def engine_info() -> Dict[str, Any]:
+    if _clip is None:
+        return {"engine": CLIP_ENGINE, "loaded": False}
+    engine = _clip[1]
+    return {"engine": engine.name, "loaded": True, "parity_min_cosine": engine.parity}
+
+
+def iter_images(paths: Iterable[str]) -> Iterator[Image.Image]:
+    """Decode images one at a time so only the current batch is ever held in memory."""
+    for p in paths:
+        with Image.open(p) as im:
+            yield im.convert("RGB")
+
+
+def l2_normalize_(arr: np.ndarray) -> np.ndarray:
+    """Row-wise L2 normalisation, in place."""
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    arr /= norms
+    return arr
+
+
+def _encode_batch(images: List[Image.Image], out: np.ndarray) -> None:
+    processor, engine = get_clip()
+    pixels = processor(images=images, return_tensors="np")["pixel_values"]
+    out[:] = engine.image_features(pixels)
+    l2_normalize_(out)
+
+
+def iter_embedding_batches(
+    images: Iterable[Image.Image],
+    out: np.ndarray,
+    batch_size: int = EMBED_BATCH_SIZE,
+) -> Iterator[Tuple[int, int]]:
+    """
+    Encode `images` into the preallocated (N, EMBED_DIM) float32 array `out`, batch by batch.
+    Yields (start, stop) row ranges as soon as each batch has been written and normalised,
+    so callers can ship finished rows downstream while later batches are still encoding.
+    """
+    batch: List[Image.Image] = []
+    start = 0
+    for img in images:
+        batch.append(img)
+        if len(batch) == batch_size:
+            _encode_batch(batch, out[start:start + len(batch)])
+            yield start, start + len(batch)
+            start += len(batch)
+            batch = []
+    if batch:
+        _encode_batch(batch, out[start:start + len(batch)])
+        yield start, start + len(batch)
+        start += len(batch)
+    if start != len(out):
+        raise ValueError(f"Expected {len(out)} images, got {start}")
+
+
+def create_embeddings(source_list: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed image files into an (N, EMBED_DIM) float32 array of unit vectors, in `batch_size` chunks."""
+    out = np.empty((len(source_list), EMBED_DIM), dtype=np.float32)
+    for _ in iter_embedding_batches(iter_images(source_list), out, batch_size):
+        pass
+    return out
+
+
+# ---------- Query encoding ----------
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query vectors with a TTL, keyed on (model name, normalised text).
+    With `disk_dir` set, misses fall through to one .npy file per key there, which
+    several workers can share; entries past the TTL are ignored on either tier.
+    """
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE, ttl_s: float = QUERY_CACHE_TTL,
+                 disk_dir: Optional[str] = QUERY_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha1(f"{model}\0{normalize_query(text)}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_s:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        vec = self._disk_get(key, now)
+        with self._lock:
+            if vec is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, vec, now)
+        return vec
+
+    def put(self, key: str, vec: np.ndarray) -> None:
+        vec = np.asarray(vec, dtype=np.float32)
+        vec.setflags(write=False)  # shared between callers
+        now = time.time()
+        with self._lock:
+            self._insert(key, vec, now)
+        if self.disk_dir:
+            tmp = os.path.join(self.disk_dir, f".{key}.{os.getpid()}.{threading.get_ident()}.npy")
+            np.save(tmp, vec)
+            os.replace(tmp, os.path.join(self.disk_dir, f"{key}.npy"))  # atomic for concurrent readers
+
+    def _insert(self, key: str, vec: np.ndarray, now: float) -> None:
+        self._entries[key] = (now, vec)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[np.ndarray]:
+        if not self.disk_dir:
+            return None
+        path = os.path.join(self.disk_dir, f"{key}.npy")
+        try:
+            if now - os.path.getmtime(path) > self.ttl_s:
+                return None
+            vec = np.load(path)
+        except (OSError, ValueError):
+            return None
+        vec.setflags(write=False)
+        return vec
+
+    def clear(self) -> None:
+        """Drop the in-memory tier and reset the counters (the disk tier is left alone)."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "disk_dir": self.disk_dir,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+query_cache = QueryEmbeddingCache()
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """CLIP text embeddings for a batch of queries, one row per text; cached rows skip the model."""
+    keys = [QueryEmbeddingCache.key(f"{model_name}:{CLIP_ENGINE}", t) for t in texts]
+    out = np.empty((len(texts), EMBED_DIM), dtype=np.float32)
+    todo: Dict[str, List[int]] = {}  # normalised text -> rows still to encode
+    for i, (t, key) in enumerate(zip(texts, keys)):
+        vec = query_cache.get(key)
+        if vec is not None:
+            out[i] = vec
+        else:
+            todo.setdefault(normalize_query(t), []).append(i)
+    if todo:
+        processor, engine = get_clip()
+        uniq = list(todo)
+        tok = processor(text=[texts[todo[u][0]] for u in uniq], return_tensors="np", padding=True)
+        feats = engine.text_features(tok["input_ids"], tok["attention_mask"]).astype(np.float32)
+        for u, vec in zip(uniq, feats):
+            rows = todo[u]
+            out[rows] = vec
+            query_cache.put(keys[rows[0]], vec)
+    return out
+
+
+def encode_text(text: str) -> np.ndarray:
+    """CLIP text embedding for a search query; repeated queries are served from query_cache."""
+    return encode_texts([text])[0]
+
+
+def encode_images(images: List[Image.Image]) -> np.ndarray:
+    """CLIP image embeddings for uploaded query images (not cached)."""
+    processor, engine = get_clip()
+    pixels = processor(images=[im.convert("RGB") for im in images], return_tensors="np")["pixel_values"]
+    return engine.image_features(pixels).astype(np.float32)
+
+
+def encode_image(image: Image.Image) -> np.ndarray:
+    """CLIP image embedding for an uploaded query image (not cached)."""
+    return encode_images([image])[0]
+
+
+# ---------- Query micro-batching ----------
+
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "16"))
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+
+
+class QueryBatcher:
+    """
+    Async front end to a single inference thread. Concurrent callers enqueue their query and
+    await a future; the thread waits up to `window_ms` after the first arrival to gather at
+    most `max_batch` queries, encodes the texts and the images of that batch in one forward
+    pass each, then resolves every caller's future on its event loop.
+    query_cache is consulted on that thread (encode_texts), never on the event loop, as its
+    disk tier blocks.
+    """
+    def __init__(self, max_batch: int = QUERY_BATCH_MAX, window_ms: float = QUERY_BATCH_WINDOW_MS):
+        self.max_batch = max_batch
+        self.window_s = window_ms / 1000.0
+        self._q: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def encode_text(self, text: str) -> np.ndarray:
+        return await self._submit("text", text)
+
+    async def encode_image(self, image: Image.Image) -> np.ndarray:
+        return await self._submit("image", image)
+
+    async def _submit(self, kind: str, payload) -> np.ndarray:
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._q.put((kind, payload, fut, loop))
+        return await fut
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.window_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for kind, encode in (("text", encode_texts), ("image", encode_images)):
+                group = [b for b in batch if b[0] == kind]
+                if not group:
+                    continue
+                try:
+                    vecs = encode([b[1] for b in group])
+                except Exception as e:
+                    for _, _, fut, loop in group:
+                        loop.call_soon_threadsafe(_resolve, fut, None, e)
+                    continue
+                for (_, _, fut, loop), vec in zip(group, vecs):
+                    loop.call_soon_threadsafe(_resolve, fut, vec, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._q.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "largest_batch": self.largest_batch,
+            "max_batch": self.max_batch,
+            "window_ms": self.window_s * 1000.0,
+        }
+
+
+def _resolve(fut: "asyncio.Future", result, error: Optional[BaseException]) -> None:
+    if fut.done():  # caller went away (request cancelled)
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
+
+
+query_batcher = QueryBatcher()
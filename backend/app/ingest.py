@@ -0,0 +1,250 @@
+import os, hashlib, logging, queue, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .embeddings import EMBED_DIM, EMBED_BATCH_SIZE, iter_images, iter_embedding_batches
+from .manifest import IngestManifest, merge_ranges, subtract_ranges
+from .metrics import EMBED_PER_SECOND, UPLOADS_PER_SECOND, UPSERT_PER_SECOND, observe_rate
+from .storage import delete_keys
+
+UPLOAD_WORKERS = int(os.getenv("INGEST_UPLOAD_WORKERS", "8"))
+UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "4"))
+UPSERT_BATCH = 100
+QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "4"))  # embedding batches waiting for upsert
+
+_DONE = object()
+
+
+def video_id_from_s3_uri(s3_uri: str) -> str:
+    # s3://bucket/key
+    key = s3_uri.split("/", 3)[-1]
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def vector_id(vid: str, scene_i: int, thumb_j: int) -> str:
+    return f"{vid}:s{scene_i:03d}:t{thumb_j:02d}"
+
+
+def build_vector_records(
+    vid: str,
+    source: str,
+    shots: List[Tuple[float, float, int, int]],
+    thumb_timepoints: List[List[float]],
+    thumb_keys: List[List[str]],
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """(vector id, metadata) per thumbnail, in the same flat order as the embedding rows."""
+    records = []
+    for scene_i, (timepoints, scene_keys) in enumerate(zip(thumb_timepoints, thumb_keys)):
+        start_s, end_s, start_f, end_f = shots[scene_i]
+        for thumb_j, (t_sec, key) in enumerate(zip(timepoints, scene_keys)):
+            vec_id = vector_id(vid, scene_i, thumb_j)
+            meta = {
+                "video_id": vid,
+                "source_s3_uri": source,
+                "scene_index": scene_i,
+                "thumb_index": thumb_j,
+                "t_sec": float(t_sec),
+                "start_s": float(start_s),
+                "end_s": float(end_s),
+                "start_f": int(start_f),
+                "end_f": int(end_f),
+                "thumb_key": key
+            }
+            records.append((vec_id, meta))
+    return records
+
+
+def remove_checkpoint_outputs(s3_client, bucket: str, index, manifest: IngestManifest, vid: str,
+                              namespace: str) -> None:
+    """
+    Delete what an unfinished ingest already wrote -- upserted vectors, thumbnails and clips --
+    before its checkpoint is dropped for a fresh decode. That decode can find fewer shots or
+    thumbnails, and whatever it doesn't overwrite would stay searchable. `namespace` is used
+    for checkpoints that predate recording it.
+    """
+    thumb_keys_by_scene = manifest.stage("shots").get("thumb_keys_by_scene", [])
+    ids = [vector_id(vid, i, j) for i, keys in enumerate(thumb_keys_by_scene) for j in range(len(keys))]
+    upserted = [ids[r] for start, stop in manifest.upserted_ranges() for r in range(start, min(stop, len(ids)))]
+    namespace = manifest.stage("upsert").get("namespace", namespace)
+    if upserted:
+        index.delete(upserted, namespace)
+    keys = [k for scene in thumb_keys_by_scene for k in scene]
+    keys += [uri.split("/", 3)[-1] for uri in manifest.stage("clips").get("uris", [])]
+    delete_keys(s3_client, bucket, keys)
+    if upserted or keys:
+        logging.info(f"Removed {len(upserted)} vectors from {namespace} and {len(keys)} objects of a dropped checkpoint")
+
+
+def download_thumbnails(
+    s3_client,
+    bucket: str,
+    thumb_keys_by_scene: List[List[str]],
+    out_dir: str,
+    workers: int = UPLOAD_WORKERS,
+) -> List[List[str]]:
+    """Fetch already-uploaded thumbnails back to local paths (same nesting as the keys)."""
+    os.makedirs(out_dir, exist_ok=True)
+
+    def fetch(key: str) -> str:
+        path = os.path.join(out_dir, os.path.basename(key))
+        s3_client.download_file(bucket, key, path)
+        return path
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-download") as pool:
+        return [list(pool.map(fetch, scene_keys)) for scene_keys in thumb_keys_by_scene]
+
+
+class _StageFailed(Exception):
+    pass
+
+
+def _put(q: queue.Queue, item, failed: threading.Event) -> None:
+    # Blocking put (backpressure) that gives up if a consumer has already died.
+    while True:
+        if failed.is_set():
+            raise _StageFailed()
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def run_ingest_pipeline(
+    s3_client,
+    index,
+    namespace: str,
+    bucket: str,
+    thumbs_prefix: str,
+    thumb_paths_by_scene: Optional[List[List[str]]],
+    records: List[Tuple[str, Dict[str, Any]]],
+    embeddings: Optional[np.ndarray] = None,
+    images: Optional[Iterable[Image.Image]] = None,
+    upload: bool = True,
+    skip_ranges: Sequence[Sequence[int]] = (),
+    on_uploaded: Optional[Callable[[], None]] = None,
+    on_embedded: Optional[Callable[[np.ndarray], None]] = None,
+    on_upserted: Optional[Callable[[int, int], None]] = None,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    upload_workers: int = UPLOAD_WORKERS,
+    upsert_workers: int = UPSERT_WORKERS,
+    queue_depth: int = QUEUE_DEPTH,
+) -> np.ndarray:
+    """
+    Upload thumbnails, embed them and upsert the vectors as overlapping stages:
+
+      uploads  -- thread pool, one S3 PUT per thumbnail, runs for the whole ingest
+      embed    -- this thread, fills the (N, EMBED_DIM) array batch by batch
+      upsert   -- `upsert_workers` threads draining a bounded queue of finished row ranges
+
+    The embed stage blocks once `queue_depth` batches are waiting, so a slow index
+    throttles the encoder instead of buffering vectors without limit.
+
+    When resuming, stages that already completed are skipped: `upload=False` leaves the
+    thumbnails alone, precomputed `embeddings` replace the encoder, and rows inside
+    `skip_ranges` are not upserted again. `images`, one per record, are encoded in place of
+    thumb_paths_by_scene (a re-index streams them from S3). The callbacks checkpoint progress as it happens
+    (`on_upserted` runs on the upsert workers).
+    Returns the embedding array (rows in thumb_paths_by_scene order).
+    """
+    flat_paths = [p for scene in (thumb_paths_by_scene or []) for p in scene]
+    n = len(records)
+    if (upload or (embeddings is None and images is None)) and len(flat_paths) != n:
+        raise ValueError(f"{len(flat_paths)} thumbnails but {n} vector records")
+    precomputed = embeddings is not None
+    if precomputed:
+        if embeddings.shape != (n, EMBED_DIM):
+            raise ValueError(f"Embeddings of shape {embeddings.shape} for {n} vector records")
+        batches = ((i, min(i + embed_batch_size, n)) for i in range(0, n, embed_batch_size))
+    else:
+        embeddings = np.empty((n, EMBED_DIM), dtype=np.float32)
+        images = iter_images(flat_paths) if images is None else images
+        batches = iter_embedding_batches(images, embeddings, embed_batch_size)
+    done_rows = merge_ranges(skip_ranges)
+    ranges: queue.Queue = queue.Queue(maxsize=queue_depth)
+    failed = threading.Event()
+    errors: List[BaseException] = []
+    uploads_left = [len(flat_paths) if upload else 0]
+    uploads_lock = threading.Lock()
+    upserted = [0]
+    t0 = time.perf_counter()
+
+    def upsert_worker():
+        try:
+            while not failed.is_set():
+                try:
+                    item = ranges.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    return
+                start, stop = item
+                for i in range(start, stop, UPSERT_BATCH):
+                    j = min(i + UPSERT_BATCH, stop)
+                    index.upsert(
+                        vectors=[(records[r][0], embeddings[r], records[r][1]) for r in range(i, j)],
+                        namespace=namespace,
+                    )
+                    with uploads_lock:
+                        upserted[0] += j - i
+                    if on_upserted is not None:
+                        on_upserted(i, j)
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+
+    def upload(path: str):
+        dest_key = thumbs_prefix + os.path.basename(path)
+        s3_client.upload_file(path, bucket, dest_key, ExtraArgs={"ContentType": "image/jpeg"})
+        with uploads_lock:
+            uploads_left[0] -= 1
+            last = uploads_left[0] == 0
+        if last:
+            observe_rate(UPLOADS_PER_SECOND, len(flat_paths), time.perf_counter() - t0)
+            if on_uploaded is not None:
+                on_uploaded()
+
+    upserters = [threading.Thread(target=upsert_worker, name=f"upsert-{i}", daemon=True)
+                 for i in range(upsert_workers)]
+    for t in upserters:
+        t.start()
+
+    with ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="s3-upload") as uploads:
+        upload_futures = [uploads.submit(upload, p) for p in flat_paths] if upload else []
+        if upload and not flat_paths and on_uploaded is not None:
+            on_uploaded()
+        try:
+            for start, stop in batches:
+                for pending in subtract_ranges(start, stop, done_rows):
+                    _put(ranges, pending, failed)
+            if not precomputed:
+                observe_rate(EMBED_PER_SECOND, n, time.perf_counter() - t0)
+                if on_embedded is not None:
+                    on_embedded(embeddings)
+            for _ in upserters:
+                _put(ranges, _DONE, failed)
+        except _StageFailed:
+            pass  # an upsert worker failed; its error is raised below
+        except BaseException:
+            failed.set()  # stops the upsert workers
+            raise
+        finally:
+            if failed.is_set():
+                for f in upload_futures:
+                    f.cancel()
+            for t in upserters:
+                t.join()
+        if errors:
+            raise errors[0]
+        for f in upload_futures:
+            f.result()  # surface the first upload error
+    observe_rate(UPSERT_PER_SECOND, upserted[0], time.perf_counter() - t0)
+
+    logging.info(
+        f"Ingest pipeline: {n} thumbnails ({len(upload_futures)} uploaded, "
+        f"{'loaded' if precomputed else 'embedded'}, {n - sum(b - a for a, b in done_rows)} upserted)"
+    )
+    return embeddings
@@ -0,0 +1,174 @@
+import os, logging, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from .metrics import JOB_PEAK_RSS_BYTES, RssSampler
+
+JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "1000"))  # finished jobs kept for polling
+
+ACTIVE = ("queued", "running")
+
+# progress(stage, **info): called by the job function when it enters a new stage
+ProgressFn = Callable[..., None]
+
+
+class JobStore:
+    """
+    In-process job table. Each job records its overall status and per-stage timings:
+
+        {"id", "key", "status": queued|running|succeeded|failed, "stage",
+         "stages": [{"name", "started_at", "finished_at", ...info}], "result", "error", ...}
+
+    At most one active job exists per dedupe key. Jobs live as long as the API process.
+    """
+    def __init__(self, history: int = JOB_HISTORY):
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._active: Dict[str, str] = {}  # dedupe key -> job id
+        self._history = history
+
+    def create(self, key: str, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """Return (job, created). An active job with the same key is returned instead of a new one."""
+        with self._lock:
+            active_id = self._active.get(key)
+            if active_id is not None:
+                return dict(self._jobs[active_id]), False
+            now = time.time()
+            job = {
+                "id": uuid4().hex,
+                "key": key,
+                "status": "queued",
+                "stage": "queued",
+                "stages": [],
+                "payload": payload,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self._jobs[job["id"]] = job
+            self._active[key] = job["id"]
+            self._evict()
+            return dict(job), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            out = dict(job)
+            out["stages"] = [dict(s) for s in job["stages"]]
+            return out
+
+    def enter_stage(self, job_id: str, stage: str, **info) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            now = time.time()
+            if job["stages"] and job["stages"][-1]["finished_at"] is None:
+                job["stages"][-1]["finished_at"] = now
+            job["stages"].append({"name": stage, "started_at": now, "finished_at": None, **info})
+            job["status"] = "running"
+            job["stage"] = stage
+            job["updated_at"] = now
+
+    def finish(self, job_id: str, result: Any = None, error: Optional[str] = None, **info) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(info)
+            now = time.time()
+            if job["stages"] and job["stages"][-1]["finished_at"] is None:
+                job["stages"][-1]["finished_at"] = now
+            job["status"] = "failed" if error is not None else "succeeded"
+            job["stage"] = "done"
+            job["result"] = result
+            job["error"] = error
+            job["updated_at"] = now
+            if self._active.get(job["key"]) == job_id:
+                del self._active[job["key"]]
+            self._evict()
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs per status (finished ones only while they are kept in history)."""
+        with self._lock:
+            out = {status: 0 for status in ("queued", "running", "succeeded", "failed")}
+            for job in self._jobs.values():
+                out[job["status"]] += 1
+            return out
+
+    def _evict(self) -> None:
+        # Drop the oldest finished jobs beyond the history limit; active jobs are never evicted.
+        finished = [jid for jid, j in self._jobs.items() if j["status"] not in ACTIVE]
+        for jid in finished[:max(0, len(finished) - self._history)]:
+            del self._jobs[jid]
+
+
+class KeyLocks:
+    """
+    One lock per key, created on first use and dropped once nobody holds or waits for it:
+
+        with ingest_locks.hold(video_id, on_wait=lambda: progress("wait")):
+            ...  # no other holder of video_id runs at the same time
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[str, List[Any]] = {}  # key -> [lock, holders + waiters]
+
+    @contextmanager
+    def hold(self, key: str, on_wait: Optional[Callable[[], None]] = None) -> Iterator[None]:
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(blocking=False):
+                if on_wait is not None:
+                    on_wait()
+                entry[0].acquire()
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+class JobRunner:
+    """Runs `fn(payload, progress)` for each submitted job on a fixed-size worker pool."""
+    def __init__(self, store: JobStore, fn: Callable[[Any, ProgressFn], Any], workers: int = JOB_WORKERS,
+                 name: str = "ingest"):
+        self.store = store
+        self.fn = fn
+        self.workers = workers
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-job")
+
+    def submit(self, key: str, payload: Any) -> Tuple[Dict[str, Any], bool]:
+        job, created = self.store.create(key, payload.model_dump() if hasattr(payload, "model_dump") else payload)
+        if created:
+            self._pool.submit(self._run, job["id"], payload)
+        return job, created
+
+    def _run(self, job_id: str, payload: Any) -> None:
+        def progress(stage: str, **info):
+            self.store.enter_stage(job_id, stage, **info)
+        rss = RssSampler()
+        try:
+            with rss:
+                result = self.fn(payload, progress)
+        except Exception as e:
+            # HTTPException carries its message in .detail
+            error = str(getattr(e, "detail", "") or e)
+            logging.exception(f"Job {job_id} failed")
+            self.store.finish(job_id, error=error, peak_rss_bytes=rss.peak)
+        else:
+            self.store.finish(job_id, result=result, peak_rss_bytes=rss.peak)
+        JOB_PEAK_RSS_BYTES.observe(rss.peak, kind=self.name)
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -1,32 +1,24 @@
 from fastapi import FastAPI, UploadFile, File, Form,HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager, contextmanager
 from pydantic import BaseModel, Field
 from pathlib import Path
 from uuid import uuid4
-import os, boto3, subprocess, logging, sys
+import os, asyncio, subprocess, logging, sys, threading
 from urllib.parse import urlparse, quote
-from dotenv import load_dotenv, dotenv_values
+from dotenv import load_dotenv
 from pathlib import Path
-import cv2, numpy as np, tempfile, shutil, os
-from skimage.metrics import structural_similarity as ssim
-from typing import List, Dict, Any, Optional, Tuple
-from pinecone import Pinecone
-from pinecone import ServerlessSpec
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterator
 from PIL import Image
-from transformers import CLIPProcessor, CLIPModel 
-import torch
-import hashlib
 from io import BytesIO
 from botocore.exceptions import ClientError
 import re
-import json
 import time
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-from scenedetect import open_video, SceneManager
-from scenedetect.detectors import ContentDetector  # or AdaptiveDetector
-from scenedetect.video_splitter import split_video_ffmpeg
-
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
@@ -35,11 +27,53 @@ logging.basicConfig(
 )
 
 DOTENV_PATH = Path(__file__).resolve().parent.parent / ".env"  # backend/.env
-if not DOTENV_PATH.exists():
-    raise RuntimeError(f".env not found at {DOTENV_PATH}. Put your backend env there.")
-load_dotenv(dotenv_path=DOTENV_PATH, override=True)
+if DOTENV_PATH.exists():
+    load_dotenv(dotenv_path=DOTENV_PATH, override=True)
+else:
+    # Settings then come from the process environment only (containers, benchmarks).
+    logging.warning(f".env not found at {DOTENV_PATH}; using the process environment")
+
+# Local modules read their settings from the environment, so import them after .env is loaded.
+from .video import detect_scenes, detect_scenes_parallel, detect_and_capture, export_clips, THUMB_SSIM_THRESHOLD, DETECT_WORKERS
+from .embeddings import query_batcher, query_cache, get_clip, is_model_loaded, engine_info, model_name
+from .ingest import (build_vector_records, download_thumbnails, remove_checkpoint_outputs, run_ingest_pipeline,
+                     video_id_from_s3_uri)
+from .manifest import IngestManifest, get_npy, put_npy, manifest_cache
+from .reindex import (ActiveIndex, VIDEOS_PREFIX, activate_version, check_version, embeddings_key_for,
+                      namespace_for, namespace_version, reindex_library, write_done_marker)
+from .jobs import JobStore, JobRunner, KeyLocks, ProgressFn
+from .scratch import scratch
+from .storage import make_s3_client, presign_cache, TRANSFER_CONFIG
+from .metrics import (REGISTRY, StageRecorder, SEARCH_SECONDS, INGEST_DOWNLOAD_BYTES, DETECT_FPS,
+                      THUMBNAILS_PER_SECOND, observe_rate)
+from .vector_store import (get_vector_store, is_vector_store_ready, search_library, aggregate_scenes, time_range_filter,
+                           check_pooling, SCENE_OVERFETCH, MAX_QUERY_TOP_K)
+from .temporal import scene_matrix_cache, search_windows, TEMPORAL_MAX_WINDOW, TEMPORAL_MAX_QUERIES
+
+# Load CLIP and connect the vector store in the background at startup, so the first search
+# doesn't pay for it. Presign-only deployments set MODEL_WARMUP=0 and never import torch.
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+warmup_state: Dict[str, Any] = {"error": None}
+
+def warm_up():
+    try:
+        t0 = time.time()
+        get_clip()
+        logging.info(f"Model loaded in {time.time() - t0:.1f}s")
+        get_vector_store()
+    except Exception as e:
+        warmup_state["error"] = str(e)
+        logging.exception("Warm-up failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MODEL_WARMUP:
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+    yield
+    job_runner.shutdown()
+    reindex_runner.shutdown()
 
-app = FastAPI(title="SceneIt Backend")
+app = FastAPI(title="SceneIt Backend", lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -61,16 +95,32 @@ class Item(BaseModel):
 def healthz():
     return {"status": "ok"}
 
+@app.get("/readyz")
+def readyz():
+    """200 once the model is loaded (search/ingest won't stall on first use), 503 before."""
+    ready = is_model_loaded()
+    body = {
+        "ready": ready,
+        "model_loaded": ready,
+        "vector_store": is_vector_store_ready(),
+        "clip": engine_info(),
+        "warmup": MODEL_WARMUP,
+        "error": warmup_state["error"],
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
 AWS_REGION = os.getenv("AWS_REGION")
 S3_BUCKET  = os.getenv("S3_BUCKET")
 S3_PREFIX  = os.getenv("S3_PREFIX")
-PC_KEY = os.getenv("PINECONE_ACCESS_KEY")
+STREAM_INGEST = os.getenv("STREAM_INGEST", "0") == "1"  # default for SplitShotsRequest.stream_source
+SCRATCH_THUMB_BYTES = int(os.getenv("SCRATCH_THUMB_BYTES", str(256 * 1024 * 1024)))  # thumbnail allowance per job
+STREAM_URL_TTL = int(os.getenv("STREAM_URL_TTL", str(6 * 3600)))  # must outlive the longest decode
 logging.info(f"S3_BUCKET: {S3_BUCKET}")
 logging.info(f"S3_PREFIX: {S3_PREFIX}")
 logging.info(f"REGION: {AWS_REGION}")
-logging.info(f"PC: {PC_KEY}")
 
-s3 = boto3.client("s3", region_name=AWS_REGION)
+s3 = make_s3_client(AWS_REGION)  # shared by every request, job and helper (pooled connections)
+active_index = ActiveIndex(s3, S3_BUCKET)  # which index version searches and ingests use
 
 class PresignReq(BaseModel):
     filename: str
@@ -81,15 +131,33 @@ class ProcessReq(BaseModel):
   video_path: str  # can be "s3://bucket/key" or local path
 
 
-def resolve_local_video(path: str) -> tuple[str, str|None, str|None]:
-    """Return (local_path, bucket, key)."""
+def stream_url(bucket: str, key: str) -> str:
+    """Presigned GET URL that OpenCV/ffmpeg can decode from directly (seeks become range requests)."""
+    # Signed fresh, never from presign_cache: the decode may need the whole STREAM_URL_TTL.
+    return s3.generate_presigned_url(
+        ClientMethod="get_object",
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=STREAM_URL_TTL,
+    )
+
+@contextmanager
+def resolve_local_video(path: str, stream: bool = False) -> Iterator[tuple[str, str|None, str|None]]:
+    """
+    Yield (local_path, bucket, key). S3 paths are downloaded into a scratch workspace that is
+    removed when the block exits; with stream=True they resolve to a presigned URL instead.
+    """
     if path.startswith("s3://"):
         u = urlparse(path); bucket = u.netloc; key = u.path.lstrip("/")
-        tmp = tempfile.mkdtemp(prefix="sceneit_shots_")
-        local = os.path.join(tmp, os.path.basename(key) or "input.mp4")
-        s3.download_file(bucket, key, local)
-        return local, bucket, key
-    return path, None, None
+        if stream:
+            yield stream_url(bucket, key), bucket, key
+            return
+        size = s3_object_size(bucket, key) or 0
+        with scratch.workspace("sceneit_shots_", reserve_bytes=size) as tmp:
+            local = os.path.join(tmp, os.path.basename(key) or "input.mp4")
+            s3.download_file(bucket, key, local, Config=TRANSFER_CONFIG)
+            yield local, bucket, key
+        return
+    yield path, None, None
 
 def safe_name(name:str) -> str: 
     return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "file.bin"
@@ -102,14 +170,9 @@ class PresignRequest(BaseModel):
 @app.post("/s3/presign")
 def presign_keys(req: PresignRequest):
     out = []
-    now = int(time.time())
     for k in req.keys:
-        url = s3.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": req.bucket, "Key": k},
-            ExpiresIn=req.expires_in or 1800,
-        )
-        out.append({"key": k, "url": url, "expiresAt": now + (req.expires_in or 1800)})
+        url, expires_at = presign_cache.url(s3, "get_object", req.bucket, k, req.expires_in or 1800)
+        out.append({"key": k, "url": url, "expiresAt": int(expires_at)})
     return {"items": out}
 
 @app.post("/presign")
@@ -127,13 +190,10 @@ def presign(req: PresignReq):
         else:
             raise
 # Always create a GET presigned URL (for playback)
-    get_url = s3.generate_presigned_url(
-        ClientMethod="get_object",
-        Params={"Bucket": S3_BUCKET, "Key": key_path},
-        ExpiresIn=3600
-    )
+    get_url, _ = presign_cache.url(s3, "get_object", S3_BUCKET, key_path, 3600)
 
-    # If it doesn’t exist, also create a PUT presigned URL (for upload)
+    # If it doesn’t exist, also create a PUT presigned URL (for upload), signed fresh so the
+    # upload gets the full hour
     upload_url = None
     if not exists:
         upload_url = s3.generate_presigned_url(
@@ -167,6 +227,15 @@ def parse_s3_uri(s3_uri: str):
         raise ValueError("Invalid S3 URI; expected s3://bucket/key")
     return bucket, key
 
+def s3_object_size(bucket: str, key: str) -> Optional[int]:
+    """ContentLength of the object, or None if it doesn't exist."""
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "404":
+            return None
+        raise
+
 def s3_key_exists(bucket: str, key: str) -> bool:
     try:
         s3.head_object(Bucket=bucket, Key=key)
@@ -181,13 +250,11 @@ def any_under_prefix(bucket: str, prefix: str) -> bool:
 
 def s3_download(s3_uri: str, local_path: str):
     bucket, key = parse_s3_uri(s3_uri)
-    s3 = boto3.client("s3")
-    s3.download_file(bucket, key, local_path)
+    s3.download_file(bucket, key, local_path, Config=TRANSFER_CONFIG)
 
 def s3_upload(local_path: str, dest_s3_uri: str):
     bucket, key = parse_s3_uri(dest_s3_uri)
-    s3 = boto3.client("s3")
-    s3.upload_file(local_path, bucket, key)
+    s3.upload_file(local_path, bucket, key, Config=TRANSFER_CONFIG)
 
 def ensure_ffmpeg():
     try:
@@ -195,11 +262,6 @@ def ensure_ffmpeg():
     except Exception:
         raise RuntimeError("ffmpeg not found on PATH; required for splitting clips.")
 
-def video_id_from_s3_uri(s3_uri: str) -> str:
-    # s3://bucket/key
-    key = s3_uri.split("/", 3)[-1]
-    return hashlib.sha1(key.encode()).hexdigest()[:16]
-
 def s3_uri_to_http(s3_uri: str, region: str = AWS_REGION) -> str:
     u = urlparse(s3_uri)
     if u.scheme != "s3":
@@ -218,8 +280,17 @@ class SplitShotsRequest(BaseModel):
     # Shot detection params
     threshold: float = Field(27.0, description="PySceneDetect ContentDetector threshold (higher = fewer cuts)")
     min_scene_len: int = Field(4, description="Minimum scene length in frames (e.g., at 24fps)")
+    # Whether to go past detection (thumbnails, embeddings, index)
+    split_clips: bool = Field(True, description="If true, extract thumbnails and index them; if false, only detect shots.")
     # Whether to actually cut clips (requires ffmpeg)
-    split_clips: bool = Field(True, description="If true, export per-shot clips via ffmpeg.")
+    export_clips: bool = Field(False, description="If true, also re-encode per-shot clips via ffmpeg and upload them.")
+    # Read the video straight from S3 instead of downloading it first
+    stream_source: bool = Field(STREAM_INGEST, description="If true, decode from a presigned S3 URL with HTTP range reads (no local copy).")
+    # Thumbnails per shot
+    max_thumbs_per_scene: int = Field(3, ge=1, description="Most thumbnails captured per shot.")
+    thumb_ssim_threshold: Optional[float] = Field(THUMB_SSIM_THRESHOLD, description="Drop a shot's thumbnail when its SSIM to one already kept is >= this; null keeps all.")
+    # Vectors inline as JSON; by default the response only points at embeddings_s3_uri / GET /embeddings
+    include_embeddings: bool = Field(False, description="If true, also return every thumbnail vector as nested JSON lists (large).")
 
 class ShotBoundary(BaseModel):
     start_time: float  # seconds
@@ -230,187 +301,86 @@ class ShotBoundary(BaseModel):
 class SplitShotsResponse(BaseModel):
     shots: List[ShotBoundary]
     thumbnail_s3_uris_by_scene: Optional[List[List[str]]] = None
-    thumb_embeddings: Optional[List[List[List[float]]]] = None
+    thumb_embeddings: Optional[List[List[List[float]]]] = None  # only with include_embeddings
+    embeddings_s3_uri: Optional[str] = None  # float32 .npy, one row per thumbnail in scene order
     already_processed: bool
     output_prefix: Optional[str] = ""
     manifest_s3_uri: Optional[str] = ""
     pc_namespace: Optional[str]= ""
 
-# ---------- Core Shot Detection ----------
-
-def detect_scenes(video_path: str, threshold: float, min_scene_len: int):
-    video = open_video(video_path)
-    scene_manager = SceneManager()
-    scene_manager.add_detector(ContentDetector(threshold=30.0, min_scene_len=min_scene_len))
-    scene_manager.detect_scenes(video)
-
-    scene_list = scene_manager.get_scene_list()  
-
-    shots = []
-    for start_tc, end_tc in scene_list:
-        shots.append((
-            start_tc.get_seconds(),
-            end_tc.get_seconds(),
-            start_tc.get_frames(),
-            end_tc.get_frames()
-        ))
-    return scene_list, shots
-
-
-def pick_timepoints(start_s: float, end_s: float, count: int = 3) -> List[float]:
-    """Pick `count` times inside [start_s, end_s] (biased away from hard cuts)."""
-    dur = max(0.0, end_s - start_s)
-    if dur <= 0.0:
-        return [start_s]
-
-    # If the scene is very short, just return the midpoint (or up to count=2)
-    if dur < 0.6:  
-        mids = [start_s + dur * 0.5]
-        if dur > 0.25 and count >= 2:
-            mids = [start_s + dur * 0.33, start_s + dur * 0.66]
-        return mids[:count]
-
-    # For longer scenes, spread across interior (20%, 50%, 80%)
-    anchors = [0.2, 0.5, 0.8]
-    # Respect requested count
-    anchors = anchors[:count] if count <= 3 else [(i+1)/(count+1) for i in range(count)]
-
-    # Avoid landing exactly on cuts: pull slightly inward by epsilon on each side.
-    eps = min(0.1, dur * 0.02)  # 100ms or 2% of scene, whichever smaller
-    return [max(start_s + eps, min(end_s - eps, start_s + a*dur)) for a in anchors]
-
-def extract_frame_ffmpeg(video_path: str, t_sec: float, out_path: str):
-    """Extract a single frame as JPEG at time t_sec using accurate seeking."""
-    # Accurate seek: place -ss AFTER -i; a bit slower but reliable for MOV/VFR.
-    cmd = [
-        "ffmpeg", "-hide_banner", "-loglevel", "error",
-        "-i", video_path,
-        "-ss", f"{t_sec:.3f}",
-        "-frames:v", "1",
-        "-q:v", "2",           # 2 = high quality JPEG
-        "-y", out_path
-    ]
-    subprocess.run(cmd, check=True)
-
-def make_scene_thumbnails(
-    video_path: str,
-    shots: List[Tuple[float, float, int, int]],  # (start_s, end_s, start_f, end_f)
-    out_dir: str,
-    per_scene: int = 3,
-    basename: str = "shot"
-) -> List[List[str]]:
-    """
-    For each scene, produce up to `per_scene` JPEGs.
-    Returns a parallel list: [[paths for scene 0], [paths for scene 1], ...]
-    """
-    os.makedirs(out_dir, exist_ok=True)
-    all_paths: List[List[str]] = []
-    for idx, (s_start, s_end, _, _) in enumerate(shots):
-        times = pick_timepoints(s_start, s_end, per_scene)
-        scene_paths = []
-        for j, t in enumerate(times, start=1):
-            out_name = f"{basename}-{idx:03d}_{j:02d}.jpg"
-            out_path = os.path.join(out_dir, out_name)
-            extract_frame_ffmpeg(video_path, t, out_path)
-            scene_paths.append(out_path)
-        all_paths.append(scene_paths)
-    return all_paths
-
-model_name = "openai/clip-vit-large-patch14"  
-processor = CLIPProcessor.from_pretrained(model_name)
-model = CLIPModel.from_pretrained(model_name)
-pc = Pinecone(api_key=PC_KEY)
-index_name = "sceneit-thumbs"
-# create once; if it already exists, skip
-if index_name not in [i.name for i in pc.list_indexes()]:
-    pc.create_index(
-        name=index_name,
-        dimension=768,                 # CLIP L/14
-        metric="cosine",               # use cosine similarity
-        spec=ServerlessSpec(cloud="aws", region="us-east-1")
-    )
-def create_embeddings(source_list: List[str]) -> List[List[float]]:
-    image_objects = []
-    for source in source_list: 
-        image_objects.append(Image.open(source))
-    inputs = processor(images=image_objects, return_tensors="pt" )
-    with torch.no_grad():
-        image_embeddings = model.get_image_features(**inputs)
-    emb_list = image_embeddings.detach().cpu().numpy().tolist()
-    
-    return emb_list
-
-def put_embeddings(thumb_embeddings: List[List[List[float]]], thumb_timepoints: List[List[float]], source: str, shots: List[ShotBoundary], thumb_keys: List[List[str]], bucket: str) -> None: 
-    vid = video_id_from_s3_uri(source)
-    vectors = []
-    index = pc.Index(index_name)
-    for scene_i, (scene_embeds, timepoints, thumb_key) in enumerate(zip(thumb_embeddings, thumb_timepoints, thumb_keys)):  
-        # thumb_embeddings: [scene][thumb_idx][768]
-        # thumb_timepoints: [scene][thumb_idx] 
-        start_s, end_s, start_f, end_f = shots[scene_i]
-        for thumb_j, (vec, t_sec, key) in enumerate(zip(scene_embeds, timepoints, thumb_key)):
-            vec_id = f"{vid}:s{scene_i:03d}:t{thumb_j:02d}"
-            meta = {
-                "video_id": vid,
-                "source_s3_uri": source,  # or bucket/key separately
-                "scene_index": scene_i,
-                "thumb_index": thumb_j,
-                "t_sec": float(t_sec),
-                "start_s": float(start_s),
-                "end_s": float(end_s),
-                "start_f": int(start_f),
-                "end_f": int(end_f),
-                "thumb_key": key
-            }
-            vectors.append((vec_id, vec, meta))
-
-    # batch upsert
-    for i in range(0, len(vectors), 100):
-        index.upsert(vectors=vectors[i:i+100], namespace=vid)
+async def encode_query(text_search: str | None, image_search: UploadFile | None) -> List[float]:
+    # Encoding runs on the query batcher's inference thread, never on the event loop.
+    if text_search:
+        return (await query_batcher.encode_text(text_search)).tolist()
+    if image_search is not None:
+        content = await image_search.read()
+        image = Image.open(BytesIO(content))
+        return (await query_batcher.encode_image(image)).tolist()
+    raise HTTPException(status_code=400, detail="Provide either text_search or image_search")
 
 @app.post("/search_embeddings")
 async def search_embeddings(
     filename: str = Form(...),
     text_search: str | None = Form(None),
     image_search: UploadFile | None = File(None),
-    top_k: int = Form(10)
+    top_k: int = Form(10),
+    group_by_scene: bool = Form(False),
+    pooling: str = Form("max"),
+    dedupe_threshold: float | None = Form(None),
+    t_min: float | None = Form(None),
+    t_max: float | None = Form(None),
+    time_field: str = Form("t_sec"),
 ):
-
+    """
+    With group_by_scene, candidates are over-fetched and collapsed so `matches` holds up to
+    top_k distinct scenes (best thumbnail as representative, scene score from `pooling`).
+    t_min/t_max (seconds) keep thumbnails whose `time_field` (t_sec or start_s) is in range;
+    the filter runs in the vector store, so top_k counts only matches inside it.
+    """
     try: 
         vid = video_id_from_s3_uri(filename)
-        if text_search:
-            with torch.no_grad():
-                inputs = processor(text=[text_search], return_tensors="pt",padding=True)
-                q = model.get_text_features(**inputs)
-            query_vec = q[0].cpu().numpy().tolist()
-        elif image_search is not None: 
-            content = await image_search.read()
-            image = Image.open(BytesIO(content))
-            with torch.no_grad():
-                inputs = processor(images=[image], return_tensors="pt")
-                q = model.get_image_features(**inputs)
-            query_vec = q[0].cpu().numpy().tolist()
-        else: 
-            raise HTTPException(status_code=400, detail="Provide either text_search or image_search")
+        try:
+            flt = time_range_filter(t_min, t_max, time_field)
+            check_pooling(pooling)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        t0 = time.perf_counter()
+        with SEARCH_SECONDS.time(endpoint="search_embeddings", phase="encode"):
+            query_vec = await encode_query(text_search, image_search)
+        t_query = time.perf_counter()
+        namespace = await run_in_threadpool(active_index.namespace, vid)
         
-        index = pc.Index("sceneit-thumbs")   
-        res = index.query(
-            vector=query_vec,
-            top_k=top_k,
-            namespace=vid,   
-            include_metadata=True,
-        )
+        if group_by_scene:
+            # The store is resolved on the worker thread: the first call connects to the index.
+            candidates = await run_in_threadpool(lambda: get_vector_store().query(
+                vector=query_vec,
+                top_k=min(top_k * SCENE_OVERFETCH, MAX_QUERY_TOP_K),
+                namespace=namespace,
+                include_metadata=True,
+                include_values=dedupe_threshold is not None,
+                filter=flt,
+            ))
+            matches = [
+                {
+                    "id": sc["best"]["id"],
+                    "score": sc["score"],
+                    "metadata": sc["best"]["metadata"],
+                    "thumbs": sc["thumbs"],
+                }
+                for sc in aggregate_scenes(candidates, top_k, pooling, dedupe_threshold)
+            ]
+        else:
+            matches = await run_in_threadpool(lambda: get_vector_store().query(
+                vector=query_vec,
+                top_k=top_k,
+                namespace=namespace,
+                include_metadata=True,
+                filter=flt,
+            ))
+        SEARCH_SECONDS.observe(time.perf_counter() - t_query, endpoint="search_embeddings", phase="query")
+        SEARCH_SECONDS.observe(time.perf_counter() - t0, endpoint="search_embeddings", phase="total")
         logging.info("Seraching frames")
 
-        # Convert to clean JSON
-        matches = [
-            {
-                "id": m.id,
-                "score": float(m.score),
-                "metadata": dict(m.metadata) if m.metadata is not None else {}
-            }
-            for m in res.matches
-        ]
         #log a compact line per match
         for m in matches:
             logging.info(
@@ -418,9 +388,10 @@ async def search_embeddings(
             )
         
         return {
-            "namespace": vid,
+            "namespace": namespace,
             "query": text_search if text_search else image_search,
             "top_k": top_k,
+            "group_by_scene": group_by_scene,
             "matches": matches,
             "bucket": S3_BUCKET
             }
@@ -428,54 +399,325 @@ async def search_embeddings(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-@app.post("/split_shots", response_model=SplitShotsResponse)
-def split_shots(req: SplitShotsRequest):
-    tmp_dir = tempfile.mkdtemp(prefix="scenes_")
+
+def active_namespaces(filenames: Optional[List[str]] = None) -> List[str]:
+    """Namespaces of the active index version: the given videos (s3:// URIs), or all of them."""
+    version = active_index.version()
+    if filenames:
+        return [namespace_for(video_id_from_s3_uri(f), version) for f in filenames]
+    return [ns for ns in get_vector_store().list_namespaces() if namespace_version(ns) == version]
+
+@app.post("/search_library")
+async def search_library_route(
+    text_search: str | None = Form(None),
+    image_search: UploadFile | None = File(None),
+    top_k: int = Form(10),
+    filenames: List[str] | None = Form(None),
+    timeout_s: float | None = Form(None),
+    t_min: float | None = Form(None),
+    t_max: float | None = Form(None),
+    time_field: str = Form("t_sec"),
+):
+    """Search every indexed video (or only `filenames`, as s3:// URIs) and rank the matches globally."""
+    try:
+        try:
+            flt = time_range_filter(t_min, t_max, time_field)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        t0 = time.perf_counter()
+        with SEARCH_SECONDS.time(endpoint="search_library", phase="encode"):
+            query_vec = await encode_query(text_search, image_search)
+        with SEARCH_SECONDS.time(endpoint="search_library", phase="query"):
+            namespaces = await run_in_threadpool(active_namespaces, filenames)
+            res = await run_in_threadpool(
+                lambda: search_library(get_vector_store(), query_vec, top_k, namespaces, timeout_s, flt)
+            )
+        SEARCH_SECONDS.observe(time.perf_counter() - t0, endpoint="search_library", phase="total")
+        logging.info(f"Library search: {res['searched']} videos, {len(res['timed_out'])} timed out")
+        return {
+            "query": text_search if text_search else image_search.filename,
+            "top_k": top_k,
+            **res,
+            "bucket": S3_BUCKET
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def temporal_search(filename: str, texts: List[str], queries: np.ndarray, top_k: int, window: int, mode: str,
+                    t_min: Optional[float], t_max: Optional[float], time_field: str) -> Dict[str, Any]:
+    bucket, key_path = parse_s3_uri(filename)
+    version = active_index.version()
+    try:
+        sm = scene_matrix_cache.get(s3, bucket, f"{key_path}/", version)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+            raise
+        sm = None
+    if sm is None:
+        raise HTTPException(status_code=404, detail=f"No scene embeddings for {filename}; ingest it first")
+
+    thumb_scores = sm.thumb_scores(queries)  # (thumbnails, queries), one matrix product
+    mask = sm.time_mask(t_min, t_max, time_field)
+    windows = search_windows(sm.scene_scores(thumb_scores, mask), window, top_k, mode)
+
+    out = []
+    for w in windows:
+        steps = []
+        for k, scene in enumerate(w["scenes"]):
+            a, b = sm.offsets[scene], sm.offsets[scene + 1]
+            col = thumb_scores[a:b, k] if mask is None else np.where(mask[a:b], thumb_scores[a:b, k], -np.inf)
+            r = a + int(np.argmax(col))  # the thumbnail that scored the scene
+            steps.append({
+                "query": texts[k],
+                "scene_index": scene,
+                "score": float(thumb_scores[r, k]),
+                "t_sec": float(sm.t_sec[r]),
+                "thumb_key": sm.thumb_keys[r],
+                "start_s": float(sm.shots[scene, 0]),
+                "end_s": float(sm.shots[scene, 1]),
+            })
+        first, last = min(w["scenes"]), max(w["scenes"])
+        out.append({
+            "score": w["score"],
+            "start_scene": first,
+            "end_scene": last,
+            "start_s": float(sm.shots[first, 0]),
+            "end_s": float(sm.shots[last, 1]),
+            "steps": steps,
+        })
+    return {"namespace": namespace_for(video_id_from_s3_uri(filename), version), "scenes": sm.scenes, "windows": out}
+
+@app.post("/search_temporal")
+async def search_temporal_route(
+    filename: str = Form(...),
+    text_search: List[str] = Form(...),
+    top_k: int = Form(5),
+    window: int = Form(5),
+    mode: str = Form("sequence"),
+    t_min: float | None = Form(None),
+    t_max: float | None = Form(None),
+    time_field: str = Form("t_sec"),
+):
+    """
+    Moments that span consecutive scenes of one video. Pass text_search once per step:
+    mode="sequence" finds the steps in order (e.g. "car chase", then "crash") within
+    `window` consecutive scenes; mode="window" only needs all of them inside the window.
+    Windows are ranked by the mean of their steps' scene scores and don't overlap.
+    """
+    texts = [t for t in text_search if t and t.strip()]
+    if not texts or len(texts) > TEMPORAL_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Provide 1 to {TEMPORAL_MAX_QUERIES} text_search values")
+    if not 1 <= window <= TEMPORAL_MAX_WINDOW:
+        raise HTTPException(status_code=400, detail=f"window must be between 1 and {TEMPORAL_MAX_WINDOW}")
+    try:
+        time_range_filter(t_min, t_max, time_field)  # validates time_field
+        t0 = time.perf_counter()
+        with SEARCH_SECONDS.time(endpoint="search_temporal", phase="encode"):
+            # Submitted together, so the batcher encodes them in one forward pass.
+            queries = np.stack(await asyncio.gather(*(query_batcher.encode_text(t) for t in texts)))
+        with SEARCH_SECONDS.time(endpoint="search_temporal", phase="query"):
+            res = await run_in_threadpool(
+                temporal_search, filename, texts, queries, top_k, window, mode, t_min, t_max, time_field
+            )
+        SEARCH_SECONDS.observe(time.perf_counter() - t0, endpoint="search_temporal", phase="total")
+        return {"query": texts, "mode": mode, "window": window, "top_k": top_k, **res, "bucket": S3_BUCKET}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ---------- Metrics / stats ----------
+
+# Gauges read their stats at scrape time.
+def _stat_gauge(name: str, doc: str, stats, field: str, kind: str = "gauge"):
+    getattr(REGISTRY, kind)(name, doc, fn=lambda: {(): float(stats()[field])})
+
+_stat_gauge("sceneit_query_cache_entries", "Query vectors held in memory.", query_cache.stats, "entries")
+_stat_gauge("sceneit_query_cache_hits_total", "Query cache hits (memory tier).", query_cache.stats, "hits", "counter")
+_stat_gauge("sceneit_query_cache_disk_hits_total", "Query cache hits (disk tier).", query_cache.stats, "disk_hits", "counter")
+_stat_gauge("sceneit_query_cache_misses_total", "Query cache misses.", query_cache.stats, "misses", "counter")
+_stat_gauge("sceneit_query_batcher_queued", "Queries waiting for the encoder thread.", query_batcher.stats, "queued")
+_stat_gauge("sceneit_query_batcher_batches_total", "Encoder batches run.", query_batcher.stats, "batches", "counter")
+_stat_gauge("sceneit_query_batcher_items_total", "Queries encoded in batches.", query_batcher.stats, "items", "counter")
+_stat_gauge("sceneit_scratch_reserved_bytes", "Scratch bytes reserved by running jobs.", lambda: scratch.stats(held=False), "reserved_bytes")
+_stat_gauge("sceneit_scratch_waiting", "Jobs waiting for scratch space.", lambda: scratch.stats(held=False), "waiting")
+_stat_gauge("sceneit_manifest_cache_entries", "Complete manifests held in memory.", manifest_cache.stats, "entries")
+_stat_gauge("sceneit_manifest_cache_hits_total", "Manifest reads served from memory.", manifest_cache.stats, "hits", "counter")
+_stat_gauge("sceneit_manifest_cache_misses_total", "Manifest reads from S3.", manifest_cache.stats, "misses", "counter")
+_stat_gauge("sceneit_scene_matrix_cache_bytes", "Scene matrices held for temporal search.", scene_matrix_cache.stats, "bytes")
+_stat_gauge("sceneit_scene_matrix_cache_hits_total", "Temporal searches served from cached scene matrices.", scene_matrix_cache.stats, "hits", "counter")
+_stat_gauge("sceneit_scene_matrix_cache_misses_total", "Scene matrices loaded from S3.", scene_matrix_cache.stats, "misses", "counter")
+_stat_gauge("sceneit_presign_cache_entries", "Presigned URLs held for reuse.", presign_cache.stats, "entries")
+_stat_gauge("sceneit_presign_cache_hits_total", "Presigned URLs served from the cache.", presign_cache.stats, "hits", "counter")
+_stat_gauge("sceneit_presign_cache_misses_total", "Presigned URLs signed.", presign_cache.stats, "misses", "counter")
+REGISTRY.gauge("sceneit_jobs", "Jobs by status (finished jobs while kept in history).",
+               fn=lambda: {(("status", k),): float(v) for k, v in job_store.counts().items()})
+REGISTRY.gauge("sceneit_model_loaded", "1 once CLIP is loaded.", fn=lambda: {(): float(is_model_loaded())})
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"query_cache": query_cache.stats(), "query_batcher": query_batcher.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/scratch/stats")
+def scratch_stats():
+    return scratch.stats()
+
+def split_by_scene(embeddings: np.ndarray, thumb_paths_by_scene: List[List[str]]) -> List[List[List[float]]]:
+    """Regroup flat embedding rows into [scene][thumb_idx][768] lists for the JSON response."""
+    out, i = [], 0
+    for scene in thumb_paths_by_scene:
+        out.append(embeddings[i:i + len(scene)].tolist())
+        i += len(scene)
+    return out
+
+def thumbnail_uris(bucket: str, thumb_keys_by_scene: List[List[str]]) -> List[List[str]]:
+    return [[f"s3://{bucket}/{k}" for k in scene] for scene in thumb_keys_by_scene]
+
+def processed_response(req: SplitShotsRequest, bucket: str, base_prefix: str, manifest: IngestManifest) -> SplitShotsResponse:
+    """Response for an already-ingested video, rebuilt from its manifest (no decode, no S3 writes)."""
+    vid = video_id_from_s3_uri(req.source_s3_uri)
+    thumb_keys_by_scene = manifest.stage("shots").get("thumb_keys_by_scene")  # absent from legacy manifests
+    # Embeddings of the active index version; manifests from before embeddings.npy have none.
+    version = active_index.version()
+    emb_key = None
+    if version or manifest.data.get("outputs", {}).get("embeddings"):
+        emb_key = embeddings_key_for(base_prefix, version)
+    thumb_embeddings = None
+    if req.include_embeddings and emb_key and thumb_keys_by_scene is not None:
+        try:
+            thumb_embeddings = split_by_scene(get_npy(s3, bucket, emb_key), thumb_keys_by_scene)
+        except ClientError as e:
+            logging.warning(f"No embeddings at s3://{bucket}/{emb_key}: {e}")
+    return SplitShotsResponse(
+        already_processed=True,
+        output_prefix=f"s3://{bucket}/{base_prefix}",
+        manifest_s3_uri=f"s3://{bucket}/{base_prefix}manifest.json",
+        shots=[ShotBoundary(**s) for s in manifest.data.get("shots", [])],
+        thumbnail_s3_uris_by_scene=thumbnail_uris(bucket, thumb_keys_by_scene) if thumb_keys_by_scene is not None else None,
+        thumb_embeddings=thumb_embeddings,
+        embeddings_s3_uri=f"s3://{bucket}/{emb_key}" if emb_key else None,
+        pc_namespace=active_index.namespace(vid),
+    )
+
+def ingest_params(req: SplitShotsRequest) -> Dict[str, Any]:
+    """Request fields the checkpointed stages depend on; a checkpoint made with others is discarded."""
+    return {
+        "threshold": req.threshold,
+        "min_scene_len": req.min_scene_len,
+        "max_thumbs_per_scene": req.max_thumbs_per_scene,
+        "thumb_ssim_threshold": req.thumb_ssim_threshold,
+    }
+
+ingest_locks = KeyLocks()  # per video id, shared by /split_shots and ingest jobs
+
+def run_split_shots(req: SplitShotsRequest, progress: ProgressFn = lambda stage, **info: None) -> SplitShotsResponse:
+    """Full ingest of one video; `progress(stage, **info)` is called as each stage starts."""
+    stages = StageRecorder(progress, "ingest", source=req.source_s3_uri)
+    outcome = "error"
+    try:
+        if req.split_clips:
+            # One ingest per video at a time, whether it came from /split_shots or /jobs: a
+            # second one waits, then finds the manifest complete (or resumes a failed run).
+            with ingest_locks.hold(video_id_from_s3_uri(req.source_s3_uri), on_wait=lambda: stages("wait")):
+                res = _split_shots(req, stages)
+        else:
+            res = _split_shots(req, stages)  # detection only: writes nothing
+        outcome = "already_processed" if res.already_processed else "ok"
+        return res
+    finally:
+        stages.close(outcome)
+
+def _split_shots(req: SplitShotsRequest, progress: ProgressFn) -> SplitShotsResponse:
     bucket, key_path = parse_s3_uri(req.source_s3_uri)
 
     # 1) Ensure the source video exists
-    if not s3_key_exists(bucket, key_path):
+    progress("check")
+    video_size = s3_object_size(bucket, key_path)
+    if video_size is None:
         raise HTTPException(status_code=404, detail=f"Video not found in S3: s3://{bucket}/{key_path}")
 
     # 2) Derive base prefix for all outputs: "videos/<hash>/"
     base_prefix = f"{key_path}/"       # e.g., "videos/<hash>/"
-    clips_prefix = base_prefix + "clips/"                   
-    thumbs_prefix = base_prefix + "thumbnails/"
     manifest_key = base_prefix + "manifest.json"
 
-    # 3) Short-circuit if video has been processed
-    # Preferred: single manifest file as the idempotency marker
-    if s3_key_exists(bucket, manifest_key):
-        # Already processed; return minimal response (or load manifest and return full)
-        return SplitShotsResponse(
-            already_processed=True,
-            output_prefix=f"s3://{bucket}/{base_prefix}",
-            manifest_s3_uri=f"s3://{bucket}/{manifest_key}",
-            shots=[]
-        )
-
-    # Fallback: if we don't write a manifest yet, detect any existing outputs
-    if any_under_prefix(bucket, thumbs_prefix) or any_under_prefix(bucket, clips_prefix):
-        return SplitShotsResponse(
-            already_processed=True,
-            output_prefix=f"s3://{bucket}/{base_prefix}",
-            manifest_s3_uri=None,
-            shots=[]
-        )
-
-    # 4) Download the source video locally
-    ext = os.path.splitext(key_path)[1] or ".mp4"
-    local_video = os.path.join(tmp_dir, f"input-{uuid4().hex}{ext}")
-    s3.download_file(bucket, key_path, local_video)
-    logging.info("Detecting Scenes")
-    # 5) Detect scenes
-    scene_list, shots = detect_scenes(
-        video_path=local_video,
-        threshold=req.threshold,
-        min_scene_len=req.min_scene_len
+    # 3) Short-circuit if video has been processed. manifest.json is checkpointed after
+    # every stage, so only a complete one counts; thumbnails or clips without it are
+    # leftovers of a failed run and get redone.
+    manifest = manifest_cache.load(s3, bucket, manifest_key)
+    if manifest is not None and manifest.complete:
+        return processed_response(req, bucket, base_prefix, manifest)
+    if manifest is not None and manifest.data.get("params") != ingest_params(req):
+        if req.split_clips:  # detection only writes nothing, so it leaves the checkpoint alone
+            logging.info(f"Discarding checkpoint s3://{bucket}/{manifest_key}: made with different parameters")
+            vid = video_id_from_s3_uri(req.source_s3_uri)
+            remove_checkpoint_outputs(s3, bucket, get_vector_store(), manifest, vid,
+                                      namespace_for(vid, active_index.version()))
+        manifest = None
+
+    # Scratch space for this job: the downloaded video (unless streamed), thumbnails and
+    # optional clips. Reserved against SCRATCH_QUOTA_BYTES and removed however the job ends.
+    needs_video = not (
+        req.split_clips and manifest is not None and manifest.done("thumbnails")
+        and (manifest.done("clips") or not req.export_clips)
     )
+    reserve = SCRATCH_THUMB_BYTES
+    if needs_video and not req.stream_source:
+        reserve += video_size
+    if needs_video and req.export_clips:
+        # clips are about the size of the source; streamed jobs also download it for the re-encode
+        reserve += video_size * (2 if req.stream_source else 1)
+    progress("scratch", reserve_bytes=reserve)
+    with scratch.workspace("scenes_", reserve_bytes=reserve) as tmp_dir:
+        return _ingest_video(req, progress, tmp_dir, bucket, key_path, base_prefix, manifest)
+
+def _ingest_video(req: SplitShotsRequest, progress: ProgressFn, tmp_dir: str, bucket: str, key_path: str,
+                  base_prefix: str, manifest: Optional[IngestManifest]) -> SplitShotsResponse:
+    clips_prefix = base_prefix + "clips/"
+    thumbs_prefix = base_prefix + "thumbnails/"
+    manifest_key = base_prefix + "manifest.json"
+    index_version = active_index.version(max_age=0)  # never a copy from before an activation
+    embeddings_key = embeddings_key_for(base_prefix, index_version)
+    vid = video_id_from_s3_uri(req.source_s3_uri)
+    namespace = namespace_for(vid, index_version)
 
+    # 4) Get the source video when a stage needs it: stream it from S3, or download it locally
+    ext = os.path.splitext(key_path)[1] or ".mp4"
+    local_video = None
+
+    def video_input(need_local: bool = False) -> str:
+        nonlocal local_video
+        if local_video is None and (need_local or not req.stream_source):
+            progress("download")
+            local_video = os.path.join(tmp_dir, f"input-{uuid4().hex}{ext}")
+            s3.download_file(bucket, key_path, local_video, Config=TRANSFER_CONFIG)
+            INGEST_DOWNLOAD_BYTES.observe(os.path.getsize(local_video))
+        # Streaming: the decoder reads the object over HTTP range requests; nothing is
+        # staged on disk and detection starts with the first bytes.
+        return local_video or stream_url(bucket, key_path)
+
+    # 5) Detection only: no thumbnails, nothing written to S3
     if not req.split_clips:
+        source = video_input()
+        progress("detect")
+        logging.info("Detecting Scenes")
+        t_detect = time.perf_counter()
+        if DETECT_WORKERS > 1:
+            shots, _ = detect_scenes_parallel(source, req.threshold, req.min_scene_len)
+        else:
+            _, shots = detect_scenes(
+                video_path=source,
+                threshold=req.threshold,
+                min_scene_len=req.min_scene_len
+            )
+        observe_rate(DETECT_FPS, shots[-1][3] if shots else 0, time.perf_counter() - t_detect)
         return SplitShotsResponse(
             already_processed=False,
             output_prefix=f"s3://{bucket}/{base_prefix}",
@@ -485,93 +727,143 @@ def split_shots(req: SplitShotsRequest):
             ) for s in shots]
         )
 
-    # 6) Actually split and make thumbnails
-    ensure_ffmpeg()
-
-    out_dir = os.path.join(tmp_dir, "out")
-    os.makedirs(out_dir, exist_ok=True)
-    output_template = os.path.join(out_dir, "shot-$SCENE_NUMBER.mp4")
+    if manifest is None:
+        manifest = IngestManifest.new(s3, bucket, manifest_key, f"s3://{bucket}/{key_path}", ingest_params(req))
+    else:
+        resume_from = manifest.first_incomplete(skip=() if req.export_clips else ("clips",))
+        logging.info(f"Resuming ingest of s3://{bucket}/{key_path} at stage {resume_from}")
+        progress("resume", resume_from=resume_from)
 
-    logging.info("Splitting Scenes")
-
-    split_video_ffmpeg(
-        input_video_path=local_video,
-        scene_list=scene_list,
-        output_file_template=output_template
-    )
-    logging.info("Making Thumbnails")
+    # 6) Detect shots and capture their thumbnails in one decode. Thumbnails are only on
+    # local disk until uploaded, so unless that finished the decode runs again.
     thumb_out_dir = os.path.join(tmp_dir, "thumbs")
-    thumb_paths_by_scene = make_scene_thumbnails(
-        video_path=local_video,
-        shots=shots,
-        out_dir=thumb_out_dir,
-        per_scene=3,
-        basename="shot"
-    )
+    thumb_paths_by_scene = None
+    if not manifest.done("thumbnails"):
+        # The decode can come out differently, so drop what the last attempt wrote first.
+        remove_checkpoint_outputs(s3, bucket, get_vector_store(), manifest, vid, namespace)
+        manifest.reset()
+        source = video_input()
+        progress("detect")
+        logging.info("Detecting Scenes + Making Thumbnails")
+        t_detect = time.perf_counter()
+        shots, thumb_paths_by_scene, thumb_timepoints, fps = detect_and_capture(
+            video_path=source,
+            threshold=req.threshold,
+            min_scene_len=req.min_scene_len,
+            out_dir=thumb_out_dir,
+            per_scene=req.max_thumbs_per_scene,
+            basename="shot",
+            dedupe_threshold=req.thumb_ssim_threshold,
+        )
+        t_detect = time.perf_counter() - t_detect
+        observe_rate(DETECT_FPS, shots[-1][3] if shots else 0, t_detect)
+        observe_rate(THUMBNAILS_PER_SECOND, sum(len(p) for p in thumb_paths_by_scene), t_detect)
+        manifest.mark_done(
+            "shots",
+            shots=[list(s) for s in shots],
+            fps=fps,
+            thumb_keys_by_scene=[
+                [thumbs_prefix + os.path.basename(p) for p in scene_paths]
+                for scene_paths in thumb_paths_by_scene
+            ],
+            thumb_times_by_scene=thumb_timepoints,
+        )
+    shots_stage = manifest.stage("shots")
+    shots = [tuple(s) for s in shots_stage["shots"]]
+    fps = shots_stage["fps"]
+    thumb_keys_by_scene = shots_stage["thumb_keys_by_scene"]
 
     # 7) Upload outputs under the SAME video folder
-    clip_s3_uris,  thumb_keys_by_scene = [], []
-
-    # created = sorted(
-    #     f for f in os.listdir(out_dir)
-    #     if f.startswith("shot-") and f.endswith(".mp4")
-    # )
-
-    # for filename in created:
-    #     local_path = os.path.join(out_dir, filename)
-    #     dest_key = clips_prefix + filename
-    #     s3.upload_file(local_path, bucket, dest_key, ExtraArgs={"ContentType": "video/mp4"})
-    #     clip_s3_uris.append(f"s3://{bucket}/{dest_key}")
-    logging.info("Uploading Thumbnails")
-    for scene_paths in thumb_paths_by_scene:
-        uris_keys = []
-        for p in scene_paths:
-            dest_key = thumbs_prefix + os.path.basename(p)
-            s3.upload_file(p, bucket, dest_key, ExtraArgs={"ContentType": "image/jpeg"})
-            uris_keys.append(dest_key)
-        thumb_keys_by_scene.append(uris_keys)
-    # 8) create embeddings / put in Pinecone 
-    logging.info("Creating Embeddings")
-    if thumb_paths_by_scene: 
-        flat_thumb_paths = [p for scene in thumb_paths_by_scene for p in scene]
-        flat_embeds = create_embeddings(flat_thumb_paths)
-    counts = [len(shot) for shot in thumb_paths_by_scene]
-    thumb_embeddings = []
-    i = 0
-    for c in counts:
-        thumb_embeddings.append(flat_embeds[i:i+c])
-        i += c
-    thumb_timepoints = []
-    for (start_s, end_s, start_f, end_f) in shots:
-        times = pick_timepoints(start_s, end_s, count=3)
-        thumb_timepoints.append(times)
-    logging.info("Putting Embeddings")
-    put_embeddings(thumb_embeddings=thumb_embeddings, 
-                   thumb_timepoints=thumb_timepoints, 
-                   source=req.source_s3_uri, 
-                   shots=shots,
-                   thumb_keys=thumb_keys_by_scene,
-                   bucket=S3_BUCKET)
-    
-    # 9) Write a small manifest.json for idempotency and UI
-    manifest = {
-        "source": f"s3://{bucket}/{key_path}",
-        "outputs": {
+    clip_s3_uris = manifest.stage("clips").get("uris", [])
+
+    if req.export_clips and not manifest.done("clips"):
+        progress("clips", shots=len(shots))
+        ensure_ffmpeg()
+        logging.info("Splitting Scenes")
+        # Clip re-encoding needs random access to a local file.
+        for local_path in export_clips(video_input(need_local=True), shots, fps, os.path.join(tmp_dir, "out")):
+            dest_key = clips_prefix + os.path.basename(local_path)
+            s3.upload_file(local_path, bucket, dest_key, ExtraArgs={"ContentType": "video/mp4"}, Config=TRANSFER_CONFIG)
+            clip_s3_uris.append(f"s3://{bucket}/{dest_key}")
+        manifest.mark_done("clips", uris=clip_s3_uris)
+
+    # 8) Upload thumbnails, create embeddings and put them in the vector store, overlapped.
+    # Each stage is checkpointed as it completes; finished ones are skipped on a retry.
+    records = build_vector_records(
+        vid=vid,
+        source=req.source_s3_uri,
+        shots=shots,
+        thumb_timepoints=shots_stage["thumb_times_by_scene"],
+        thumb_keys=thumb_keys_by_scene,
+    )
+    embeddings = None
+    emb_stage = manifest.stage("embeddings")
+    if manifest.done("embeddings") and emb_stage.get("model") == model_name:
+        progress("load_embeddings")
+        embeddings = get_npy(s3, bucket, emb_stage["key"])
+    elif thumb_paths_by_scene is None:
+        # Uploaded by an earlier attempt; the encoder needs them back on disk.
+        progress("fetch_thumbnails", thumbnails=len(records))
+        thumb_paths_by_scene = download_thumbnails(s3, bucket, thumb_keys_by_scene, thumb_out_dir)
+
+    def checkpoint_embeddings(arr: np.ndarray) -> None:
+        put_npy(s3, bucket, embeddings_key, arr)
+        manifest.mark_done("embeddings", key=embeddings_key, rows=int(arr.shape[0]), dim=int(arr.shape[1]), model=model_name)
+
+    logging.info("Uploading Thumbnails + Creating/Putting Embeddings")
+    progress("ingest", shots=len(shots), thumbnails=len(records))
+    while True:
+        manifest.begin_upsert(namespace)
+        try:
+            embeddings = run_ingest_pipeline(
+                s3_client=s3,
+                index=get_vector_store(),
+                namespace=namespace,
+                bucket=bucket,
+                thumbs_prefix=thumbs_prefix,
+                thumb_paths_by_scene=thumb_paths_by_scene,
+                records=records,
+                embeddings=embeddings,
+                upload=not manifest.done("thumbnails"),
+                skip_ranges=manifest.upserted_ranges(),
+                on_uploaded=lambda: manifest.mark_done("thumbnails"),
+                on_embedded=checkpoint_embeddings,
+                on_upserted=manifest.add_upserted,
+            )
+        except Exception:
+            manifest.save()  # upserted ranges are saved at most every CHECKPOINT_INTERVAL; keep the latest for the retry
+            raise
+        manifest.mark_done("upsert", namespace=namespace, ranges=[[0, len(records)]] if records else [])
+        # A version can still be activated mid-ingest (before this video's thumbnails are
+        # listed, or forced). Land the vectors in it too, so the video doesn't drop out of search.
+        latest = active_index.version(max_age=0)
+        if latest == index_version:
+            break
+        logging.info(f"Index version switched to {latest or '(original)'} during the ingest; upserting into it too")
+        progress("version_switch", version=latest)
+        index_version, namespace = latest, namespace_for(vid, latest)
+        embeddings_key = embeddings_key_for(base_prefix, latest)
+    if manifest.stage("embeddings").get("key") != embeddings_key:
+        checkpoint_embeddings(embeddings)  # loaded from, or written under, another version's key
+    if index_version:
+        # The marker a re-index leaves, so activating or re-indexing this version counts the video
+        write_done_marker(s3, bucket, base_prefix, index_version, namespace, len(records))
+
+    # 9) Mark the manifest complete; it stays the idempotency marker and feeds the UI
+    progress("manifest")
+    manifest.finish(
+        outputs={
             "clips_prefix": f"s3://{bucket}/{clips_prefix}",
             "thumbnails_prefix": f"s3://{bucket}/{thumbs_prefix}",
             "clips": clip_s3_uris,
+            "embeddings": f"s3://{bucket}/{embeddings_key}",
         },
-        "shots": [
+        shots=[
             {"start_time": s[0], "end_time": s[1], "start_frame": s[2], "end_frame": s[3]}
             for s in shots
         ],
-    }
-    s3.put_object(
-        Bucket=bucket,
-        Key=manifest_key,
-        Body=json.dumps(manifest).encode("utf-8"),
-        ContentType="application/json"
     )
+    manifest_cache.put(manifest)
 
     return SplitShotsResponse(
         already_processed=False,
@@ -581,7 +873,115 @@ def split_shots(req: SplitShotsRequest):
             start_time=s[0], end_time=s[1],
             start_frame=s[2], end_frame=s[3]
         ) for s in shots], 
-        thumb_keys_by_scene=thumb_keys_by_scene,
-        thumb_embeddings=thumb_embeddings,
-        pc_namespace=video_id_from_s3_uri(req.source_s3_uri)
-    )
\ No newline at end of file
+        thumbnail_s3_uris_by_scene=thumbnail_uris(bucket, thumb_keys_by_scene),
+        thumb_embeddings=split_by_scene(embeddings, thumb_keys_by_scene) if req.include_embeddings else None,
+        embeddings_s3_uri=f"s3://{bucket}/{embeddings_key}",
+        pc_namespace=namespace
+    )
+
+@app.post("/split_shots", response_model=SplitShotsResponse)
+def split_shots(req: SplitShotsRequest):
+    return run_split_shots(req)
+
+EMBEDDINGS_CHUNK_BYTES = 1024 * 1024
+
+@app.get("/embeddings")
+def get_embeddings(filename: str):
+    """
+    A video's thumbnail embeddings as the float32 .npy written at ingest, streamed from S3:
+    one row per thumbnail, in the scene order of thumbnail_s3_uris_by_scene. Served from the
+    active index version, falling back to the unversioned file of videos not re-indexed.
+    """
+    try:
+        bucket, key_path = parse_s3_uri(filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    base_prefix = f"{key_path}/"
+    version = active_index.version()
+    for v in dict.fromkeys([version, ""]):
+        key = embeddings_key_for(base_prefix, v)
+        try:
+            obj = s3.get_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                continue
+            raise
+        body = obj["Body"]
+        chunks = iter(lambda: body.read(EMBEDDINGS_CHUNK_BYTES), b"")
+        headers = {
+            "Content-Disposition": f'attachment; filename="{video_id_from_s3_uri(filename)}.npy"',
+            "X-Index-Version": v,
+        }
+        if obj.get("ContentLength") is not None:
+            headers["Content-Length"] = str(obj["ContentLength"])
+        return StreamingResponse(chunks, media_type="application/octet-stream", headers=headers)
+    raise HTTPException(status_code=404, detail=f"No embeddings stored for {filename}")
+
+# ---------- Ingest jobs ----------
+
+def _split_shots_job(req: SplitShotsRequest, progress: ProgressFn) -> Dict[str, Any]:
+    # Embeddings are left out of the stored result; they already live in the index.
+    return run_split_shots(req, progress).model_dump(exclude={"thumb_embeddings"})
+
+job_store = JobStore()
+job_runner = JobRunner(job_store, _split_shots_job)
+
+class JobCreated(BaseModel):
+    job_id: str
+    status: str
+    deduplicated: bool
+
+@app.post("/jobs", response_model=JobCreated, status_code=202)
+def create_job(req: SplitShotsRequest):
+    # One active job per video: a second request for the same video joins the running job.
+    job, created = job_runner.submit(video_id_from_s3_uri(req.source_s3_uri), req)
+    return JobCreated(job_id=job["id"], status=job["status"], deduplicated=not created)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+# ---------- Re-index ----------
+
+class ReindexRequest(BaseModel):
+    version: str                    # new index version, e.g. "v2"
+    prefix: str = VIDEOS_PREFIX     # limit the walk to part of the library
+    activate: bool = False          # switch to the version when every video is done
+
+class ActivateRequest(BaseModel):
+    version: str                    # "" rolls back to the original namespaces
+    force: bool = False             # activate even if some videos are missing from the version
+
+def _reindex_job(req: ReindexRequest, progress: ProgressFn) -> Dict[str, Any]:
+    res = reindex_library(s3, get_vector_store(), S3_BUCKET, req.version, req.prefix, progress=progress)
+    if req.activate and not res["failed"]:
+        progress("activate")
+        res["active"] = activate_version(s3, S3_BUCKET, active_index, req.version, req.prefix)
+    return res
+
+# One re-index at a time; each already fans out over videos and thumbnails.
+reindex_runner = JobRunner(job_store, _reindex_job, workers=1, name="reindex")
+
+@app.post("/reindex", response_model=JobCreated, status_code=202)
+def create_reindex(req: ReindexRequest):
+    """Re-embed all stored thumbnails into a new index version, as a background job (poll /jobs/{job_id})."""
+    try:
+        check_version(req.version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job, created = reindex_runner.submit(f"reindex:{req.version}", req)
+    return JobCreated(job_id=job["id"], status=job["status"], deduplicated=not created)
+
+@app.get("/index")
+def get_index():
+    return active_index.state()
+
+@app.post("/index/activate")
+def activate_index(req: ActivateRequest):
+    try:
+        return activate_version(s3, S3_BUCKET, active_index, req.version, force=req.force)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -0,0 +1,208 @@
+import io, os, json, logging, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+MANIFEST_VERSION = 2
+CHECKPOINT_INTERVAL = float(os.getenv("INGEST_CHECKPOINT_INTERVAL", "5"))  # min seconds between mid-stage writes
+MANIFEST_CACHE_SIZE = int(os.getenv("MANIFEST_CACHE_SIZE", "1024"))
+MANIFEST_CACHE_TTL = float(os.getenv("MANIFEST_CACHE_TTL", "600"))  # seconds
+
+# Ingest stages in the order they complete. "shots" covers the single decode that also
+# captures the thumbnails locally; "thumbnails" is their upload.
+STAGES = ("shots", "clips", "thumbnails", "embeddings", "upsert")
+
+
+# ---------- Row ranges ----------
+def merge_ranges(ranges: Sequence[Sequence[int]]) -> List[List[int]]:
+    """Sorted, non-overlapping [start, stop) ranges covering the same rows."""
+    out: List[List[int]] = []
+    for start, stop in sorted((int(a), int(b)) for a, b in ranges):
+        if out and start <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], stop)
+        else:
+            out.append([start, stop])
+    return out
+
+
+def subtract_ranges(start: int, stop: int, done: List[List[int]]) -> List[Tuple[int, int]]:
+    """The parts of [start, stop) not covered by `done` (as returned by merge_ranges)."""
+    out = []
+    cur = start
+    for a, b in done:
+        if b <= cur:
+            continue
+        if a >= stop:
+            break
+        if a > cur:
+            out.append((cur, a))
+        cur = max(cur, b)
+    if cur < stop:
+        out.append((cur, stop))
+    return out
+
+
+# ---------- Arrays in S3 ----------
+def put_npy(s3_client, bucket: str, key: str, arr: np.ndarray) -> None:
+    buf = io.BytesIO()
+    np.save(buf, arr, allow_pickle=False)
+    s3_client.put_object(Bucket=bucket, Key=key, Body=buf.getvalue(), ContentType="application/octet-stream")
+
+
+def get_npy(s3_client, bucket: str, key: str) -> np.ndarray:
+    body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    return np.load(io.BytesIO(body), allow_pickle=False)
+
+
+# ---------- Manifest ----------
+class IngestManifest:
+    """
+    manifest.json of one video, rewritten as each ingest stage completes so a failed
+    ingest resumes from the first incomplete stage instead of starting over:
+
+        {
+          "version": 2, "complete": false,
+          "source": "s3://...", "params": {...detection params...},
+          "stages": {
+            "shots":      {"done": true, "shots": [...], "fps": 25.0,
+                           "thumb_keys_by_scene": [[...]], "thumb_times_by_scene": [[...]]},
+            "clips":      {"done": true, "uris": [...]},
+            "thumbnails": {"done": true},
+            "embeddings": {"done": true, "key": "videos/<id>/embeddings.npy", "rows": 120, "dim": 768, "model": "..."},
+            "upsert":     {"done": false, "namespace": "<id>", "ranges": [[0, 100]]}
+          },
+          "outputs": {...}, "shots": [...]     # written on completion, as before
+        }
+
+    Manifests written before checkpoints existed were only written on success, so a
+    manifest without "version" counts as complete.
+    """
+    def __init__(self, s3_client, bucket: str, key: str, data: Dict[str, Any]):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.data = data
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    @classmethod
+    def new(cls, s3_client, bucket: str, key: str, source: str, params: Dict[str, Any]) -> "IngestManifest":
+        data = {"version": MANIFEST_VERSION, "complete": False, "source": source, "params": params, "stages": {}}
+        return cls(s3_client, bucket, key, data)
+
+    @classmethod
+    def load(cls, s3_client, bucket: str, key: str) -> Optional["IngestManifest"]:
+        try:
+            body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return None
+            raise
+        return cls(s3_client, bucket, key, json.loads(body))
+
+    @property
+    def complete(self) -> bool:
+        return "version" not in self.data or bool(self.data.get("complete"))
+
+    def stage(self, name: str) -> Dict[str, Any]:
+        return self.data.get("stages", {}).get(name, {})
+
+    def done(self, name: str) -> bool:
+        return bool(self.stage(name).get("done"))
+
+    def first_incomplete(self, skip: Sequence[str] = ()) -> Optional[str]:
+        return next((s for s in STAGES if s not in skip and not self.done(s)), None)
+
+    def mark_done(self, name: str, **fields) -> None:
+        with self._lock:
+            self.data["stages"][name] = {**self.data["stages"].get(name, {}), **fields, "done": True}
+        self.save()
+
+    def reset(self) -> None:
+        """Forget every stage, e.g. before a fresh decode."""
+        with self._lock:
+            self.data["stages"] = {}
+            self.data["complete"] = False
+
+    def begin_upsert(self, namespace: str) -> None:
+        """Record the namespace rows are upserted to; ranges recorded for another namespace are dropped."""
+        with self._lock:
+            up = self.data["stages"].get("upsert", {})
+            if up.get("namespace") not in (None, namespace):
+                up = {}
+            self.data["stages"]["upsert"] = {"done": False, "ranges": [], **up, "namespace": namespace}
+
+    def upserted_ranges(self) -> List[List[int]]:
+        with self._lock:
+            return [list(r) for r in self.stage("upsert").get("ranges", [])]
+
+    def add_upserted(self, start: int, stop: int) -> None:
+        """Record rows [start, stop) as upserted; called from the upsert workers."""
+        with self._lock:
+            up = self.data["stages"].setdefault("upsert", {"done": False, "ranges": []})
+            up["ranges"] = merge_ranges(up["ranges"] + [[start, stop]])
+            due = time.monotonic() - self._last_save >= CHECKPOINT_INTERVAL
+        if due:
+            self.save()
+
+    def finish(self, **fields) -> None:
+        with self._lock:
+            self.data.update(fields)
+            self.data["complete"] = True
+        self.save()
+
+    def save(self) -> None:
+        # One writer at a time, so an older snapshot never lands after a newer one.
+        with self._lock:
+            body = json.dumps(self.data).encode("utf-8")
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=body, ContentType="application/json")
+            self._last_save = time.monotonic()
+        logging.info(f"Checkpoint s3://{self.bucket}/{self.key}: {', '.join(s for s in STAGES if self.done(s)) or 'started'}")
+
+
+class ManifestCache:
+    """
+    Bounded LRU of complete manifests by (bucket, key). A complete manifest is not written
+    again, so repeated checks of processed videos skip the S3 read and JSON parse; the TTL
+    bounds how long a deleted or re-ingested video is still served from memory.
+    """
+    def __init__(self, max_entries: int = MANIFEST_CACHE_SIZE, ttl_s: float = MANIFEST_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, s3_client, bucket: str, key: str) -> Optional[IngestManifest]:
+        """Like IngestManifest.load, served from memory for complete manifests."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((bucket, key))
+            if entry is not None and now - entry[0] <= self.ttl_s:
+                self._entries.move_to_end((bucket, key))
+                self.hits += 1
+                return IngestManifest(s3_client, bucket, key, entry[1])
+            self.misses += 1
+        manifest = IngestManifest.load(s3_client, bucket, key)
+        if manifest is not None:
+            self.put(manifest)
+        return manifest
+
+    def put(self, manifest: IngestManifest) -> None:
+        if not manifest.complete:
+            return  # still being checkpointed
+        with self._lock:
+            self._entries[(manifest.bucket, manifest.key)] = (time.monotonic(), manifest.data)
+            self._entries.move_to_end((manifest.bucket, manifest.key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+manifest_cache = ManifestCache()
@@ -0,0 +1,271 @@
+import os, bisect, logging, resource, threading, time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition (format 0.0.4) without the client library: a handful of
+# counters, gauges and histograms, rendered on GET /metrics.
+
+TRACE_SPANS = os.getenv("TRACE_SPANS", "0") == "1"  # OpenTelemetry spans, if the package is installed
+RSS_SAMPLE_INTERVAL = float(os.getenv("RSS_SAMPLE_INTERVAL", "0.5"))  # seconds
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RATE_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BYTE_BUCKETS = tuple(2 ** p for p in range(20, 36, 2))  # 1 MiB .. 32 GiB
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, fn: Optional[Callable[[], Dict[Labels, float]]] = None):
+        self.name = name
+        self.doc = doc
+        self.fn = fn  # scrape-time callback: {labels: value}
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def samples(self) -> List[str]:
+        values = self.fn() if self.fn else dict(self._values)
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(values.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, buckets: Sequence[float] = TIME_BUCKETS):
+        super().__init__(name, doc)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}  # per-bucket counts + [sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            s = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            i = bisect.bisect_left(self.buckets, value)  # first bucket with le >= value
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        out = []
+        for key, s in sorted(series.items()):
+            cum = 0.0
+            for le, n in zip(self.buckets, s):
+                cum += n
+                out.append(f"{self.name}_bucket{_fmt_labels(key, [('le', _fmt_value(le))])} {_fmt_value(cum)}")
+            out.append(f"{self.name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {_fmt_value(s[-1])}")
+            out.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(s[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(key)} {_fmt_value(s[-1])}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def add(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, doc: str, fn=None) -> Counter:
+        return self.add(Counter(name, doc, fn))
+
+    def gauge(self, name: str, doc: str, fn=None) -> Gauge:
+        return self.add(Gauge(name, doc, fn))
+
+    def histogram(self, name: str, doc: str, buckets: Sequence[float] = TIME_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, doc, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics.values():
+            try:
+                samples = m.samples()
+            except Exception:
+                logging.exception(f"Metric {m.name} failed to collect")
+                continue
+            lines += [f"# HELP {m.name} {m.doc}", f"# TYPE {m.name} {m.kind}", *samples]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------- Ingest ----------
+INGEST_STAGE_SECONDS = REGISTRY.histogram("sceneit_ingest_stage_seconds", "Wall time of each ingest stage.")
+INGEST_DOWNLOAD_BYTES = REGISTRY.histogram("sceneit_ingest_download_bytes", "Size of source videos downloaded for ingest.", BYTE_BUCKETS)
+DETECT_FPS = REGISTRY.histogram("sceneit_detect_frames_per_second", "Frames decoded per second by shot detection.", RATE_BUCKETS)
+THUMBNAILS_PER_SECOND = REGISTRY.histogram("sceneit_thumbnails_per_second", "Thumbnails written per second of the detect+capture decode.", RATE_BUCKETS)
+UPLOADS_PER_SECOND = REGISTRY.histogram("sceneit_thumbnail_uploads_per_second", "Thumbnails uploaded to S3 per second.", RATE_BUCKETS)
+EMBED_PER_SECOND = REGISTRY.histogram("sceneit_embed_images_per_second", "Images embedded per second during ingest.", RATE_BUCKETS)
+UPSERT_PER_SECOND = REGISTRY.histogram("sceneit_upsert_vectors_per_second", "Vectors upserted per second during ingest.", RATE_BUCKETS)
+INGESTS = REGISTRY.counter("sceneit_ingests_total", "Finished ingests by outcome.")
+JOB_PEAK_RSS_BYTES = REGISTRY.histogram("sceneit_job_peak_rss_bytes", "Peak process RSS while a job ran.", BYTE_BUCKETS)
+
+# ---------- Search ----------
+SEARCH_SECONDS = REGISTRY.histogram("sceneit_search_seconds", "Search latency by endpoint and phase (encode, query, total).")
+
+
+def observe_rate(hist: Histogram, items: int, seconds: float, **labels) -> None:
+    if items and seconds > 0:
+        hist.observe(items / seconds, **labels)
+
+
+# ---------- Trace spans ----------
+_tracer = None
+_tracer_checked = False
+
+
+def _get_tracer():
+    global _tracer, _tracer_checked
+    if not _tracer_checked:
+        _tracer_checked = True
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("sceneit")
+        except ImportError:
+            logging.warning("TRACE_SPANS=1 needs the opentelemetry-api package; spans are disabled")
+    return _tracer
+
+
+class _NoSpan:
+    def set_attribute(self, key, value) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+def start_span(name: str, **attrs):
+    """An OpenTelemetry span when TRACE_SPANS=1 (end it with .end()), otherwise a no-op."""
+    tracer = _get_tracer() if TRACE_SPANS else None
+    if tracer is None:
+        return _NoSpan()
+    return tracer.start_span(name, attributes={k: v for k, v in attrs.items() if v is not None})
+
+
+@contextmanager
+def span(name: str, **attrs):
+    s = start_span(name, **attrs)
+    try:
+        yield s
+    finally:
+        s.end()
+
+
+class StageRecorder:
+    """
+    Wraps an ingest progress callback: each stage's wall time goes to INGEST_STAGE_SECONDS
+    (and a span, when tracing) as the next stage starts or on close().
+    """
+    def __init__(self, progress: Callable[..., None], trace_name: str = "ingest", **attrs):
+        self.progress = progress
+        self.root = start_span(trace_name, **attrs)
+        self._stage: Optional[Tuple[str, float, object]] = None
+        self.durations: Dict[str, float] = {}
+
+    def _end_stage(self) -> None:
+        if self._stage is not None:
+            name, t0, s = self._stage
+            dt = time.perf_counter() - t0
+            self.durations[name] = self.durations.get(name, 0.0) + dt
+            INGEST_STAGE_SECONDS.observe(dt, stage=name)
+            s.end()
+            self._stage = None
+
+    def __call__(self, stage: str, **info) -> None:
+        self._end_stage()
+        self._stage = (stage, time.perf_counter(), start_span(f"ingest.{stage}"))
+        self.progress(stage, **info)
+
+    def close(self, outcome: str) -> None:
+        self._end_stage()
+        INGESTS.inc(outcome=outcome)
+        self.root.set_attribute("outcome", outcome)
+        self.root.end()
+
+
+# ---------- Memory ----------
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No procfs: fall back to the process high-water mark (KiB on Linux, bytes on macOS).
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if os.uname().sysname == "Darwin" else rss * 1024
+
+
+class RssSampler:
+    """
+    Samples process RSS in a background thread while the block runs; .peak is the highest
+    value seen. Jobs share the process, so concurrent jobs see each other's memory too.
+    """
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while True:
+            self.peak = max(self.peak, current_rss_bytes())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "RssSampler":
+        self.peak = current_rss_bytes()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
@@ -0,0 +1,343 @@
+import os, sys, io, re, json, logging, threading, time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if __name__ == "__main__":
+    # CLI run: the modules below read their settings at import, so load backend/.env first.
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env", override=True)
+
+from botocore.exceptions import ClientError
+
+from .embeddings import EMBED_BATCH_SIZE, iter_images, model_name
+from .ingest import build_vector_records, run_ingest_pipeline, video_id_from_s3_uri
+from .manifest import IngestManifest, put_npy
+from .video import pick_timepoints
+
+INDEX_STATE_KEY = os.getenv("INDEX_STATE_KEY", "index/active.json")  # S3 key of the active-version pointer
+INDEX_STATE_TTL = float(os.getenv("INDEX_STATE_TTL", "30"))  # seconds a process trusts its copy of it
+REINDEX_VIDEO_WORKERS = int(os.getenv("REINDEX_VIDEO_WORKERS", "4"))  # videos re-embedded at once
+REINDEX_FETCH_WORKERS = int(os.getenv("REINDEX_FETCH_WORKERS", "16"))  # concurrent thumbnail GETs
+READ_AHEAD = 2 * EMBED_BATCH_SIZE  # thumbnail GETs in flight per video, ahead of the encoder
+VIDEOS_PREFIX = "videos/"
+
+_VERSION_RE = re.compile(r"^[A-Za-z0-9-]{1,32}$")
+_THUMB_RE = re.compile(r"-(\d+)_(\d+)\.jpg$")  # shot-XXX_YY.jpg
+
+
+# ---------- Index versions ----------
+# Version "" is the original layout: one namespace per video id. A re-index writes version
+# v into "<vid>__v" and leaves a marker at <video prefix>index/v/done.json; activating v
+# rewrites the pointer object, which switches searches and new ingests in one PUT. Ingests
+# while v is active write only "<vid>__v", and leave the same marker.
+
+def namespace_for(vid: str, version: str) -> str:
+    return f"{vid}__{version}" if version else vid
+
+
+def namespace_version(namespace: str) -> str:
+    return namespace.partition("__")[2]
+
+
+def version_prefix(base_prefix: str, version: str) -> str:
+    return f"{base_prefix}index/{version}/"
+
+
+def embeddings_key_for(base_prefix: str, version: str) -> str:
+    return version_prefix(base_prefix, version) + "embeddings.npy" if version else base_prefix + "embeddings.npy"
+
+
+def write_done_marker(s3_client, bucket: str, base_prefix: str, version: str, namespace: str, rows: int) -> None:
+    marker = {"namespace": namespace, "rows": rows, "model": model_name, "finished_at": time.time()}
+    s3_client.put_object(Bucket=bucket, Key=version_prefix(base_prefix, version) + "done.json",
+                         Body=json.dumps(marker).encode("utf-8"), ContentType="application/json")
+
+
+def check_version(version: str) -> str:
+    if not _VERSION_RE.match(version):
+        raise ValueError(f"Invalid index version {version!r}: use 1-32 letters, digits or '-'")
+    return version
+
+
+class ActiveIndex:
+    """
+    The index version searches and ingests use, read from s3://<bucket>/<INDEX_STATE_KEY>:
+
+        {"version": "v2", "model": "openai/clip-vit-large-patch14", "activated_at": 1700000000.0}
+
+    No pointer object means version "". Each process re-reads it at most every `ttl` seconds;
+    writers pass max_age=0 so they never act on a copy from before an activation.
+    """
+    def __init__(self, s3_client, bucket: str, key: str = INDEX_STATE_KEY, ttl: float = INDEX_STATE_TTL):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._state: Dict[str, Any] = {}
+        self._loaded_at = float("-inf")
+
+    def state(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        with self._lock:
+            if time.monotonic() - self._loaded_at < (self.ttl if max_age is None else max_age):
+                return dict(self._state)
+        try:
+            state = json.loads(self.s3.get_object(Bucket=self.bucket, Key=self.key)["Body"].read())
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+                raise
+            state = {"version": ""}
+        with self._lock:
+            self._state, self._loaded_at = state, time.monotonic()
+        return dict(state)
+
+    def version(self, max_age: Optional[float] = None) -> str:
+        return self.state(max_age).get("version", "")
+
+    def namespace(self, vid: str) -> str:
+        return namespace_for(vid, self.version())
+
+    def activate(self, version: str, **info) -> Dict[str, Any]:
+        state = {"version": version, "activated_at": time.time(), **info}
+        self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=json.dumps(state).encode("utf-8"),
+                           ContentType="application/json")
+        with self._lock:
+            self._state, self._loaded_at = state, time.monotonic()
+        logging.info(f"Active index version is now {version or '(original)'}")
+        return state
+
+
+# ---------- Walking the library ----------
+def list_videos(s3_client, bucket: str, prefix: str = VIDEOS_PREFIX) -> Dict[str, Dict[str, Any]]:
+    """
+    One paginated listing of everything under `prefix`, grouped by video output prefix:
+        {"videos/a.mp4-<hash>/a.mp4/": {"thumbnails": [keys], "manifest": bool, "versions": {"v2"}}}
+    Only prefixes with thumbnails are returned.
+    """
+    videos: Dict[str, Dict[str, Any]] = {}
+
+    def entry(base: str) -> Dict[str, Any]:
+        return videos.setdefault(base, {"thumbnails": [], "manifest": False, "versions": set()})
+
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            base, sep, name = key.partition("/thumbnails/")
+            if sep and name:
+                entry(base + "/")["thumbnails"].append(key)
+                continue
+            base, sep, name = key.partition("/index/")
+            if sep and name.endswith("/done.json"):
+                entry(base + "/")["versions"].add(name[:-len("/done.json")])
+            elif key.endswith("/manifest.json"):
+                entry(key[:-len("manifest.json")])["manifest"] = True
+    return {base: v for base, v in videos.items() if v["thumbnails"]}
+
+
+def video_records(manifest: IngestManifest, thumb_keys: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Vector records for a completed ingest. Checkpointed manifests carry the exact thumbnail
+    keys and times; older ones only list shots, so thumbnails are matched to scenes by file
+    name and timed by pick_timepoints, as the pre-checkpoint ingest picked them.
+    """
+    source = manifest.data["source"]
+    vid = video_id_from_s3_uri(source)
+    shots_stage = manifest.stage("shots")
+    if "thumb_keys_by_scene" in shots_stage:
+        return build_vector_records(
+            vid=vid,
+            source=source,
+            shots=[tuple(s) for s in shots_stage["shots"]],
+            thumb_timepoints=shots_stage["thumb_times_by_scene"],
+            thumb_keys=shots_stage["thumb_keys_by_scene"],
+        )
+    shots = [(s["start_time"], s["end_time"], s["start_frame"], s["end_frame"]) for s in manifest.data.get("shots", [])]
+    keys_by_scene: List[List[Tuple[int, str]]] = [[] for _ in shots]
+    for key in thumb_keys:
+        m = _THUMB_RE.search(key)
+        if m and int(m.group(1)) < len(shots):
+            keys_by_scene[int(m.group(1))].append((int(m.group(2)), key))
+    keys = [[k for _, k in sorted(scene)] for scene in keys_by_scene]
+    times = []
+    for (start_s, end_s, _, _), scene_keys in zip(shots, keys):
+        picked = pick_timepoints(start_s, end_s, len(scene_keys)) if scene_keys else []
+        times.append((picked + picked[-1:] * len(scene_keys))[:len(scene_keys)])
+    return build_vector_records(vid=vid, source=source, shots=shots, thumb_timepoints=times, thumb_keys=keys)
+
+
+# ---------- Re-embedding ----------
+def read_ahead(pool: ThreadPoolExecutor, fn: Callable[[Any], Any], items: Iterable[Any],
+               depth: int = READ_AHEAD) -> Iterator[Any]:
+    """pool.map, in order, but with at most `depth` calls submitted ahead of the consumer."""
+    items = iter(items)
+    pending: Deque[Future] = deque()
+    try:
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+def reindex_video(
+    s3_client,
+    store,
+    bucket: str,
+    base_prefix: str,
+    listing: Dict[str, Any],
+    version: str,
+    fetch_pool: ThreadPoolExecutor,
+) -> Tuple[str, int]:
+    """Re-embed one video's stored thumbnails into its `version` namespace. Returns (status, vectors)."""
+    if version in listing["versions"]:
+        return "already_done", 0
+    manifest = IngestManifest.load(s3_client, bucket, base_prefix + "manifest.json")
+    if manifest is None or not manifest.complete:
+        # Unfinished ingests resume themselves (and write to the active version).
+        return "incomplete", 0
+    records = video_records(manifest, listing["thumbnails"])
+    keys = [meta["thumb_key"] for _, meta in records]
+
+    def fetch(key: str) -> io.BytesIO:
+        return io.BytesIO(s3_client.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+    # GETs run a couple of batches ahead on the shared pool while the encoder consumes them in
+    # order, and each encoded batch is upserted while the next one is fetched and encoded.
+    namespace = namespace_for(video_id_from_s3_uri(manifest.data["source"]), version)
+    embeddings = run_ingest_pipeline(
+        s3_client=s3_client,
+        index=store,
+        namespace=namespace,
+        bucket=bucket,
+        thumbs_prefix=base_prefix + "thumbnails/",
+        thumb_paths_by_scene=None,
+        records=records,
+        images=iter_images(read_ahead(fetch_pool, fetch, keys)),
+        upload=False,
+    )
+    put_npy(s3_client, bucket, embeddings_key_for(base_prefix, version), embeddings)
+    write_done_marker(s3_client, bucket, base_prefix, version, namespace, len(records))
+    return "reindexed", len(records)
+
+
+def reindex_library(
+    s3_client,
+    store,
+    bucket: str,
+    version: str,
+    prefix: str = VIDEOS_PREFIX,
+    workers: int = REINDEX_VIDEO_WORKERS,
+    progress: Callable[..., None] = lambda stage, **info: None,
+) -> Dict[str, Any]:
+    """
+    Re-embed every ingested video from the thumbnails already in S3 (no video download or
+    scene detection) into index version `version`. Videos finished by an earlier run are
+    skipped, so an interrupted run just starts again. Searches are unaffected until
+    `activate_version`.
+    """
+    check_version(version)
+    progress("list", prefix=prefix)
+    videos = list_videos(s3_client, bucket, prefix)
+    progress("reindex", videos=len(videos))
+    counts = {"reindexed": 0, "already_done": 0, "incomplete": 0}
+    vectors = 0
+    failed: Dict[str, str] = {}
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=REINDEX_FETCH_WORKERS, thread_name_prefix="reindex-fetch") as fetch_pool, \
+         ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reindex") as pool:
+        futures = {
+            pool.submit(reindex_video, s3_client, store, bucket, base, listing, version, fetch_pool): base
+            for base, listing in videos.items()
+        }
+        for fut in as_completed(futures):
+            base = futures[fut]
+            try:
+                status, n = fut.result()
+            except Exception as e:
+                logging.exception(f"Re-index of {base} failed")
+                failed[base] = str(e)
+                continue
+            counts[status] += 1
+            vectors += n
+            if status == "reindexed":
+                logging.info(f"Re-indexed {base} ({n} vectors) into version {version}")
+    logging.info(f"Re-index {version}: {counts}, {len(failed)} failed, {vectors} vectors in {time.time() - t0:.1f}s")
+    return {"version": version, "videos": len(videos), **counts, "failed": failed, "vectors": vectors}
+
+
+def activate_version(
+    s3_client,
+    bucket: str,
+    active_index: ActiveIndex,
+    version: str,
+    prefix: str = VIDEOS_PREFIX,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """
+    Point searches and new ingests at `version`. Refused while any ingested video under
+    `prefix` lacks that version, unless `force`. Version "" rolls back to the original
+    namespaces, which videos ingested while another version was active are missing from.
+    """
+    if version:
+        check_version(version)
+    videos = list_videos(s3_client, bucket, prefix)
+    if version:
+        missing = [base for base, v in videos.items() if v["manifest"] and version not in v["versions"]]
+    else:
+        # Only videos with a version marker can have been ingested into a version.
+        missing = [base for base, v in videos.items()
+                   if v["manifest"] and v["versions"] and ingested_version(s3_client, bucket, base)]
+    if missing and not force:
+        if version:
+            raise ValueError(f"{len(missing)} videos are not re-indexed into {version} yet, e.g. {missing[0]}")
+        raise ValueError(f"{len(missing)} videos were ingested into a later version only and would "
+                         f"drop out of search, e.g. {missing[0]}")
+    return active_index.activate(version, model=model_name)
+
+
+def ingested_version(s3_client, bucket: str, base_prefix: str) -> str:
+    """Index version the video's own ingest wrote to ("" for the original namespaces)."""
+    manifest = IngestManifest.load(s3_client, bucket, base_prefix + "manifest.json")
+    if manifest is None:
+        return ""
+    return namespace_version(manifest.stage("upsert").get("namespace", ""))
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run from backend/:
+        python -m app.reindex --version v2              # re-embed everything into v2
+        python -m app.reindex --version v2 --activate   # ... then switch searches over
+    """
+    import argparse
+    from .storage import make_s3_client
+    from .vector_store import get_vector_store
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    ap = argparse.ArgumentParser(description="Re-embed stored thumbnails into a new index version")
+    ap.add_argument("--version", required=True)
+    ap.add_argument("--prefix", default=VIDEOS_PREFIX)
+    ap.add_argument("--workers", type=int, default=REINDEX_VIDEO_WORKERS)
+    ap.add_argument("--activate", action="store_true", help="switch to the version once every video is done")
+    args = ap.parse_args(argv)
+
+    s3_client = make_s3_client()
+    bucket = os.getenv("S3_BUCKET")
+    res = reindex_library(s3_client, get_vector_store(), bucket, args.version, args.prefix, args.workers)
+    print(json.dumps(res, indent=2))
+    if res["failed"]:
+        return 1
+    if args.activate:
+        activate_version(s3_client, bucket, ActiveIndex(s3_client, bucket), args.version, args.prefix)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import os, shutil, tempfile, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+SCRATCH_DIR = os.getenv("SCRATCH_DIR") or tempfile.gettempdir()
+SCRATCH_QUOTA_BYTES = int(os.getenv("SCRATCH_QUOTA_BYTES", "0"))  # 0 = no quota
+SCRATCH_WAIT_TIMEOUT = float(os.getenv("SCRATCH_WAIT_TIMEOUT", "3600"))  # seconds a job waits for space
+
+
+class ScratchQuotaTimeout(RuntimeError):
+    pass
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass  # removed while walking
+    return total
+
+
+class ScratchSpace:
+    """
+    Per-job scratch directories under one root, with a shared disk quota.
+
+        with scratch.workspace("scenes_", reserve_bytes=video_size) as tmp_dir:
+            ...  # tmp_dir and everything in it is removed on exit, success or failure
+
+    A job reserves its expected footprint up front and waits while the reservations of
+    running jobs would exceed the quota. A job larger than the whole quota still runs,
+    but only once nothing else holds scratch space.
+    """
+    def __init__(self, root: str = SCRATCH_DIR, quota_bytes: int = SCRATCH_QUOTA_BYTES,
+                 wait_timeout: float = SCRATCH_WAIT_TIMEOUT):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.wait_timeout = wait_timeout
+        self._cond = threading.Condition()
+        self._reserved = 0
+        self._active: Dict[str, int] = {}  # path -> reserved bytes
+        self._waiting = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _fits(self, reserve_bytes: int) -> bool:
+        if not self.quota_bytes or not self._active:
+            return True
+        return self._reserved + reserve_bytes <= self.quota_bytes
+
+    @contextmanager
+    def workspace(self, prefix: str, reserve_bytes: int = 0, timeout: Optional[float] = None) -> Iterator[str]:
+        deadline = time.monotonic() + (self.wait_timeout if timeout is None else timeout)
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._fits(reserve_bytes):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ScratchQuotaTimeout(
+                            f"Timed out waiting for {reserve_bytes} bytes of scratch space "
+                            f"({self._reserved}/{self.quota_bytes} reserved)"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            path = tempfile.mkdtemp(prefix=prefix, dir=self.root)
+            self._active[path] = reserve_bytes
+            self._reserved += reserve_bytes
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            with self._cond:
+                self._reserved -= self._active.pop(path)
+                self._cond.notify_all()
+
+    def stats(self, held: bool = True) -> Dict[str, Any]:
+        """`held` adds the bytes actually on disk, which walks every workspace."""
+        with self._cond:
+            active = dict(self._active)
+            out = {
+                "root": self.root,
+                "quota_bytes": self.quota_bytes,
+                "reserved_bytes": self._reserved,
+                "workspaces": len(active),
+                "waiting": self._waiting,
+            }
+        if held:
+            out["held_bytes"] = sum(dir_size(p) for p in active)
+        return out
+
+
+scratch = ScratchSpace()
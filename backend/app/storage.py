@@ -0,0 +1,102 @@
+import os, time, threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+# One S3 client for the whole process: boto3 clients are thread-safe, and sharing one keeps
+# its connection pool (and TLS sessions) warm across requests, jobs and upload workers.
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "64"))  # >= concurrent S3 calls
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "5"))
+S3_TRANSFER_CONCURRENCY = int(os.getenv("S3_TRANSFER_CONCURRENCY", "8"))  # parts in flight per file
+S3_MULTIPART_CHUNK_BYTES = int(os.getenv("S3_MULTIPART_CHUNK_BYTES", str(16 * 1024 * 1024)))
+S3_DELETE_BATCH = 1000  # most keys one DeleteObjects request takes
+
+PRESIGN_CACHE_SIZE = int(os.getenv("PRESIGN_CACHE_SIZE", "20000"))
+PRESIGN_MIN_REMAINING = float(os.getenv("PRESIGN_MIN_REMAINING", "0.5"))  # fraction of the requested lifetime
+
+# Pass as Config= to download_file/upload_file: large videos go up and down in parallel parts.
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_CHUNK_BYTES,
+    multipart_chunksize=S3_MULTIPART_CHUNK_BYTES,
+    max_concurrency=S3_TRANSFER_CONCURRENCY,
+    use_threads=S3_TRANSFER_CONCURRENCY > 1,
+)
+
+
+def make_s3_client(region: Optional[str] = None):
+    return boto3.client(
+        "s3",
+        region_name=region or os.getenv("AWS_REGION"),
+        config=Config(
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "standard"},
+            tcp_keepalive=True,
+        ),
+    )
+
+
+def delete_keys(s3_client, bucket: str, keys: Sequence[str]) -> None:
+    """Delete `keys`, up to S3_DELETE_BATCH per request; keys that don't exist are fine."""
+    keys = list(keys)
+    for i in range(0, len(keys), S3_DELETE_BATCH):
+        s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": k} for k in keys[i:i + S3_DELETE_BATCH]], "Quiet": True},
+        )
+
+
+class PresignCache:
+    """
+    Bounded LRU of presigned URLs keyed on (bucket, key, method, extra params). A cached URL
+    is handed out again while at least `min_remaining` of the requested lifetime is left, so
+    re-rendering the same results grid costs no signing. Only for URLs whose users can live
+    with part of the lifetime: stream and upload URLs are signed fresh. URLs signed with
+    temporary credentials can stop working before their ExpiresIn; keep the lifetime below theirs.
+    """
+    def __init__(self, max_entries: int = PRESIGN_CACHE_SIZE, min_remaining: float = PRESIGN_MIN_REMAINING):
+        self.max_entries = max_entries
+        self.min_remaining = min_remaining
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def url(self, s3_client, method: str, bucket: str, key: str, expires_in: int,
+            **params: Any) -> Tuple[str, float]:
+        """(url, expires_at epoch seconds) for `method` ("get_object", "put_object", ...) on the key."""
+        cache_key = (bucket, key, method, tuple(sorted(params.items())))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            # Reuse only if enough is left, and never hand out more lifetime than was asked for.
+            if entry is not None and self.min_remaining * expires_in <= entry[0] - now <= expires_in:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1], entry[0]
+            self.misses += 1
+        url = s3_client.generate_presigned_url(
+            ClientMethod=method,
+            Params={"Bucket": bucket, "Key": key, **params},
+            ExpiresIn=expires_in,
+        )
+        expires_at = now + expires_in
+        with self._lock:
+            self._entries[cache_key] = (expires_at, url)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return url, expires_at
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+presign_cache = PresignCache()
@@ -0,0 +1,214 @@
+import os, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .manifest import get_npy, manifest_cache
+from .reindex import embeddings_key_for
+
+TEMPORAL_CACHE_BYTES = int(os.getenv("TEMPORAL_CACHE_BYTES", str(512 * 1024 * 1024)))  # scene matrices kept in memory
+TEMPORAL_CACHE_TTL = float(os.getenv("TEMPORAL_CACHE_TTL", "600"))  # seconds
+TEMPORAL_MAX_WINDOW = int(os.getenv("TEMPORAL_MAX_WINDOW", "50"))  # scenes
+TEMPORAL_MAX_QUERIES = int(os.getenv("TEMPORAL_MAX_QUERIES", "8"))
+
+MODES = ("sequence", "window")
+
+
+class SceneMatrix:
+    """
+    One video's thumbnail embeddings grouped by scene: `vectors` holds unit rows in
+    scene_index order (the order of embeddings.npy) and scene i owns rows
+    offsets[i]:offsets[i + 1]. Per-thumbnail times and per-scene bounds come from the manifest.
+    """
+    def __init__(self, vectors: np.ndarray, offsets: np.ndarray, t_sec: np.ndarray,
+                 shots: np.ndarray, thumb_keys: List[str]):
+        self.vectors = vectors
+        self.offsets = offsets
+        self.t_sec = t_sec
+        self.shots = shots  # (scenes, 4): start_s, end_s, start_f, end_f
+        self.thumb_keys = thumb_keys
+
+    @property
+    def scenes(self) -> int:
+        return len(self.shots)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.t_sec.nbytes + self.shots.nbytes + self.offsets.nbytes
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, shots: List[List[float]], thumb_times_by_scene: List[List[float]],
+              thumb_keys_by_scene: List[List[str]]) -> "SceneMatrix":
+        counts = [len(t) for t in thumb_times_by_scene]
+        if sum(counts) != len(embeddings):
+            raise ValueError(f"Manifest lists {sum(counts)} thumbnails but embeddings have {len(embeddings)} rows")
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return cls(
+            vectors=vectors,
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            t_sec=np.asarray([t for scene in thumb_times_by_scene for t in scene], dtype=np.float64),
+            shots=np.asarray(shots, dtype=np.float64).reshape(-1, 4),
+            thumb_keys=[k for scene in thumb_keys_by_scene for k in scene],
+        )
+
+    def thumb_scores(self, queries: np.ndarray) -> np.ndarray:
+        """(thumbnails, queries) cosine similarities: every query in one matrix product."""
+        q = np.asarray(queries, dtype=np.float32)
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        return self.vectors @ q.T
+
+    def scene_scores(self, thumb_scores: np.ndarray, thumb_mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """(scenes, queries) best-thumbnail score per scene; -inf for scenes with no thumbnail in the mask."""
+        scores = thumb_scores if thumb_mask is None else np.where(thumb_mask[:, None], thumb_scores, -np.inf)
+        out = np.full((self.scenes, scores.shape[1]), -np.inf, dtype=np.float32)
+        nonempty = np.flatnonzero(np.diff(self.offsets) > 0)
+        if len(nonempty) and len(scores):
+            out[nonempty] = np.maximum.reduceat(scores, self.offsets[nonempty], axis=0)
+        return out
+
+    def time_mask(self, t_min: Optional[float], t_max: Optional[float], field: str = "t_sec") -> Optional[np.ndarray]:
+        """Thumbnails whose t_sec (or whose scene's start_s) lies in [t_min, t_max]; None = no filter."""
+        if t_min is None and t_max is None:
+            return None
+        if field == "t_sec":
+            t = self.t_sec
+        else:
+            t = np.repeat(self.shots[:, 0], np.diff(self.offsets))
+        mask = np.ones(len(t), dtype=bool)
+        if t_min is not None:
+            mask &= t >= t_min
+        if t_max is not None:
+            mask &= t <= t_max
+        return mask
+
+
+# ---------- Window search ----------
+def best_sequences(scores: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every first scene s, the best in-order placement of the queries in scenes
+    s <= i_1 <= ... <= i_m < s + window with i_1 = s (a DP over the window, vectorised
+    across all s). Returns (total score per s, (s, m) chosen scene per query).
+    """
+    n, m = scores.shape
+    padded = np.vstack([scores, np.full((window - 1, m), -np.inf, dtype=scores.dtype)])
+    win = sliding_window_view(padded, window, axis=0)  # (n, m, window): win[s, k, j] = scores[s + j, k]
+    cols = np.arange(window)
+    best = np.full((n, window), -np.inf, dtype=np.float64)
+    best[:, 0] = win[:, 0, 0]
+    back = []
+    for k in range(1, m):
+        run_max = np.maximum.accumulate(best, axis=1)
+        run_arg = np.maximum.accumulate(np.where(best == run_max, cols, 0), axis=1)
+        back.append(run_arg)
+        best = win[:, k, :] + run_max
+    last = np.argmax(best, axis=1)
+    total = best[np.arange(n), last]
+    picks = np.empty((n, m), dtype=np.int64)
+    picks[:, m - 1] = last
+    for k in range(m - 1, 0, -1):
+        picks[:, k - 1] = back[k - 1][np.arange(n), picks[:, k]]
+    return total, picks + np.arange(n)[:, None]
+
+
+def best_windows(scores: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every run of `window` consecutive scenes starting at s, each query's best scene in
+    it, in any order. Returns (total score per s, (s, m) chosen scene per query).
+    """
+    n, m = scores.shape
+    padded = np.vstack([scores, np.full((window - 1, m), -np.inf, dtype=scores.dtype)])
+    win = sliding_window_view(padded, window, axis=0)
+    arg = np.argmax(win, axis=2)  # (n, m)
+    total = np.take_along_axis(win, arg[..., None], axis=2)[..., 0].astype(np.float64).sum(axis=1)
+    return total, arg + np.arange(n)[:, None]
+
+
+def search_windows(scores: np.ndarray, window: int, top_k: int, mode: str = "sequence") -> List[Dict[str, Any]]:
+    """
+    Top windows of consecutive scenes for the (scenes, queries) score matrix, best first,
+    scored by the mean of the per-query scene scores. Overlapping windows are suppressed:
+    a window is kept only if its scene span is disjoint from every better one.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if len(scores) == 0:
+        return []
+    window = max(1, min(window, len(scores)))
+    total, picks = (best_sequences if mode == "sequence" else best_windows)(scores, window)
+    total = total / scores.shape[1]
+
+    out: List[Dict[str, Any]] = []
+    taken = np.zeros(len(scores), dtype=bool)
+    for s in np.argsort(-total, kind="stable"):
+        if not np.isfinite(total[s]):
+            break
+        first, last = int(picks[s].min()), int(picks[s].max())
+        if taken[first:last + 1].any():
+            continue
+        taken[first:last + 1] = True
+        out.append({"score": float(total[s]), "scenes": [int(i) for i in picks[s]]})
+        if len(out) == top_k:
+            break
+    return out
+
+
+# ---------- Loading ----------
+class SceneMatrixCache:
+    """
+    LRU of SceneMatrix by embeddings key, bounded by total bytes with a TTL. A version's
+    embeddings.npy is written once per video, so entries only go stale if it is re-ingested.
+    """
+    def __init__(self, max_bytes: int = TEMPORAL_CACHE_BYTES, ttl_s: float = TEMPORAL_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, SceneMatrix]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, s3_client, bucket: str, base_prefix: str, version: str) -> Optional[SceneMatrix]:
+        """The video's scene matrix for index `version`; None if it has no complete v2 manifest."""
+        key = (bucket, embeddings_key_for(base_prefix, version))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_s:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+        manifest = manifest_cache.load(s3_client, bucket, base_prefix + "manifest.json")
+        shots_stage = manifest.stage("shots") if manifest is not None and manifest.complete else {}
+        if "thumb_times_by_scene" not in shots_stage:
+            return None  # not ingested, still running, or a manifest from before per-thumbnail times
+        sm = SceneMatrix.build(
+            get_npy(s3_client, bucket, key[1]),
+            shots_stage["shots"],
+            shots_stage["thumb_times_by_scene"],
+            shots_stage["thumb_keys_by_scene"],
+        )
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (now, sm)
+            self._bytes += sm.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+        return sm
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        _, sm = self._entries.pop(key)
+        self._bytes -= sm.nbytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+scene_matrix_cache = SceneMatrixCache()
@@ -0,0 +1,534 @@
+import os, heapq, json, logging, threading, time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# (id, vector, metadata) -- the tuple shape Pinecone's upsert already takes
+Vector = Tuple[str, Any, Dict[str, Any]]
+# {"id", "score", "metadata"} -- the JSON shape /search_embeddings returns
+Match = Dict[str, Any]
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")  # pinecone | local
+PINECONE_INDEX = os.getenv("PINECONE_INDEX", "sceneit-thumbs")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vector_index"))
+LOCAL_IVF_MIN_ROWS = int(os.getenv("LOCAL_IVF_MIN_ROWS", "50000"))  # 0 disables IVF
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", "8"))
+LIBRARY_SEARCH_WORKERS = int(os.getenv("LIBRARY_SEARCH_WORKERS", "16"))
+PINECONE_DELETE_BATCH = 1000  # most ids Pinecone takes per delete request
+
+
+class VectorStore(ABC):
+    """Namespaced vector index. Namespaces are video ids; scores are cosine similarities."""
+
+    @abstractmethod
+    def upsert(self, vectors: Sequence[Vector], namespace: str) -> None:
+        ...
+
+    @abstractmethod
+    def query(self, vector, top_k: int, namespace: str, include_metadata: bool = True,
+              include_values: bool = False, filter: Optional[Dict[str, Any]] = None) -> List[Match]:
+        """
+        Best-first matches; with include_values each match also has "values" (float32 ndarray).
+        `filter` is a Pinecone metadata filter, e.g. {"t_sec": {"$gte": 60, "$lte": 120}}.
+        """
+
+    @abstractmethod
+    def delete(self, ids: Sequence[str], namespace: str) -> None:
+        """Remove vectors by id; ids not in the namespace are ignored."""
+
+    @abstractmethod
+    def list_namespaces(self) -> List[str]:
+        ...
+
+
+# ---------- Pinecone ----------
+
+class PineconeStore(VectorStore):
+    def __init__(self, api_key: Optional[str], index_name: str = PINECONE_INDEX, dimension: int = 768):
+        from pinecone import Pinecone, ServerlessSpec
+
+        self.pc = Pinecone(api_key=api_key)
+        self.index_name = index_name
+        # create once; if it already exists, skip
+        if index_name not in [i.name for i in self.pc.list_indexes()]:
+            self.pc.create_index(
+                name=index_name,
+                dimension=dimension,           # CLIP L/14
+                metric="cosine",               # use cosine similarity
+                spec=ServerlessSpec(cloud="aws", region="us-east-1")
+            )
+        self.index = self.pc.Index(index_name)
+
+    def upsert(self, vectors: Sequence[Vector], namespace: str) -> None:
+        self.index.upsert(
+            vectors=[(vid, np.asarray(vec, dtype=np.float32).tolist(), meta) for vid, vec, meta in vectors],
+            namespace=namespace,
+        )
+
+    def query(self, vector, top_k: int, namespace: str, include_metadata: bool = True,
+              include_values: bool = False, filter: Optional[Dict[str, Any]] = None) -> List[Match]:
+        res = self.index.query(
+            vector=np.asarray(vector, dtype=np.float32).tolist(),
+            top_k=top_k,
+            namespace=namespace,
+            include_metadata=include_metadata,
+            include_values=include_values,
+            filter=filter or None,
+        )
+        matches = []
+        for m in res.matches:
+            match = {
+                "id": m.id,
+                "score": float(m.score),
+                "metadata": dict(m.metadata) if m.metadata is not None else {}
+            }
+            if include_values:
+                match["values"] = np.asarray(m.values, dtype=np.float32)
+            matches.append(match)
+        return matches
+
+    def delete(self, ids: Sequence[str], namespace: str) -> None:
+        ids = list(ids)
+        for i in range(0, len(ids), PINECONE_DELETE_BATCH):
+            self.index.delete(ids=ids[i:i + PINECONE_DELETE_BATCH], namespace=namespace)
+
+    def list_namespaces(self) -> List[str]:
+        stats = self.index.describe_index_stats()
+        return sorted((stats.namespaces or {}).keys())
+
+
+# ---------- Local (memory-mapped) ----------
+
+class _Namespace:
+    """
+    One namespace on disk:
+        vectors.f32  -- raw float32 rows, unit length, appended in insertion order
+        meta.jsonl   -- one {"id", "row", "metadata"} line per upsert; later lines win.
+                        A {"id", "row", "deleted": true} line retires the row; the id gets
+                        a new row if it is upserted again.
+        info.json    -- {"dim": D}
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.meta: List[Dict[str, Any]] = []
+        self.rows: Dict[str, int] = {}
+        self.deleted: Set[int] = set()
+        self._mat: Optional[np.memmap] = None
+        self._ivf: Optional["_IVF"] = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def _load(self) -> None:
+        info = os.path.join(self.path, "info.json")
+        if not os.path.exists(info):
+            return
+        with open(info) as f:
+            self.dim = json.load(f)["dim"]
+        with open(os.path.join(self.path, "meta.jsonl")) as f:
+            for line in f:
+                rec = json.loads(line)
+                row = rec["row"]
+                if rec.get("deleted"):
+                    self.deleted.add(row)
+                    self.rows.pop(rec["id"], None)
+                    continue
+                if row == len(self.ids):
+                    self.ids.append(rec["id"])
+                    self.meta.append(rec["metadata"])
+                else:
+                    self.meta[row] = rec["metadata"]
+                self.rows[rec["id"]] = row
+        # Rows whose metadata line never made it to disk are ignored.
+        n_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        if n_rows < len(self.ids):
+            raise RuntimeError(f"Local index at {self.path} is truncated ({n_rows} rows, {len(self.ids)} ids)")
+
+    def upsert(self, vectors: Sequence[Vector]) -> None:
+        mat = np.asarray([v[1] for v in vectors], dtype=np.float32)
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        np.maximum(norms, 1e-12, out=norms)
+        mat /= norms
+        with self.lock:
+            if self.dim is None:
+                os.makedirs(self.path, exist_ok=True)
+                self.dim = mat.shape[1]
+                with open(os.path.join(self.path, "info.json"), "w") as f:
+                    json.dump({"dim": self.dim}, f)
+                open(self.vectors_path, "wb").close()
+            if mat.shape[1] != self.dim:
+                raise ValueError(f"Vector dim {mat.shape[1]} does not match namespace dim {self.dim}")
+            lines = []
+            with open(self.vectors_path, "r+b") as vf:
+                for (vec_id, _, meta), vec in zip(vectors, mat):
+                    row = self.rows.get(vec_id)
+                    if row is None:
+                        row = len(self.ids)
+                        self.ids.append(vec_id)
+                        self.meta.append(meta)
+                        self.rows[vec_id] = row
+                    else:
+                        self.meta[row] = meta
+                    vf.seek(row * 4 * self.dim)
+                    vf.write(vec.tobytes())
+                    lines.append(json.dumps({"id": vec_id, "row": row, "metadata": meta}))
+            with open(os.path.join(self.path, "meta.jsonl"), "a") as mf:
+                mf.write("\n".join(lines) + "\n")
+            self._mat = None
+            self._ivf = None
+            self._columns = {}
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self.lock:
+            rows = [(vec_id, self.rows.pop(vec_id)) for vec_id in ids if vec_id in self.rows]
+            if not rows:
+                return
+            with open(os.path.join(self.path, "meta.jsonl"), "a") as mf:
+                mf.write("".join(json.dumps({"id": vec_id, "row": row, "deleted": True}) + "\n" for vec_id, row in rows))
+            self.deleted.update(row for _, row in rows)
+            self._columns = {}
+
+    def live_mask(self) -> np.ndarray:
+        """False for deleted rows."""
+        with self.lock:
+            mask = self._columns.get("$live")
+            if mask is None:
+                mask = np.ones(len(self.ids), dtype=bool)
+                mask[list(self.deleted)] = False
+                self._columns["$live"] = mask
+            return mask
+
+    def matrix(self) -> np.ndarray:
+        with self.lock:
+            if self._mat is None and self.ids:
+                self._mat = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+            return self._mat if self._mat is not None else np.empty((0, self.dim or 0), dtype=np.float32)
+
+    def column(self, field: str) -> np.ndarray:
+        """Metadata `field` of every row as float64 (NaN where missing or not numeric), for filters."""
+        with self.lock:
+            col = self._columns.get(field)
+            if col is None:
+                col = np.array([_as_float(m.get(field)) for m in self.meta], dtype=np.float64)
+                self._columns[field] = col
+            return col
+
+    def filter_mask(self, flt: Dict[str, Any]) -> np.ndarray:
+        """Rows whose metadata passes a Pinecone-style filter (field conditions, ANDed)."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, cond in flt.items():
+            if field == "$and":
+                for sub in cond:
+                    mask &= self.filter_mask(sub)
+                continue
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            for op, value in cond.items():
+                if op in _RANGE_OPS:
+                    mask &= _RANGE_OPS[op](self.column(field), float(value))  # NaN compares False
+                elif op in ("$eq", "$ne", "$in", "$nin"):
+                    values = value if op in ("$in", "$nin") else [value]
+                    hit = np.array([m.get(field) in values for m in self.meta], dtype=bool)
+                    mask &= hit if op in ("$eq", "$in") else ~hit
+                else:
+                    raise ValueError(f"Unsupported filter operator {op!r}")
+        return mask
+
+    def ivf(self) -> Optional["_IVF"]:
+        if not LOCAL_IVF_MIN_ROWS or len(self.ids) < LOCAL_IVF_MIN_ROWS:
+            return None
+        mat = self.matrix()
+        with self.lock:
+            if self._ivf is None:
+                self._ivf = _IVF.build(mat)
+            return self._ivf
+
+
+_RANGE_OPS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+def _as_float(v: Any) -> float:
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else float("nan")
+
+
+class _IVF:
+    """Inverted-file index over a namespace matrix: spherical k-means lists, probed nprobe at a time."""
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray]):
+        self.centroids = centroids
+        self.lists = lists
+
+    @classmethod
+    def build(cls, mat: np.ndarray, iters: int = 10, seed: int = 0) -> "_IVF":
+        n = mat.shape[0]
+        k = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(mat[rng.choice(n, size=min(n, k * 64), replace=False)])
+        centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(k):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        assign = np.empty(n, dtype=np.int64)
+        for i in range(0, n, 65536):
+            assign[i:i + 65536] = np.argmax(np.asarray(mat[i:i + 65536]) @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(k + 1))
+        return cls(centroids, [order[bounds[c]:bounds[c + 1]] for c in range(k)])
+
+    def candidates(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        probe = np.argsort(-(self.centroids @ q))[:nprobe]
+        return np.sort(np.concatenate([self.lists[c] for c in probe]))
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process store: each namespace is a memory-mapped float32 matrix under `root`.
+    Queries are a single matrix-vector product over the namespace (or, above
+    LOCAL_IVF_MIN_ROWS rows, over the rows in the nearest IVF lists).
+    """
+    def __init__(self, root: str = LOCAL_INDEX_DIR, nprobe: int = LOCAL_IVF_NPROBE):
+        self.root = root
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, _Namespace] = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _ns(self, namespace: str) -> _Namespace:
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                ns = self._namespaces[namespace] = _Namespace(os.path.join(self.root, namespace))
+            return ns
+
+    def upsert(self, vectors: Sequence[Vector], namespace: str) -> None:
+        if vectors:
+            self._ns(namespace).upsert(vectors)
+
+    def query(self, vector, top_k: int, namespace: str, include_metadata: bool = True,
+              include_values: bool = False, filter: Optional[Dict[str, Any]] = None) -> List[Match]:
+        ns = self._ns(namespace)
+        mat = ns.matrix()
+        if mat.shape[0] == 0:
+            return []
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        # Filters are applied before scoring: only rows that pass are multiplied.
+        mask = ns.filter_mask(filter)[:mat.shape[0]] if filter else None
+        if ns.deleted:
+            live = ns.live_mask()[:mat.shape[0]]
+            mask = live if mask is None else mask & live
+        ivf = ns.ivf()
+        rows = ivf.candidates(q, self.nprobe) if ivf is not None else None
+        if mask is not None:
+            rows = rows[mask[rows]] if rows is not None else np.flatnonzero(mask)
+        if rows is not None:
+            scores = mat[rows] @ q
+            sel = top_k_indices(scores, top_k)
+            best, best_scores = rows[sel], scores[sel]
+        else:
+            scores = mat @ q
+            best = top_k_indices(scores, top_k)
+            best_scores = scores[best]
+        matches = []
+        for r, s in zip(best, best_scores):
+            match = {
+                "id": ns.ids[r],
+                "score": float(s),
+                "metadata": dict(ns.meta[r]) if include_metadata else {}
+            }
+            if include_values:
+                match["values"] = np.array(mat[r])
+            matches.append(match)
+        return matches
+
+    def delete(self, ids: Sequence[str], namespace: str) -> None:
+        if ids:
+            self._ns(namespace).delete(ids)
+
+    def list_namespaces(self) -> List[str]:
+        return sorted(
+            d for d in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, d, "info.json"))
+        )
+
+
+# ---------- Library-wide search ----------
+
+_fanout_pool = ThreadPoolExecutor(max_workers=LIBRARY_SEARCH_WORKERS, thread_name_prefix="library-search")
+
+def search_library(
+    store: VectorStore,
+    vector,
+    top_k: int,
+    namespaces: Optional[List[str]] = None,
+    timeout_s: Optional[float] = None,
+    filter: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Query every namespace (or the given subset) concurrently and merge the per-namespace
+    top-k lists into one global ranking. Each match gains a "namespace" field.
+
+    With `timeout_s`, namespaces that have not answered by the deadline are cut off and
+    reported in "timed_out"; the ranking is built from the ones that did.
+    """
+    if namespaces is None:
+        namespaces = store.list_namespaces()
+    futures = {_fanout_pool.submit(store.query, vector, top_k, ns, True, False, filter): ns for ns in namespaces}
+    deadline = time.monotonic() + timeout_s if timeout_s else None
+
+    # Min-heap of the best top_k seen so far: (score, tiebreak, match)
+    best: List[Tuple[float, int, Match]] = []
+    seq = 0
+    failed: Dict[str, str] = {}
+    pending = set(futures)
+    while pending:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for fut in done:
+            ns = futures[fut]
+            try:
+                matches = fut.result()
+            except Exception as e:
+                failed[ns] = str(e)
+                continue
+            for m in matches:  # each list is sorted best-first, so stop at the first that can't enter
+                if len(best) == top_k and m["score"] <= best[0][0]:
+                    break
+                m["namespace"] = ns
+                seq += 1
+                if len(best) < top_k:
+                    heapq.heappush(best, (m["score"], seq, m))
+                else:
+                    heapq.heapreplace(best, (m["score"], seq, m))
+    for fut in pending:
+        fut.cancel()
+
+    return {
+        "matches": [m for _, _, m in sorted(best, key=lambda x: (-x[0], x[1]))],
+        "searched": len(namespaces) - len(pending) - len(failed),
+        "timed_out": sorted(futures[f] for f in pending),
+        "failed": failed,
+    }
+
+
+def time_range_filter(t_min: Optional[float], t_max: Optional[float], field: str = "t_sec") -> Optional[Dict[str, Any]]:
+    """Metadata filter for thumbnails whose `field` (t_sec or the scene's start_s) is within [t_min, t_max]."""
+    if field not in ("t_sec", "start_s"):
+        raise ValueError(f"time field must be 't_sec' or 'start_s', got {field!r}")
+    cond = {}
+    if t_min is not None:
+        cond["$gte"] = float(t_min)
+    if t_max is not None:
+        cond["$lte"] = float(t_max)
+    return {field: cond} if cond else None
+
+
+# ---------- Scene aggregation ----------
+
+SCENE_OVERFETCH = int(os.getenv("SCENE_OVERFETCH", "4"))  # candidates fetched per requested scene
+MAX_QUERY_TOP_K = 1000  # Pinecone's cap when metadata/values are included
+SCENE_POOLINGS = ("max", "mean")
+
+def check_pooling(pooling: str) -> str:
+    if pooling not in SCENE_POOLINGS:
+        raise ValueError(f"pooling must be 'max' or 'mean', got {pooling!r}")
+    return pooling
+
+def aggregate_scenes(
+    matches: List[Match],
+    top_k: int,
+    pooling: str = "max",
+    dedupe_threshold: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Collapse thumbnail matches into scenes, keyed on (video_id, scene_index).
+
+    A scene's score is the max or mean of its thumbnails' scores; its best thumbnail is
+    the representative (metadata, thumb_key, t_sec). With `dedupe_threshold`, a scene is
+    dropped when an adjacent scene of the same video already ranked above it and their
+    representative vectors have cosine similarity >= the threshold (needs "values").
+    Returns up to top_k scenes, best first.
+    """
+    check_pooling(pooling)
+    groups: Dict[Tuple[Any, Any], List[Match]] = {}
+    for m in matches:  # best-first, so each group's first entry is its representative
+        meta = m.get("metadata") or {}
+        groups.setdefault((meta.get("video_id", m.get("namespace")), meta.get("scene_index")), []).append(m)
+
+    scenes = []
+    for (video_id, scene_index), members in groups.items():
+        scores = [m["score"] for m in members]
+        scenes.append({
+            "video_id": video_id,
+            "scene_index": scene_index,
+            "score": max(scores) if pooling == "max" else float(np.mean(scores)),
+            "best": members[0],
+            "thumbs": [{"id": m["id"], "score": m["score"], "t_sec": m["metadata"].get("t_sec")} for m in members],
+        })
+    scenes.sort(key=lambda sc: -sc["score"])
+
+    if dedupe_threshold is None or len(scenes) < 2:
+        return scenes[:top_k]
+
+    reps = np.stack([sc["best"]["values"] for sc in scenes]).astype(np.float32)
+    reps /= np.maximum(np.linalg.norm(reps, axis=1, keepdims=True), 1e-12)
+    sims = reps @ reps.T
+    scene_idx = np.array([sc["scene_index"] if sc["scene_index"] is not None else -10 for sc in scenes])
+    video = np.array([str(sc["video_id"]) for sc in scenes])
+    adjacent = (np.abs(scene_idx[:, None] - scene_idx[None, :]) == 1) & (video[:, None] == video[None, :])
+    dup = adjacent & (sims >= dedupe_threshold)
+
+    kept: List[int] = []
+    for i in range(len(scenes)):
+        if kept and dup[i, kept].any():
+            continue
+        kept.append(i)
+        if len(kept) == top_k:
+            break
+    return [scenes[i] for i in kept]
+
+
+def make_vector_store(backend: str = VECTOR_BACKEND) -> VectorStore:
+    if backend == "local":
+        logging.info(f"Vector store: local ({LOCAL_INDEX_DIR})")
+        return LocalVectorStore()
+    if backend == "pinecone":
+        logging.info(f"Vector store: pinecone ({PINECONE_INDEX})")
+        return PineconeStore(api_key=os.getenv("PINECONE_ACCESS_KEY"))
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+
+_store: Optional[VectorStore] = None
+_store_lock = threading.Lock()
+
+def get_vector_store() -> VectorStore:
+    """Process-wide store, created on first use (Pinecone's index check is a network call)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = make_vector_store()
+        return _store
+
+def is_vector_store_ready() -> bool:
+    return _store is not None
@@ -0,0 +1,498 @@
+import os, logging, threading
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Iterator, Optional
+
+import cv2, numpy as np
+from skimage.metrics import structural_similarity as ssim
+from scenedetect import open_video, SceneManager, FrameTimecode
+from scenedetect.detectors import ContentDetector  # or AdaptiveDetector
+from scenedetect.scene_manager import compute_downscale_factor
+from scenedetect.video_splitter import split_video_ffmpeg
+
+Shot = Tuple[float, float, int, int]  # (start_s, end_s, start_f, end_f)
+
+THUMB_SSIM_THRESHOLD = float(os.getenv("THUMB_SSIM_THRESHOLD", "0.92"))  # >= this counts as a repeat
+THUMB_MAX_SIDE = int(os.getenv("THUMB_MAX_SIDE", "1280"))  # longest side of a thumbnail; 0 = source size
+SHOT_BUFFER_BYTES = int(os.getenv("SHOT_BUFFER_BYTES", str(64 * 1024 * 1024)))  # candidate frames held per shot
+
+# Parallel detection: DETECT_WORKERS > 1 splits the timeline across that many processes.
+DETECT_WORKERS = int(os.getenv("DETECT_WORKERS", "1"))
+DETECT_DOWNSCALE = int(os.getenv("DETECT_DOWNSCALE", "0"))  # 0 = PySceneDetect's default for the width
+DETECT_FRAME_SKIP = int(os.getenv("DETECT_FRAME_SKIP", "0"))  # frames skipped between analysed ones
+DETECT_OVERLAP_S = float(os.getenv("DETECT_OVERLAP_S", "2.0"))  # decoded on both sides of a segment
+DETECT_MIN_SEGMENT_S = float(os.getenv("DETECT_MIN_SEGMENT_S", "30"))  # shorter videos use fewer segments
+
+# ---------- Core Shot Detection ----------
+
+def detect_scenes(video_path: str, threshold: float, min_scene_len: int):
+    video = open_video(video_path)
+    scene_manager = SceneManager()
+    scene_manager.add_detector(ContentDetector(threshold=threshold, min_scene_len=min_scene_len))
+    scene_manager.detect_scenes(video)
+
+    scene_list = scene_manager.get_scene_list(start_in_scene=True)  # a video without cuts is one shot
+
+    shots = []
+    for start_tc, end_tc in scene_list:
+        shots.append((
+            start_tc.get_seconds(),
+            end_tc.get_seconds(),
+            start_tc.get_frames(),
+            end_tc.get_frames()
+        ))
+    return scene_list, shots
+
+
+def pick_timepoints(start_s: float, end_s: float, count: int = 3) -> List[float]:
+    """Pick `count` times inside [start_s, end_s] (biased away from hard cuts)."""
+    dur = max(0.0, end_s - start_s)
+    if dur <= 0.0:
+        return [start_s]
+
+    # If the scene is very short, just return the midpoint (or up to count=2)
+    if dur < 0.6:  
+        mids = [start_s + dur * 0.5]
+        if dur > 0.25 and count >= 2:
+            mids = [start_s + dur * 0.33, start_s + dur * 0.66]
+        return mids[:count]
+
+    # For longer scenes, spread across interior (20%, 50%, 80%)
+    anchors = [0.2, 0.5, 0.8]
+    # Respect requested count
+    anchors = anchors[:count] if count <= 3 else [(i+1)/(count+1) for i in range(count)]
+
+    # Avoid landing exactly on cuts: pull slightly inward by epsilon on each side.
+    eps = min(0.1, dur * 0.02)  # 100ms or 2% of scene, whichever smaller
+    return [max(start_s + eps, min(end_s - eps, start_s + a*dur)) for a in anchors]
+
+
+# ---------- Fused detection + keyframe capture ----------
+
+def fit_thumbnail(frame: np.ndarray, max_side: int = THUMB_MAX_SIDE) -> np.ndarray:
+    """`frame` shrunk so its longest side is at most `max_side` (unchanged if already smaller)."""
+    h, w = frame.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return frame
+    scale = max_side / max(h, w)
+    return cv2.resize(frame, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+class ShotFrameBuffer:
+    """
+    Bounded, evenly spaced sample of the frames decoded since the last cut, stored at
+    thumbnail size. When the copies exceed `max_bytes`, every other frame is dropped and
+    the sampling stride doubles (while more than two frames are held), so any shot length
+    is covered within the byte budget.
+    """
+    def __init__(self, max_bytes: int = SHOT_BUFFER_BYTES, max_side: int = THUMB_MAX_SIDE):
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.stride = 1
+        self.nbytes = 0
+        self.frames: deque = deque()  # (frame_idx, BGR ndarray at thumbnail size)
+
+    def offer(self, frame_idx: int, frame: np.ndarray) -> None:
+        if frame_idx % self.stride:
+            return
+        frame = fit_thumbnail(frame, self.max_side)
+        self.frames.append((frame_idx, frame))
+        self.nbytes += frame.nbytes
+        while self.nbytes > self.max_bytes and len(self.frames) > 2:
+            self.stride *= 2
+            self.frames = deque(f for f in self.frames if f[0] % self.stride == 0)
+            self.nbytes = sum(f[1].nbytes for f in self.frames)
+
+    def take_before(self, cut_frame: int) -> List[Tuple[int, np.ndarray]]:
+        """Remove and return frames of the finished shot; frames at/after the cut stay for the next shot."""
+        done = []
+        while self.frames and self.frames[0][0] < cut_frame:
+            done.append(self.frames.popleft())
+            self.nbytes -= done[-1][1].nbytes
+        self.stride = 1
+        return done
+
+
+class ShotStream:
+    """
+    One sequential decode that runs ContentDetector frame by frame and, as each cut is
+    confirmed, yields the finished shot together with its interior keyframes:
+
+        for shot, keyframes in ShotStream(path, threshold=27.0, min_scene_len=4):
+            # shot      = (start_s, end_s, start_f, end_f)
+            # keyframes = [(t_sec, BGR ndarray), ...] at pick_timepoints(...) of the shot
+
+    Only a ShotFrameBuffer's worth of thumbnail-sized frames is held in memory at any time.
+    `fps` and `frame_count` are available once iteration has started.
+    """
+    def __init__(self, video_path: str, threshold: float = 27.0, min_scene_len: int = 15,
+                 per_scene: int = 3, buffer_bytes: int = SHOT_BUFFER_BYTES, max_side: int = THUMB_MAX_SIDE):
+        self.video_path = video_path
+        self.threshold = threshold
+        self.min_scene_len = min_scene_len
+        self.per_scene = per_scene
+        self.buffer_bytes = buffer_bytes
+        self.max_side = max_side
+        self.fps = 0.0
+        self.frame_count = 0
+
+    def _keyframes(self, shot: Shot, frames: List[Tuple[int, np.ndarray]]) -> List[Tuple[float, np.ndarray]]:
+        if not frames:
+            return []
+        out = []
+        for t in pick_timepoints(shot[0], shot[1], self.per_scene):
+            idx, frame = min(frames, key=lambda f: abs(f[0] / self.fps - t))
+            out.append((idx / self.fps, frame))
+        return out
+
+    def _close(self, buf: ShotFrameBuffer, start_f: int, end_f: int):
+        shot = (start_f / self.fps, end_f / self.fps, start_f, end_f)
+        return shot, self._keyframes(shot, buf.take_before(end_f))
+
+    def __iter__(self) -> Iterator[Tuple[Shot, List[Tuple[float, np.ndarray]]]]:
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            # Drop any query string so presigned URL signatures don't end up in logs.
+            raise RuntimeError(f"Could not open video: {self.video_path.split('?')[0]}")
+        try:
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            detector = ContentDetector(threshold=self.threshold, min_scene_len=self.min_scene_len)
+            buf = ShotFrameBuffer(self.buffer_bytes, self.max_side)
+            downscale = None
+            shot_start = 0
+            frame_idx = -1
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                frame_idx += 1
+                if downscale is None:
+                    downscale = compute_downscale_factor(frame.shape[1])
+                small = frame
+                if downscale > 1:
+                    h, w = frame.shape[:2]
+                    small = cv2.resize(frame, (round(w / downscale), round(h / downscale)),
+                                       interpolation=cv2.INTER_LINEAR)
+                buf.offer(frame_idx, frame)
+                for cut in detector.process_frame(frame_idx, small):
+                    if cut <= shot_start:
+                        continue
+                    yield self._close(buf, shot_start, cut)
+                    shot_start = cut
+            self.frame_count = frame_idx + 1
+            if frame_idx < 0:
+                return
+            for cut in detector.post_process(frame_idx):
+                if shot_start < cut <= frame_idx:
+                    yield self._close(buf, shot_start, cut)
+                    shot_start = cut
+            # Whole video is one shot if no cut was found, unlike SceneManager's empty list.
+            yield self._close(buf, shot_start, self.frame_count)
+        finally:
+            cap.release()
+
+
+# ---------- Parallel detection ----------
+
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+def _detect_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned, not forked: the API process runs threads (jobs, uploads, encoder) that a
+    # fork would copy mid-flight.
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+def _open_at(video_path: str, start_f: int) -> cv2.VideoCapture:
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_path.split('?')[0]}")
+    if start_f > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_f)
+    return cap
+
+def _detect_segment(
+    video_path: str,
+    start_f: int,
+    stop_f: Optional[int],
+    threshold: float,
+    min_scene_len: int,
+    downscale: int,
+    frame_skip: int,
+) -> Tuple[List[int], int]:
+    """
+    Run ContentDetector over frames [start_f, stop_f) (to the end if stop_f is None).
+    Returns (cut frames, index of the last frame read). Runs in a worker process.
+    """
+    cap = _open_at(video_path, start_f)
+    detector = ContentDetector(threshold=threshold, min_scene_len=min_scene_len)
+    cuts: List[int] = []
+    frame_idx = start_f - 1
+    try:
+        while stop_f is None or frame_idx + 1 < stop_f:
+            frame_idx += 1
+            if (frame_idx - start_f) % (frame_skip + 1):
+                if not cap.grab():  # skipped frames are demuxed/decoded but not converted
+                    frame_idx -= 1
+                    break
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                frame_idx -= 1
+                break
+            if not downscale:
+                downscale = compute_downscale_factor(frame.shape[1])
+            if downscale > 1:
+                h, w = frame.shape[:2]
+                frame = cv2.resize(frame, (round(w / downscale), round(h / downscale)),
+                                   interpolation=cv2.INTER_LINEAR)
+            cuts.extend(detector.process_frame(frame_idx, frame))
+        if frame_idx >= start_f:
+            cuts.extend(detector.post_process(frame_idx))
+    finally:
+        cap.release()
+    return cuts, frame_idx
+
+def _video_info(video_path: str) -> Tuple[float, int]:
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_path.split('?')[0]}")
+    try:
+        return cap.get(cv2.CAP_PROP_FPS) or 30.0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        cap.release()
+
+def _split_evenly(total: int, parts: int) -> List[Tuple[int, int]]:
+    bounds = [round(i * total / parts) for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+def detect_scenes_parallel(
+    video_path: str,
+    threshold: float,
+    min_scene_len: int,
+    workers: int = DETECT_WORKERS,
+    downscale: int = DETECT_DOWNSCALE,
+    frame_skip: int = DETECT_FRAME_SKIP,
+    overlap_s: float = DETECT_OVERLAP_S,
+    min_segment_s: float = DETECT_MIN_SEGMENT_S,
+) -> Tuple[List[Shot], float]:
+    """
+    Shot detection with the timeline split into `workers` segments, each decoded by its own
+    process. A segment also decodes `overlap_s` (at least 2 * min_scene_len frames) on either
+    side of its core range so the detector is warmed up at the boundary, but only keeps
+    cuts inside its core range; cuts closer than min_scene_len after stitching collapse
+    into the first. Segments are at least `min_segment_s` long, so short videos use fewer
+    than `workers`. Returns (shots, fps). Shots are (start_s, end_s, start_f, end_f), like
+    detect_scenes, and a video without cuts is one shot, like ShotStream.
+    """
+    fps, total = _video_info(video_path)
+    step = frame_skip + 1
+    overlap = max(int(overlap_s * fps), 2 * min_scene_len * step)
+    n = max(1, min(workers, int(total / (min_segment_s * fps)))) if total > 0 else 1
+    if n == 1:
+        cuts, last = _detect_segment(video_path, 0, None, threshold, min_scene_len, downscale, frame_skip)
+    else:
+        cores = _split_evenly(total, n)
+        pool = _detect_pool(n)
+        futures = [
+            pool.submit(
+                _detect_segment, video_path, max(0, lo - overlap),
+                None if i == len(cores) - 1 else hi + overlap,  # last segment reads to the real end
+                threshold, min_scene_len, downscale, frame_skip,
+            )
+            for i, (lo, hi) in enumerate(cores)
+        ]
+        cuts, last = [], 0
+        for i, ((lo, hi), fut) in enumerate(zip(cores, futures)):
+            seg_cuts, seg_last = fut.result()
+            if i == len(cores) - 1:
+                hi, last = float("inf"), seg_last
+            cuts.extend(c for c in seg_cuts if lo <= c < hi)
+
+    frame_count = last + 1
+    stitched: List[int] = []
+    for c in sorted(cuts):
+        if 0 < c < frame_count and (not stitched or c - stitched[-1] >= min_scene_len):
+            stitched.append(c)
+    bounds = [0] + stitched + [frame_count]
+    shots = [(a / fps, b / fps, a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+    logging.info(f"Parallel detection: {len(shots)} shots from {frame_count} frames in {n} segments")
+    return shots, fps
+
+def _capture_segment(
+    video_path: str,
+    fps: float,
+    scenes: List[Tuple[int, List[float]]],
+    out_dir: str,
+    basename: str,
+    jpeg_quality: int,
+    dedupe_threshold: Optional[float],
+) -> List[Tuple[int, List[str], List[float]]]:
+    """
+    Write the keyframes of a run of consecutive shots, given as (scene index, timepoints),
+    decoding from the first timepoint onward. Runs in a worker process.
+    Returns (scene index, paths, times) per scene.
+    """
+    encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+    targets = deque(sorted((t, idx) for idx, times in scenes for t in times))
+    keyframes: Dict[int, List[Tuple[float, np.ndarray]]] = {idx: [] for idx, _ in scenes}
+    frame_idx = max(0, int(targets[0][0] * fps) - 1) if targets else 0
+    cap = _open_at(video_path, frame_idx)
+    frame_idx -= 1
+    last = None
+    try:
+        while targets:
+            if not cap.grab():
+                break
+            frame_idx += 1
+            if frame_idx / fps + 1e-3 < targets[0][0]:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            last = (frame_idx / fps, fit_thumbnail(frame))
+            while targets and frame_idx / fps + 1e-3 >= targets[0][0]:
+                keyframes[targets.popleft()[1]].append(last)
+    finally:
+        cap.release()
+    for _, idx in targets:  # past the last decodable frame
+        if last is not None:
+            keyframes[idx].append(last)
+
+    out = []
+    for idx, _ in scenes:
+        frames = keyframes[idx]
+        if dedupe_threshold is not None:
+            frames = prune_keyframes(frames, dedupe_threshold)
+        paths, times = [], []
+        for j, (t, frame) in enumerate(frames, start=1):
+            out_path = os.path.join(out_dir, f"{basename}-{idx:03d}_{j:02d}.jpg")
+            cv2.imwrite(out_path, frame, encode_params)
+            paths.append(out_path)
+            times.append(t)
+        out.append((idx, paths, times))
+    return out
+
+
+# ---------- Near-duplicate pruning ----------
+
+def _ssim_signature(frame: np.ndarray, width: int = 64) -> np.ndarray:
+    """Small grayscale copy of a frame; SSIM on these is cheap and ignores compression noise."""
+    h, w = frame.shape[:2]
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, (width, max(7, round(h * width / w))), interpolation=cv2.INTER_AREA)
+
+def prune_keyframes(
+    keyframes: List[Tuple[float, np.ndarray]],
+    threshold: float = THUMB_SSIM_THRESHOLD,
+) -> List[Tuple[float, np.ndarray]]:
+    """
+    Drop keyframes that look like one already kept from the same shot (SSIM >= threshold on
+    downscaled grayscale). Static shots collapse to one frame; shots with motion keep all.
+    """
+    kept, sigs = [], []
+    for t, frame in keyframes:
+        sig = _ssim_signature(frame)
+        if any(ssim(sig, other, data_range=255) >= threshold for other in sigs):
+            continue
+        kept.append((t, frame))
+        sigs.append(sig)
+    return kept
+
+
+def detect_and_capture(
+    video_path: str,
+    threshold: float,
+    min_scene_len: int,
+    out_dir: str,
+    per_scene: int = 3,
+    basename: str = "shot",
+    jpeg_quality: int = 95,
+    dedupe_threshold: Optional[float] = THUMB_SSIM_THRESHOLD,
+    workers: int = DETECT_WORKERS,
+) -> Tuple[List[Shot], List[List[str]], List[List[float]], float]:
+    """
+    Detect shots and write their thumbnails in a single decode of the video.
+    Returns (shots, thumb_paths_by_scene, thumb_times_by_scene, fps); thumbnails use the
+    shot-XXX_YY.jpg names (scene XXX, frame YY) and are at most THUMB_MAX_SIDE pixels on
+    their longest side.
+    `per_scene` is the most frames a shot gets; with `dedupe_threshold` set, near-identical
+    frames within a shot are pruned first, so static shots get fewer (never zero).
+    With `workers` > 1, detection and capture each run across that many processes instead.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if workers > 1:
+        return _detect_and_capture_parallel(
+            video_path, threshold, min_scene_len, out_dir, per_scene, basename, jpeg_quality, dedupe_threshold, workers
+        )
+    encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+    stream = ShotStream(video_path, threshold=threshold, min_scene_len=min_scene_len, per_scene=per_scene)
+    shots, paths_by_scene, times_by_scene = [], [], []
+    for idx, (shot, keyframes) in enumerate(stream):
+        if dedupe_threshold is not None:
+            keyframes = prune_keyframes(keyframes, dedupe_threshold)
+        scene_paths, scene_times = [], []
+        for j, (t, frame) in enumerate(keyframes, start=1):
+            out_path = os.path.join(out_dir, f"{basename}-{idx:03d}_{j:02d}.jpg")
+            cv2.imwrite(out_path, frame, encode_params)
+            scene_paths.append(out_path)
+            scene_times.append(t)
+        shots.append(shot)
+        paths_by_scene.append(scene_paths)
+        times_by_scene.append(scene_times)
+    return shots, paths_by_scene, times_by_scene, stream.fps
+
+
+def _detect_and_capture_parallel(
+    video_path: str,
+    threshold: float,
+    min_scene_len: int,
+    out_dir: str,
+    per_scene: int,
+    basename: str,
+    jpeg_quality: int,
+    dedupe_threshold: Optional[float],
+    workers: int,
+) -> Tuple[List[Shot], List[List[str]], List[List[float]], float]:
+    shots, fps = detect_scenes_parallel(video_path, threshold, min_scene_len, workers=workers)
+    # Consecutive runs of shots with about the same number of frames per process.
+    frame_count = shots[-1][3] if shots else 0
+    groups: List[List[Tuple[int, List[float]]]] = [[] for _ in range(max(1, workers))]
+    for idx, (start_s, end_s, start_f, _) in enumerate(shots):
+        g = min(len(groups) - 1, start_f * len(groups) // max(1, frame_count))
+        groups[g].append((idx, pick_timepoints(start_s, end_s, per_scene)))
+    groups = [g for g in groups if g]
+    pool = _detect_pool(len(groups))
+    futures = [
+        pool.submit(_capture_segment, video_path, fps, g, out_dir, basename, jpeg_quality, dedupe_threshold)
+        for g in groups
+    ]
+    paths_by_scene: List[List[str]] = [[] for _ in shots]
+    times_by_scene: List[List[float]] = [[] for _ in shots]
+    for fut in futures:
+        for idx, paths, times in fut.result():
+            paths_by_scene[idx], times_by_scene[idx] = paths, times
+    return shots, paths_by_scene, times_by_scene, fps
+
+
+def export_clips(video_path: str, shots: List[Shot], fps: float, out_dir: str) -> List[str]:
+    """Re-encode one mp4 per shot with ffmpeg; returns the clip paths in shot order."""
+    os.makedirs(out_dir, exist_ok=True)
+    scene_list = [(FrameTimecode(s[2], fps=fps), FrameTimecode(s[3], fps=fps)) for s in shots]
+    split_video_ffmpeg(
+        input_video_path=video_path,
+        scene_list=scene_list,
+        output_file_template=os.path.join(out_dir, "shot-$SCENE_NUMBER.mp4"),
+    )
+    return sorted(
+        os.path.join(out_dir, f) for f in os.listdir(out_dir)
+        if f.startswith("shot-") and f.endswith(".mp4")
+    )
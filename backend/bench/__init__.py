@@ -0,0 +1 @@
+"""Offline benchmarks for ingest and search: `python -m bench.run --help` (from backend/)."""
@@ -0,0 +1,54 @@
+"""
+Compare two bench.run result files metric by metric:
+
+    python -m bench.compare bench-results/before.json bench-results/after.json
+"""
+import sys, json
+from typing import Any, Dict, Iterator, Tuple
+
+# Lower is better for everything except these.
+HIGHER_IS_BETTER = ("throughput_qps",)
+
+
+def _numbers(prefix: str, obj: Any) -> Iterator[Tuple[str, float]]:
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            yield from _numbers(f"{prefix}.{k}" if prefix else k, v)
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        yield prefix, float(obj)
+
+
+def flatten(result: Dict[str, Any]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for row in result.get("ingest", []):
+        out.update(_numbers(f"ingest[{row['video']}]", {k: v for k, v in row.items() if k != "ops"}))
+    for row in result.get("search", []):
+        name = f"search[{row['endpoint']} c={row['concurrency']}]"
+        out.update(_numbers(name, {k: v for k, v in row.items() if k.endswith("_ms") or k in ("throughput_qps", "errors")}))
+    return out
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__.strip())
+        return 2
+    with open(argv[0]) as f:
+        old = flatten(json.load(f))
+    with open(argv[1]) as f:
+        new = flatten(json.load(f))
+    width = max(map(len, old.keys() | new.keys()), default=10)
+    print(f"{'metric':<{width}}  {'before':>12}  {'after':>12}  change")
+    for key in sorted(old.keys() | new.keys()):
+        a, b = old.get(key), new.get(key)
+        change = ""
+        if a and b is not None:
+            pct = 100 * (b - a) / a
+            better = pct > 0 if key.endswith(HIGHER_IS_BETTER) else pct < 0
+            change = f"{pct:+.1f}%" + (" (better)" if better and abs(pct) >= 5 else " (worse)" if abs(pct) >= 5 else "")
+        print(f"{key:<{width}}  {'' if a is None else f'{a:.4g}':>12}  {'' if b is None else f'{b:.4g}':>12}  {change}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import io, threading, time, zlib
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+
+# ---------- Timing ----------
+class OpTimer:
+    """Thread-safe busy-time accumulator: name -> durations of every call."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._ops[name].append(seconds)
+
+    def wrap(self, name: str, fn: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - t0)
+        return timed
+
+    def reset(self) -> None:
+        with self._lock:
+            self._ops.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            ops = {k: list(v) for k, v in self._ops.items()}
+        return {
+            name: {
+                "calls": len(d),
+                "total_s": round(sum(d), 4),
+                "mean_ms": round(1000 * sum(d) / len(d), 3),
+                "max_ms": round(1000 * max(d), 3),
+            }
+            for name, d in sorted(ops.items()) if d
+        }
+
+
+# ---------- S3 ----------
+def _client_error(code: str, op: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, op)
+
+
+class MemoryS3:
+    """
+    In-memory stand-in for the boto3 S3 client calls the backend makes. `latency_s` is
+    added to every request to approximate a network round trip.
+    """
+    def __init__(self, timer: Optional[OpTimer] = None, latency_s: float = 0.0):
+        self.objects: Dict[str, bytes] = {}
+        self.timer = timer or OpTimer()
+        self.latency_s = latency_s
+        self._lock = threading.Lock()
+
+    def _io(self, op: str, t0: float) -> None:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        self.timer.record(f"s3.{op}", time.perf_counter() - t0)
+
+    def _get(self, key: str, op: str) -> bytes:
+        with self._lock:
+            if key not in self.objects:
+                raise _client_error("404" if op == "HeadObject" else "NoSuchKey", op)
+            return self.objects[key]
+
+    def put_bytes(self, key: str, body: bytes) -> None:
+        with self._lock:
+            self.objects[key] = body
+
+    def head_object(self, Bucket: str, Key: str, **_) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        body = self._get(Key, "HeadObject")
+        self._io("head_object", t0)
+        return {"ContentLength": len(body)}
+
+    def get_object(self, Bucket: str, Key: str, **_) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        body = self._get(Key, "GetObject")
+        self._io("get_object", t0)
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **_) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        self.put_bytes(Key, Body if isinstance(Body, bytes) else Body.read())
+        self._io("put_object", t0)
+        return {}
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, ExtraArgs=None, **_) -> None:
+        t0 = time.perf_counter()
+        with open(Filename, "rb") as f:
+            self.put_bytes(Key, f.read())
+        self._io("upload_file", t0)
+
+    def download_file(self, Bucket: str, Key: str, Filename: str, **_) -> None:
+        t0 = time.perf_counter()
+        body = self._get(Key, "GetObject")
+        with open(Filename, "wb") as f:
+            f.write(body)
+        self._io("download_file", t0)
+
+    def delete_objects(self, Bucket: str, Delete: Dict[str, Any], **_) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        with self._lock:
+            for obj in Delete["Objects"]:
+                self.objects.pop(obj["Key"], None)
+        self._io("delete_objects", t0)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", MaxKeys: int = 1000,
+                        ContinuationToken: Optional[str] = None, **_) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        with self._lock:
+            keys = sorted(k for k in self.objects if k.startswith(Prefix) and (ContinuationToken is None or k > ContinuationToken))
+        page = keys[:MaxKeys]
+        self._io("list_objects_v2", t0)
+        out = {"KeyCount": len(page), "Contents": [{"Key": k, "Size": len(self.objects[k])} for k in page]}
+        if len(keys) > MaxKeys:
+            out.update(IsTruncated=True, NextContinuationToken=page[-1])
+        return out
+
+    def get_paginator(self, name: str):
+        if name != "list_objects_v2":
+            raise NotImplementedError(name)
+        client = self
+
+        class _Paginator:
+            def paginate(self, Bucket: str, Prefix: str = ""):
+                token = None
+                while True:
+                    page = client.list_objects_v2(Bucket=Bucket, Prefix=Prefix, ContinuationToken=token)
+                    yield page
+                    if not page.get("IsTruncated"):
+                        return
+                    token = page["NextContinuationToken"]
+        return _Paginator()
+
+    def generate_presigned_url(self, ClientMethod: str, Params: Dict[str, Any], ExpiresIn: int = 3600, **_) -> str:
+        return f"memory://{Params.get('Bucket')}/{Params.get('Key')}"
+
+
+# ---------- CLIP ----------
+class FakeClipProcessor:
+    """Stands in for CLIPProcessor: 16x16 thumbnails as pixels, crc32 words as token ids."""
+    def __call__(self, images=None, text=None, return_tensors="np", padding=True, **_):
+        if images is not None:
+            return {"pixel_values": np.stack([
+                np.asarray(im.convert("RGB").resize((16, 16)), dtype=np.float32).ravel() / 255.0 for im in images
+            ])}
+        ids = [[zlib.crc32(w.encode()) % 49408 for w in t.lower().split()][:77] or [0] for t in text]
+        width = max(map(len, ids))
+        return {
+            "input_ids": np.array([r + [0] * (width - len(r)) for r in ids], dtype=np.int64),
+            "attention_mask": np.array([[1] * len(r) + [0] * (width - len(r)) for r in ids], dtype=np.int64),
+        }
+
+
+class FakeClipEngine:
+    """
+    Deterministic random projections into EMBED_DIM. Costs next to nothing, so ingest and
+    search runs with it measure everything except the model.
+    """
+    name = "fake"
+    parity = None
+
+    def __init__(self, dim: int = 768, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.image_proj = rng.standard_normal((16 * 16 * 3, dim)).astype(np.float32)
+        self.token_table = rng.standard_normal((49408, dim)).astype(np.float32)
+
+    def image_features(self, pixel_values: np.ndarray) -> np.ndarray:
+        return pixel_values.reshape(len(pixel_values), -1) @ self.image_proj
+
+    def text_features(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        return (self.token_table[input_ids] * attention_mask[..., None]).sum(axis=1)
+
@@ -0,0 +1,270 @@
+"""
+End-to-end ingest and search benchmark that needs no AWS account, Pinecone index or .env:
+S3 is held in memory, vectors go to the local store in a temp dir, and the API is served
+by an in-process uvicorn.
+
+    cd backend
+    python -m bench.run --shots 20 --shot-seconds 3 --concurrency 1,8,32
+    python -m bench.run --encoder fake --videos 4           # everything but the model
+    python -m bench.run --video ~/films/trailer.mp4 --out bench-results/trailer.json
+
+Results are written as JSON (default bench-results/bench-<time>.json); compare two runs
+with `python -m bench.compare old.json new.json`.
+"""
+import os, sys, json, time, shutil, socket, logging, argparse, platform, subprocess, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from .fakes import OpTimer, MemoryS3, FakeClipProcessor, FakeClipEngine
+from .videos import make_test_video, shot_durations
+
+BUCKET = "bench"
+QUERIES = [
+    "a person walking down a street", "close-up of a face", "car driving at night", "people talking at a table",
+    "wide shot of a city skyline", "a dog running on grass", "colour bars test pattern", "text on a screen",
+    "an explosion", "someone holding a phone", "ocean waves on a beach", "a crowded room",
+]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ms = np.asarray(samples) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(ms, p)), 3) for p in (50, 90, 99)} | {"max_ms": round(float(ms.max()), 3)}
+
+
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+# ---------- Ingest ----------
+def bench_ingest(main, video_bytes: bytes, name: str, timer: OpTimer, expected_shots: Optional[int]) -> Dict[str, Any]:
+    from app.video import detect_scenes, detect_scenes_parallel, DETECT_WORKERS
+
+    key = f"videos/{name}.mp4-bench/{name}.mp4"
+    main.s3.put_bytes(key, video_bytes)
+    stages: List[List[Any]] = []  # [name, started_at]
+
+    def progress(stage: str, **info):
+        stages.append([stage, time.perf_counter()])
+
+    timer.reset()
+    req = main.SplitShotsRequest(source_s3_uri=f"s3://{BUCKET}/{key}", split_clips=True, export_clips=False, stream_source=False)
+    t0 = time.perf_counter()
+    res = main.run_split_shots(req, progress)
+    total = time.perf_counter() - t0
+    stage_wall = {}
+    for (stage, start), nxt in zip(stages, stages[1:] + [[None, t0 + total]]):
+        stage_wall[stage] = round(stage_wall.get(stage, 0.0) + nxt[1] - start, 4)
+    ops = timer.summary()
+
+    # Detection alone, on a local copy, to split the fused detect+thumbnail decode.
+    with tempfile.NamedTemporaryFile(suffix=".mp4") as f:
+        f.write(video_bytes)
+        f.flush()
+        t1 = time.perf_counter()
+        if DETECT_WORKERS > 1:
+            detect_scenes_parallel(f.name, req.threshold, req.min_scene_len)
+        else:
+            detect_scenes(f.name, req.threshold, req.min_scene_len)
+        detect_only = time.perf_counter() - t1
+
+    thumbs = sum(len(s) for s in res.thumbnail_s3_uris_by_scene or [])
+    return {
+        "video": name,
+        "bytes": len(video_bytes),
+        "shots": len(res.shots),
+        "expected_shots": expected_shots,
+        "thumbnails": thumbs,
+        "total_s": round(total, 4),
+        "stages_wall_s": stage_wall,
+        "detect_only_s": round(detect_only, 4),
+        "thumbnails_s": round(max(0.0, stage_wall.get("detect", 0.0) - detect_only), 4),
+        "ops": ops,
+        "source_s3_uri": req.source_s3_uri,
+    }
+
+
+# ---------- Search ----------
+class Server:
+    """main.app on a free localhost port, in a background thread."""
+    def __init__(self, app):
+        import uvicorn
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "Server":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.02)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+    def post_form(self, path: str, fields: List[tuple]) -> float:
+        body = urlencode(fields).encode()
+        req = Request(f"http://127.0.0.1:{self.port}{path}", data=body,
+                      headers={"Content-Type": "application/x-www-form-urlencoded"})
+        t0 = time.perf_counter()
+        with urlopen(req, timeout=120) as resp:
+            resp.read()
+        return time.perf_counter() - t0
+
+
+def bench_search(server: Server, timer: OpTimer, path: str, fields_for, requests: int, concurrency: int) -> Dict[str, Any]:
+    timer.reset()
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    def one(i: int):
+        try:
+            latencies.append(server.post_form(path, fields_for(i)))
+        except Exception as e:
+            errors.append(str(e))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - t0
+    return {
+        "endpoint": path,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_qps": round(len(latencies) / wall, 2),
+        **percentiles(latencies),
+        "ops": timer.summary(),
+    }
+
+
+# ---------- Main ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Offline SceneIt ingest + search benchmark")
+    ap.add_argument("--video", help="benchmark this file instead of generated test videos")
+    ap.add_argument("--videos", type=int, default=1, help="videos to ingest")
+    ap.add_argument("--shots", type=int, default=12, help="shots per generated video")
+    ap.add_argument("--shot-seconds", type=float, default=2.5)
+    ap.add_argument("--jitter", type=float, default=0.5, help="shot length spread, 0..1")
+    ap.add_argument("--fps", type=int, default=24)
+    ap.add_argument("--size", default="640x360")
+    ap.add_argument("--encoder", choices=["clip", "fake"], default="clip")
+    ap.add_argument("--s3-latency-ms", type=float, default=0.0, help="added to every S3 call")
+    ap.add_argument("--queries", type=int, default=200, help="requests per search run")
+    ap.add_argument("--distinct-queries", type=int, default=50, help="distinct texts; the rest repeat (cache hits)")
+    ap.add_argument("--concurrency", default="1,8,32")
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="sceneit-bench-")
+    # The app reads its settings at import: point everything at local stand-ins first.
+    os.environ.update({
+        "S3_BUCKET": BUCKET,
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_DIR": os.path.join(work, "vector_index"),
+        "SCRATCH_DIR": os.path.join(work, "scratch"),
+        "QUERY_CACHE_DIR": "",
+        "MODEL_WARMUP": "0",
+    })
+    logging.basicConfig(level=logging.WARNING)
+    from app import main as app_main, embeddings
+    from app.vector_store import get_vector_store
+    logging.getLogger().setLevel(logging.WARNING)
+
+    timer = OpTimer()
+    mem = MemoryS3(timer, latency_s=args.s3_latency_ms / 1000)
+    app_main.s3 = mem
+    app_main.active_index.s3 = mem
+    if args.encoder == "fake":
+        embeddings._clip = (FakeClipProcessor(), FakeClipEngine(embeddings.EMBED_DIM))
+    embeddings._encode_batch = timer.wrap("embed_batch", embeddings._encode_batch)
+    embeddings.encode_texts = timer.wrap("encode_texts", embeddings.encode_texts)
+    store = get_vector_store()
+    store.upsert = timer.wrap("store.upsert", store.upsert)
+    store.query = timer.wrap("store.query", store.query)
+
+    t_model = time.perf_counter()
+    embeddings.get_clip()
+    model_load_s = time.perf_counter() - t_model
+
+    # Ingest
+    ingest = []
+    for i in range(args.videos):
+        name = f"bench-{i}"
+        expected = None
+        if args.video:
+            with open(args.video, "rb") as f:
+                data = f.read()
+        else:
+            durations = shot_durations(args.shots, args.shot_seconds, args.jitter, seed=i)
+            path = make_test_video(os.path.join(work, f"{name}.mp4"), durations, args.fps, args.size)
+            with open(path, "rb") as f:
+                data = f.read()
+            expected = len(durations)
+        row = bench_ingest(app_main, data, name, timer, expected)
+        ingest.append(row)
+        print(f"ingest {name}: {row['shots']} shots, {row['thumbnails']} thumbnails in {row['total_s']:.2f}s", file=sys.stderr)
+
+    # Search
+    texts = [f"{QUERIES[i % len(QUERIES)]} {i // len(QUERIES)}".strip() for i in range(args.distinct_queries)]
+    filenames = [r["source_s3_uri"] for r in ingest]
+    search = []
+    with Server(app_main.app) as server:
+        for c in [int(x) for x in args.concurrency.split(",") if x]:
+            embeddings.query_cache.clear()
+            search.append(bench_search(
+                server, timer, "/search_embeddings",
+                lambda i: [("filename", filenames[i % len(filenames)]), ("text_search", texts[i % len(texts)]),
+                           ("top_k", args.top_k)],
+                args.queries, c,
+            ))
+            embeddings.query_cache.clear()
+            search.append(bench_search(
+                server, timer, "/search_library",
+                lambda i: [("text_search", texts[i % len(texts)]), ("top_k", args.top_k)],
+                args.queries, c,
+            ))
+            for r in search[-2:]:
+                print(f"search {r['endpoint']} c={c}: p50 {r.get('p50_ms')}ms p99 {r.get('p99_ms')}ms "
+                      f"{r['throughput_qps']} qps, {r['errors']} errors", file=sys.stderr)
+
+    result = {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "env": {k: os.getenv(k) for k in ("CLIP_ENGINE", "EMBED_BATCH_SIZE", "DETECT_WORKERS",
+                                              "INGEST_UPLOAD_WORKERS", "INGEST_UPSERT_WORKERS", "QUERY_BATCH_MAX")},
+            "model_load_s": round(model_load_s, 3),
+        },
+        "ingest": ingest,
+        "search": search,
+    }
+    shutil.rmtree(work, ignore_errors=True)
+    out = args.out or os.path.join("bench-results", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
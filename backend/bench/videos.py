@@ -0,0 +1,42 @@
+import shutil, subprocess
+from typing import List, Optional
+
+import numpy as np
+
+# lavfi test sources cycled per shot; each shot also gets its own hue so consecutive
+# shots from the same source still differ.
+SOURCES = ["testsrc", "testsrc2", "smptebars", "rgbtestsrc", "smptehdbars", "yuvtestsrc", "pal100bars"]
+
+
+def shot_durations(shots: int, shot_seconds: float, jitter: float = 0.0, seed: int = 0) -> List[float]:
+    """`shots` durations around `shot_seconds`, each scaled by up to +/- `jitter` (0..1)."""
+    rng = np.random.default_rng(seed)
+    return [round(shot_seconds * (1 + jitter * rng.uniform(-1, 1)), 3) for _ in range(shots)]
+
+
+def make_test_video(
+    path: str,
+    durations: List[float],
+    fps: int = 24,
+    size: str = "640x360",
+    codec: str = "libx264",
+    ffmpeg: Optional[str] = None,
+) -> str:
+    """Render one ffmpeg test-pattern shot per entry of `durations`, hard cuts in between."""
+    ffmpeg = ffmpeg or shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found on PATH; install it or pass --video")
+    cmd = [ffmpeg, "-hide_banner", "-loglevel", "error", "-y"]
+    for i, d in enumerate(durations):
+        cmd += ["-f", "lavfi", "-i", f"{SOURCES[i % len(SOURCES)]}=duration={d}:size={size}:rate={fps}"]
+    chains = [f"[{i}:v]format=yuv420p,hue=h={(i * 47) % 360},setsar=1[v{i}]" for i in range(len(durations))]
+    concat = "".join(f"[v{i}]" for i in range(len(durations))) + f"concat=n={len(durations)}:v=1:a=0[out]"
+    cmd += [
+        "-filter_complex", ";".join(chains + [concat]),
+        "-map", "[out]", "-c:v", codec, "-pix_fmt", "yuv420p",
+    ]
+    if codec == "libx264":
+        cmd += ["-preset", "veryfast"]
+    cmd.append(path)
+    subprocess.run(cmd, check=True)
+    return path
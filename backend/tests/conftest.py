@@ -0,0 +1,79 @@
+import os, tempfile
+
+# The app reads its settings at import, so point it at local stand-ins before any test imports it.
+_WORK = tempfile.mkdtemp(prefix="sceneit-tests-")
+os.environ.update({
+    "S3_BUCKET": "test",
+    "VECTOR_BACKEND": "local",
+    "LOCAL_INDEX_DIR": os.path.join(_WORK, "vector_index"),
+    "SCRATCH_DIR": os.path.join(_WORK, "scratch"),
+    "QUERY_CACHE_DIR": "",
+    "MODEL_WARMUP": "0",
+    "EMBED_BATCH_SIZE": "2",                 # several upsert calls even for a short video
+    "INGEST_CHECKPOINT_INTERVAL": "3600",    # mid-stage checkpoints only when forced
+    "INGEST_UPSERT_WORKERS": "1",
+})
+
+import cv2
+import numpy as np
+import pytest
+
+from bench.fakes import MemoryS3, FakeClipProcessor, FakeClipEngine
+
+SHOT_COLOURS = [(0, 0, 255), (0, 255, 0), (255, 0, 0), (0, 255, 255), (255, 0, 255), (255, 255, 255)]
+
+
+@pytest.fixture(scope="session")
+def test_video(tmp_path_factory) -> str:
+    """Six one-second shots of flat colour with hard cuts, as MJPG (no ffmpeg needed)."""
+    path = str(tmp_path_factory.mktemp("video") / "shots.avi")
+    w = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 24, (160, 120))
+    for colour in SHOT_COLOURS:
+        for i in range(24):
+            frame = np.full((120, 160, 3), colour, np.uint8)
+            cv2.putText(frame, str(i), (10 + 3 * i, 60), 0, 1, (40, 40, 40), 2)
+            w.write(frame)
+    w.release()
+    return path
+
+
+@pytest.fixture
+def mem_s3() -> MemoryS3:
+    return MemoryS3()
+
+
+@pytest.fixture
+def fake_clip(monkeypatch) -> FakeClipEngine:
+    """The fake CLIP engine in place of the real model; returns the engine."""
+    from app import embeddings
+
+    engine = FakeClipEngine(embeddings.EMBED_DIM)
+    monkeypatch.setattr(embeddings, "_clip", (FakeClipProcessor(), engine))
+    return engine
+
+
+@pytest.fixture
+def app_main(mem_s3, tmp_path, fake_clip):
+    """app.main wired to in-memory S3, the fake CLIP engine and a fresh local vector store."""
+    from app import main, vector_store
+    from app.manifest import manifest_cache
+    from app.storage import presign_cache
+    from app.temporal import scene_matrix_cache
+
+    main.s3 = mem_s3
+    main.active_index.s3 = mem_s3
+    main.active_index._loaded_at = float("-inf")
+    vector_store._store = vector_store.LocalVectorStore(str(tmp_path / "vector_index"))
+    for cache in (manifest_cache, scene_matrix_cache):
+        cache._entries.clear()
+    presign_cache.clear()
+    scene_matrix_cache._bytes = 0
+    return main
+
+
+def put_video(main, path: str, name: str = "film") -> str:
+    """Upload `path` where /presign would put it; returns its s3:// URI."""
+    key = f"videos/{name}.avi-test/{name}.avi"
+    with open(path, "rb") as f:
+        main.s3.put_bytes(key, f.read())
+    return f"s3://test/{key}"
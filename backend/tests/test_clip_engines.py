@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from app import clip_engines
+from bench.fakes import FakeClipEngine, FakeClipProcessor
+
+
+class NoisyEngine:
+    """The reference engine with Gaussian noise on its features, standing in for a lossy export."""
+    name = "int8"
+    parity = None
+
+    def __init__(self, reference: FakeClipEngine, scale: float):
+        self.reference = reference
+        self.scale = scale
+        self.rng = np.random.default_rng(1)
+
+    def _noisy(self, feats: np.ndarray) -> np.ndarray:
+        return feats + self.scale * np.abs(feats).mean() * self.rng.standard_normal(feats.shape).astype(np.float32)
+
+    def image_features(self, pixel_values):
+        return self._noisy(self.reference.image_features(pixel_values))
+
+    def text_features(self, input_ids, attention_mask):
+        return self._noisy(self.reference.text_features(input_ids, attention_mask))
+
+
+@pytest.fixture
+def no_torch(monkeypatch):
+    """load_engine with the fake engine as the fp32 model and torch kept out of the way."""
+    monkeypatch.setattr(clip_engines, "configure_threads", lambda: None)
+    monkeypatch.setattr(clip_engines, "TorchEngine", lambda model: model)
+    return FakeClipEngine(64)
+
+
+def test_parity_is_one_for_the_same_engine():
+    engine = FakeClipEngine(64)
+    assert clip_engines.parity_check(engine, engine, FakeClipProcessor()) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_parity_drops_with_drift():
+    reference, processor = FakeClipEngine(64), FakeClipProcessor()
+    slight = clip_engines.parity_check(reference, NoisyEngine(reference, 0.01), processor)
+    heavy = clip_engines.parity_check(reference, NoisyEngine(reference, 1.0), processor)
+    assert 0.99 < slight < 1.0
+    assert heavy < 0.9
+
+
+def test_engine_within_tolerance_is_used(no_torch, monkeypatch):
+    monkeypatch.setattr(clip_engines, "Int8Engine", lambda model: NoisyEngine(model, 0.01))
+
+    engine = clip_engines.load_engine(no_torch, FakeClipProcessor(), "fake", engine="int8")
+
+    assert isinstance(engine, NoisyEngine)
+    assert engine.parity > clip_engines.CLIP_PARITY_MIN_COSINE
+
+
+def test_engine_failing_parity_falls_back_to_fp32(no_torch, monkeypatch):
+    monkeypatch.setattr(clip_engines, "Int8Engine", lambda model: NoisyEngine(model, 1.0))
+
+    assert clip_engines.load_engine(no_torch, FakeClipProcessor(), "fake", engine="int8") is no_torch
+
+
+def test_parity_check_can_be_turned_off(no_torch, monkeypatch):
+    monkeypatch.setattr(clip_engines, "Int8Engine", lambda model: NoisyEngine(model, 1.0))
+    monkeypatch.setattr(clip_engines, "CLIP_PARITY_CHECK", False)
+
+    engine = clip_engines.load_engine(no_torch, FakeClipProcessor(), "fake", engine="int8")
+
+    assert isinstance(engine, NoisyEngine) and engine.parity is None
+
+
+def test_unknown_engine_is_rejected(no_torch):
+    with pytest.raises(ValueError, match="Unknown CLIP_ENGINE: tensorrt"):
+        clip_engines.load_engine(no_torch, FakeClipProcessor(), "fake", engine="tensorrt")
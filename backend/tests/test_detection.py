@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+import pytest
+
+from app import video
+from app.video import detect_scenes, detect_scenes_parallel
+
+# test_video: six one-second shots at 24 fps, so hard cuts at these frames
+CUTS = [24, 48, 72, 96, 120]
+SHOT_FRAMES = [(0, 24), (24, 48), (48, 72), (72, 96), (96, 120), (120, 144)]
+
+
+@pytest.fixture(scope="module")
+def still_video(tmp_path_factory) -> str:
+    """Two seconds of one flat colour: no cuts."""
+    path = str(tmp_path_factory.mktemp("video") / "still.avi")
+    w = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 24, (160, 120))
+    for _ in range(48):
+        w.write(np.full((120, 160, 3), (90, 120, 150), np.uint8))
+    w.release()
+    return path
+
+
+@pytest.fixture
+def segments(monkeypatch):
+    """Records the core [lo, hi) frame ranges detect_scenes_parallel splits the video into."""
+    recorded = []
+
+    def split_evenly(total, parts):
+        cores = real(total, parts)
+        recorded.extend(cores)
+        return cores
+
+    real = video._split_evenly
+    monkeypatch.setattr(video, "_split_evenly", split_evenly)
+    return recorded
+
+
+def test_parallel_detection_stitches_cuts_across_segments(test_video, segments):
+    _, serial = detect_scenes(test_video, threshold=10.0, min_scene_len=5)
+    parallel, fps = detect_scenes_parallel(test_video, threshold=10.0, min_scene_len=5, workers=4,
+                                           overlap_s=1.0, min_segment_s=1.0)
+
+    assert segments == [(0, 36), (36, 72), (72, 108), (108, 144)]
+    overlap = int(1.0 * fps)
+    # Every cut is also decoded (past a segment's first frame) by a segment whose core doesn't
+    # own it, and 72 sits on a core boundary: each must still come out exactly once.
+    seen_in_overlap = {
+        c for lo, hi in segments for c in CUTS
+        if max(0, lo - overlap) < c < hi + overlap and not lo <= c < hi
+    }
+    assert seen_in_overlap == set(CUTS)
+    assert [s[2:] for s in parallel] == [s[2:] for s in serial] == SHOT_FRAMES
+    assert parallel[0][:2] == (0.0, 1.0)
+
+
+def test_short_videos_use_fewer_segments(test_video, segments):
+    shots, _ = detect_scenes_parallel(test_video, threshold=10.0, min_scene_len=5, workers=4, min_segment_s=2.0)
+    assert segments == [(0, 48), (48, 96), (96, 144)]  # 6 s at >= 2 s a segment
+    assert [s[2:] for s in shots] == SHOT_FRAMES
+    segments.clear()
+    shots, _ = detect_scenes_parallel(test_video, threshold=10.0, min_scene_len=5, workers=4, min_segment_s=30.0)
+    assert segments == []  # one segment: decoded in this process, no split
+    assert [s[2:] for s in shots] == SHOT_FRAMES
+
+
+def test_serial_and_parallel_detection_agree_without_cuts(still_video, segments):
+    _, serial = detect_scenes(still_video, threshold=27.0, min_scene_len=5)
+    parallel, _ = detect_scenes_parallel(still_video, threshold=27.0, min_scene_len=5, workers=2,
+                                         overlap_s=0.25, min_segment_s=0.5)
+    assert len(segments) == 2
+    assert [s[2:] for s in parallel] == [s[2:] for s in serial] == [(0, 48)]
+
+
+def test_video_without_cuts_is_one_shot(still_video):
+    _, shots = detect_scenes(still_video, threshold=27.0, min_scene_len=5)
+    assert [s[2:] for s in shots] == [(0, 48)]
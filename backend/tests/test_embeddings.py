@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.embeddings import EMBED_DIM, create_embeddings, iter_embedding_batches
+
+
+@pytest.fixture
+def image_files(tmp_path):
+    paths = []
+    for i in range(7):
+        path = tmp_path / f"img{i}.jpg"
+        Image.new("RGB", (32, 24), (30 * i, 255 - 30 * i, 90)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_batches_fill_the_preallocated_array_in_order(fake_clip, image_files, monkeypatch):
+    calls = []
+    real = fake_clip.image_features
+    monkeypatch.setattr(fake_clip, "image_features", lambda px: calls.append(len(px)) or real(px))
+    images = [Image.open(p) for p in image_files]
+    out = np.full((7, EMBED_DIM), np.nan, dtype=np.float32)
+
+    ranges = list(iter_embedding_batches(iter(images), out, batch_size=3))
+
+    assert ranges == [(0, 3), (3, 6), (6, 7)]
+    assert calls == [3, 3, 1]
+    assert np.allclose(np.linalg.norm(out, axis=1), 1.0)
+    one_by_one = np.empty_like(out)
+    list(iter_embedding_batches(iter(images), one_by_one, batch_size=1))
+    assert np.allclose(out, one_by_one, atol=1e-5)  # batching doesn't change the vectors
+
+
+def test_create_embeddings_returns_one_unit_row_per_file(fake_clip, image_files):
+    out = create_embeddings(image_files, batch_size=4)
+    assert out.shape == (7, EMBED_DIM) and out.dtype == np.float32
+    assert np.allclose(np.linalg.norm(out, axis=1), 1.0)
+    assert not np.allclose(out[0], out[1])
+
+
+def test_image_count_must_match_the_array(fake_clip, image_files):
+    out = np.empty((len(image_files) + 1, EMBED_DIM), dtype=np.float32)
+    with pytest.raises(ValueError, match="Expected 8 images, got 7"):
+        list(iter_embedding_batches((Image.open(p) for p in image_files), out, batch_size=4))
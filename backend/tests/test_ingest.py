@@ -0,0 +1,100 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.embeddings import EMBED_DIM
+from app.ingest import build_vector_records, run_ingest_pipeline
+
+
+class RecordingIndex:
+    def __init__(self, fail_on_call=None, delay_s=0.0):
+        self.calls = []
+        self.times = []
+        self.fail_on_call = fail_on_call
+        self.delay_s = delay_s
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace):
+        time.sleep(self.delay_s)
+        with self._lock:
+            if len(self.calls) + 1 == self.fail_on_call:
+                raise RuntimeError("index down")
+            self.calls.append([v[0] for v in vectors])
+            self.times.append(time.perf_counter())
+
+
+@pytest.fixture
+def thumbs(tmp_path):
+    """Three scenes with 3, 2 and 4 thumbnails, and their vector records."""
+    counts = [3, 2, 4]
+    paths, times, keys = [], [], []
+    for s, n in enumerate(counts):
+        paths.append([]); times.append([]); keys.append([])
+        for j in range(n):
+            p = tmp_path / f"shot-{s:03d}_{j + 1:02d}.jpg"
+            Image.new("RGB", (32, 24), (40 * s, 25 * j, 100)).save(p)
+            paths[-1].append(str(p)); times[-1].append(s + 0.25 * j); keys[-1].append(f"thumbs/{p.name}")
+    shots = [(float(s), float(s + 1), 24 * s, 24 * (s + 1)) for s in range(len(counts))]
+    return paths, build_vector_records("vid", "s3://test/v.mp4", shots, times, keys)
+
+
+def run(mem_s3, index, thumbs, **kwargs):
+    paths, records = thumbs
+    return run_ingest_pipeline(
+        s3_client=mem_s3, index=index, namespace="vid", bucket="test", thumbs_prefix="thumbs/",
+        thumb_paths_by_scene=paths, records=records, embed_batch_size=2, upsert_workers=2, **kwargs,
+    )
+
+
+def test_every_thumbnail_is_uploaded_embedded_and_upserted_once(fake_clip, mem_s3, thumbs):
+    index = RecordingIndex()
+    uploaded, embedded = [], []
+    out = run(mem_s3, index, thumbs, on_uploaded=lambda: uploaded.append(True), on_embedded=embedded.append)
+
+    _, records = thumbs
+    assert out.shape == (9, EMBED_DIM)
+    assert sorted(i for call in index.calls for i in call) == sorted(r[0] for r in records)
+    assert records[0][0] == "vid:s000:t00" and records[3][1]["scene_index"] == 1
+    assert all(mem_s3.head_object(Bucket="test", Key=r[1]["thumb_key"]) for r in records)
+    assert uploaded == [True] and embedded[0] is out
+
+
+def test_upserts_start_while_later_batches_are_still_embedding(fake_clip, mem_s3, thumbs, monkeypatch):
+    embed_done = []
+    real = fake_clip.image_features
+
+    def slow_features(px):
+        time.sleep(0.05)
+        out = real(px)
+        embed_done.append(time.perf_counter())
+        return out
+
+    monkeypatch.setattr(fake_clip, "image_features", slow_features)
+    index = RecordingIndex()
+    run(mem_s3, index, thumbs)
+    assert min(index.times) < max(embed_done)
+
+
+def test_resume_skips_upserted_rows_and_reuses_embeddings(fake_clip, mem_s3, thumbs, monkeypatch):
+    first = run(mem_s3, RecordingIndex(), thumbs)
+    monkeypatch.setattr(fake_clip, "image_features", lambda px: pytest.fail("encoder ran on resume"))
+    index = RecordingIndex()
+    out = run(mem_s3, index, thumbs, embeddings=first, upload=False, skip_ranges=[[0, 4], [6, 7]])
+    assert out is first
+    assert sorted(i for call in index.calls for i in call) == [thumbs[1][r][0] for r in (4, 5, 7, 8)]
+
+
+def test_an_upsert_failure_stops_the_pipeline(fake_clip, mem_s3, thumbs):
+    with pytest.raises(RuntimeError, match="index down"):
+        run(mem_s3, RecordingIndex(fail_on_call=2), thumbs)
+
+
+def test_record_count_must_match_thumbnails(fake_clip, mem_s3, thumbs):
+    paths, records = thumbs
+    with pytest.raises(ValueError, match="9 thumbnails but 8 vector records"):
+        run(mem_s3, RecordingIndex(), (paths, records[:8]))
+    with pytest.raises(ValueError, match="shape"):
+        run(mem_s3, RecordingIndex(), thumbs, embeddings=np.zeros((3, EMBED_DIM), np.float32), upload=False)
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from app.jobs import JobStore, KeyLocks
+from tests.conftest import put_video
+
+
+def wait_for(job_store, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = job_store.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_job_store_keeps_one_active_job_per_key():
+    store = JobStore(history=1)
+    job, created = store.create("video", {})
+    again, created_again = store.create("video", {})
+    assert created and not created_again and again["id"] == job["id"]
+    store.enter_stage(job["id"], "detect", shots=3)
+    assert store.get(job["id"])["stages"][0]["shots"] == 3
+    store.finish(job["id"], result={"ok": True})
+    next_job, created = store.create("video", {})
+    assert created and next_job["id"] != job["id"]
+    assert store.counts()["succeeded"] == 1
+
+
+def test_key_locks_serialise_one_key_only():
+    locks = KeyLocks()
+    inside, overlap, waited = [0], [False], []
+
+    def work(key):
+        with locks.hold(key, on_wait=lambda: waited.append(key)):
+            inside[0] += 1
+            overlap[0] |= inside[0] > 1 and key == "a"
+            time.sleep(0.05)
+            inside[0] -= 1
+
+    threads = [threading.Thread(target=work, args=("a",)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not overlap[0] and waited == ["a", "a"]
+    assert locks._locks == {}  # dropped once released
+
+
+def test_split_shots_and_a_job_for_one_video_decode_it_once(app_main, test_video, monkeypatch):
+    decodes, active, most = [], [0], [0]
+    real = app_main.detect_and_capture
+
+    def slow_capture(*args, **kwargs):
+        active[0] += 1
+        most[0] = max(most[0], active[0])
+        decodes.append(threading.current_thread().name)
+        time.sleep(0.3)
+        try:
+            return real(*args, **kwargs)
+        finally:
+            active[0] -= 1
+
+    monkeypatch.setattr(app_main, "detect_and_capture", slow_capture)
+    req = app_main.SplitShotsRequest(source_s3_uri=put_video(app_main, test_video), stream_source=False)
+    created = app_main.create_job(req)
+    sync = app_main.split_shots(req)
+    job = wait_for(app_main.job_store, created.job_id)
+
+    assert job["status"] == "succeeded"
+    assert len(decodes) == 1 and most[0] == 1
+    assert {sync.already_processed, job["result"]["already_processed"]} == {True, False}
+    assert sync.shots == [app_main.ShotBoundary(**s) for s in job["result"]["shots"]]
@@ -0,0 +1,47 @@
+from app.manifest import IngestManifest, merge_ranges, subtract_ranges
+
+
+def test_merge_ranges_sorts_and_joins_overlapping_and_touching():
+    assert merge_ranges([]) == []
+    assert merge_ranges([[10, 20], [0, 5], [5, 8], [15, 30], [40, 41]]) == [[0, 8], [10, 30], [40, 41]]
+    assert merge_ranges([(3, 4), (0, 10)]) == [[0, 10]]
+
+
+def test_subtract_ranges_leaves_only_the_gaps():
+    done = merge_ranges([[2, 4], [6, 8]])
+    assert subtract_ranges(0, 10, done) == [(0, 2), (4, 6), (8, 10)]
+    assert subtract_ranges(2, 4, done) == []
+    assert subtract_ranges(3, 7, done) == [(4, 6)]
+    assert subtract_ranges(8, 12, done) == [(8, 12)]
+    assert subtract_ranges(0, 10, []) == [(0, 10)]
+
+
+def test_manifest_round_trip_resumes_at_first_incomplete_stage(mem_s3):
+    m = IngestManifest.new(mem_s3, "test", "videos/x/manifest.json", "s3://test/videos/x", {"threshold": 27.0})
+    assert m.first_incomplete() == "shots"
+    m.mark_done("shots", shots=[[0.0, 1.0, 0, 24]])
+    m.mark_done("thumbnails")
+    m.add_upserted(0, 2)
+    m.add_upserted(4, 6)
+    m.add_upserted(2, 4)
+    m.save()
+
+    loaded = IngestManifest.load(mem_s3, "test", "videos/x/manifest.json")
+    assert not loaded.complete
+    assert loaded.first_incomplete() == "clips"
+    assert loaded.first_incomplete(skip=("clips",)) == "embeddings"
+    assert loaded.upserted_ranges() == [[0, 6]]
+    assert subtract_ranges(0, 8, loaded.upserted_ranges()) == [(6, 8)]
+
+    loaded.mark_done("clips", uris=[])
+    loaded.mark_done("embeddings", key="k", rows=8)
+    loaded.mark_done("upsert", ranges=[[0, 8]])
+    loaded.finish(outputs={})
+    again = IngestManifest.load(mem_s3, "test", "videos/x/manifest.json")
+    assert again.complete and again.first_incomplete() is None
+
+
+def test_manifest_without_version_counts_as_complete(mem_s3):
+    mem_s3.put_object(Bucket="test", Key="old/manifest.json", Body=b'{"shots": []}')
+    assert IngestManifest.load(mem_s3, "test", "old/manifest.json").complete
+    assert IngestManifest.load(mem_s3, "test", "missing/manifest.json") is None
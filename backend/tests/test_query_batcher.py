@@ -0,0 +1,88 @@
+import asyncio, threading
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import embeddings
+from app.embeddings import QueryBatcher, encode_images, encode_texts
+from tests.conftest import put_video
+
+
+def test_concurrent_queries_are_encoded_in_one_batch(fake_clip):
+    batcher = QueryBatcher(max_batch=8, window_ms=200)
+    image = Image.new("RGB", (32, 32), (200, 30, 30))
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.encode_text(t) for t in ["a dog", "a cat", "a car", "a boat"]),
+            batcher.encode_image(image),
+        )
+
+    *texts, img = asyncio.run(run())
+
+    assert batcher.stats()["batches"] == 1 and batcher.largest_batch == 5
+    assert np.allclose(np.stack(texts), encode_texts(["a dog", "a cat", "a car", "a boat"]), atol=1e-5)
+    assert np.allclose(img, encode_images([image])[0], atol=1e-5)
+
+
+def test_batches_are_capped_at_max_batch(fake_clip):
+    batcher = QueryBatcher(max_batch=3, window_ms=200)
+
+    async def run():
+        return await asyncio.gather(*(batcher.encode_text(f"query {i}") for i in range(7)))
+
+    assert len(asyncio.run(run())) == 7
+    assert batcher.items == 7 and batcher.largest_batch == 3 and batcher.batches >= 3
+
+
+def test_encoder_errors_reach_every_caller(fake_clip, monkeypatch):
+    def broken(texts):
+        raise RuntimeError("model fell over")
+
+    monkeypatch.setattr(embeddings, "encode_texts", broken)
+    batcher = QueryBatcher(max_batch=4, window_ms=100)
+
+    async def run():
+        return await asyncio.gather(batcher.encode_text("a"), batcher.encode_text("b"), return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(run())] == ["model fell over"] * 2
+
+
+def test_cache_lookups_stay_off_the_event_loop(fake_clip, monkeypatch):
+    threads = []
+    real_get = embeddings.query_cache.get
+    monkeypatch.setattr(embeddings.query_cache, "get", lambda key: threads.append(threading.current_thread().name) or real_get(key))
+    batcher = QueryBatcher(window_ms=1)
+
+    async def run():
+        await batcher.encode_text("a red car")
+        return await batcher.encode_text("a red car")  # cache hit
+
+    asyncio.run(run())
+
+    assert threads == ["query-encoder", "query-encoder"]
+
+
+def test_search_resolves_the_vector_store_off_the_event_loop(app_main, test_video, monkeypatch):
+    on_loop = []
+    real = app_main.get_vector_store
+
+    def get_vector_store():
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return real()
+
+    monkeypatch.setattr(app_main, "get_vector_store", get_vector_store)
+    client = TestClient(app_main.app)
+    uri = put_video(app_main, test_video)
+
+    for group_by_scene in ("false", "true"):
+        data = {"filename": uri, "text_search": "red", "group_by_scene": group_by_scene}
+        assert client.post("/search_embeddings", data=data).status_code == 200
+    assert client.post("/search_library", data={"text_search": "red"}).status_code == 200
+
+    assert on_loop and not any(on_loop)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from app import embeddings
+from app.embeddings import QueryEmbeddingCache, encode_texts
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_keys_ignore_case_and_whitespace():
+    assert QueryEmbeddingCache.key("m", "  A  red\tcar ") == QueryEmbeddingCache.key("m", "a red car")
+    assert QueryEmbeddingCache.key("m", "a red car") != QueryEmbeddingCache.key("other", "a red car")
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embeddings.time, "time", clock.time)
+    cache = QueryEmbeddingCache(max_entries=2, ttl_s=60, disk_dir=None)
+    for k in ("a", "b"):
+        cache.put(k, np.full(4, ord(k), np.float32))
+    cache.get("a")       # "b" is now the least recently used
+    cache.put("c", np.zeros(4, np.float32))
+    assert cache.get("b") is None and cache.get("a") is not None
+    with pytest.raises(ValueError):
+        cache.get("c")[0] = 1.0  # shared vectors are read-only
+    clock.now += 61
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 2
+
+
+def test_disk_tier_is_shared_between_caches(tmp_path):
+    first = QueryEmbeddingCache(disk_dir=str(tmp_path))
+    first.put("k", np.arange(4, dtype=np.float32))
+    second = QueryEmbeddingCache(disk_dir=str(tmp_path))
+    assert np.array_equal(second.get("k"), np.arange(4))
+    assert second.stats()["disk_hits"] == 1
+    second.get("k")
+    assert second.stats()["hits"] == 1  # promoted to memory
+
+
+def test_encode_texts_runs_the_model_once_per_distinct_query(fake_clip, monkeypatch):
+    monkeypatch.setattr(embeddings, "query_cache", QueryEmbeddingCache(disk_dir=None))
+    calls = []
+    real = fake_clip.text_features
+    monkeypatch.setattr(fake_clip, "text_features", lambda ids, mask: calls.append(len(ids)) or real(ids, mask))
+
+    out = encode_texts(["a dog", "A  Dog", "a cat"])
+    assert calls == [2]
+    assert np.array_equal(out[0], out[1]) and not np.array_equal(out[0], out[2])
+    again = encode_texts(["a cat", "a dog"])
+    assert calls == [2]
+    assert np.array_equal(again, out[[2, 0]])
@@ -0,0 +1,105 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.ingest import video_id_from_s3_uri
+from app.reindex import ActiveIndex, activate_version, list_videos, read_ahead, reindex_library
+from tests.conftest import put_video
+
+
+def test_ingest_after_activation_counts_as_done_in_that_version(app_main, test_video):
+    s3, store = app_main.s3, app_main.get_vector_store()
+    old = app_main.SplitShotsRequest(source_s3_uri=put_video(app_main, test_video, "old"), stream_source=False)
+    app_main.run_split_shots(old)
+    assert reindex_library(s3, store, "test", "v2")["reindexed"] == 1
+    activate_version(s3, "test", app_main.active_index, "v2")
+
+    new = app_main.SplitShotsRequest(source_s3_uri=put_video(app_main, test_video, "new"), stream_source=False)
+    app_main.run_split_shots(new)
+
+    assert all("v2" in v["versions"] for v in list_videos(s3, "test").values())
+    assert activate_version(s3, "test", app_main.active_index, "v2")["version"] == "v2"
+    result = reindex_library(s3, store, "test", "v2")
+    assert (result["reindexed"], result["already_done"]) == (0, 2)
+    # The new video has nothing in the original namespaces, so a plain rollback would hide it.
+    with pytest.raises(ValueError, match="1 videos were ingested into a later version only"):
+        activate_version(s3, "test", app_main.active_index, "")
+    assert activate_version(s3, "test", app_main.active_index, "", force=True)["version"] == ""
+
+
+def test_read_ahead_bounds_submitted_calls():
+    started = []
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for i, out in enumerate(read_ahead(pool, lambda x: started.append(x) or x * 2, range(20), depth=3)):
+            assert out == i * 2
+            assert len(started) <= i + 3
+    assert sorted(started) == list(range(20))
+
+
+def test_reindex_upserts_while_thumbnails_are_still_being_fetched(app_main, test_video):
+    s3, store = app_main.s3, app_main.get_vector_store()
+    app_main.run_split_shots(app_main.SplitShotsRequest(source_s3_uri=put_video(app_main, test_video), threshold=10,
+                                                        stream_source=False))
+    events, lock = [], threading.Lock()
+    real_get, real_upsert = s3.get_object, store.upsert
+
+    def get_object(Bucket, Key, **kw):
+        if "/thumbnails/" in Key:
+            time.sleep(0.01)
+            with lock:
+                events.append("get")
+        return real_get(Bucket=Bucket, Key=Key, **kw)
+
+    def upsert(vectors, namespace):
+        with lock:
+            events.append("upsert")
+        real_upsert(vectors, namespace)
+
+    s3.get_object, store.upsert = get_object, upsert
+    assert reindex_library(s3, store, "test", "v2")["reindexed"] == 1
+
+    assert events.count("get") >= 12
+    assert events.index("upsert") < len(events) - 1 - events[::-1].index("get")  # first upsert before the last GET
+
+
+def test_ingest_reads_an_activation_made_by_another_process(app_main, test_video):
+    s3, store = app_main.s3, app_main.get_vector_store()
+    app_main.run_split_shots(app_main.SplitShotsRequest(source_s3_uri=put_video(app_main, test_video, "old"),
+                                                        stream_source=False))
+    reindex_library(s3, store, "test", "v2")
+    assert app_main.active_index.version() == ""  # cached in this process
+    activate_version(s3, "test", ActiveIndex(s3, "test"), "v2")  # another process switches
+
+    uri = put_video(app_main, test_video, "new")
+    res = app_main.run_split_shots(app_main.SplitShotsRequest(source_s3_uri=uri, stream_source=False))
+
+    vid = video_id_from_s3_uri(uri)
+    assert res.pc_namespace == f"{vid}__v2"
+    assert store.query(np.ones(768), top_k=1, namespace=f"{vid}__v2")
+    assert not store.query(np.ones(768), top_k=1, namespace=vid)
+
+
+def test_a_version_activated_mid_ingest_gets_the_video_too(app_main, test_video):
+    s3, store = app_main.s3, app_main.get_vector_store()
+    real_upsert = store.upsert
+    other = ActiveIndex(s3, "test")
+
+    def upsert(vectors, namespace):
+        real_upsert(vectors, namespace)
+        if other.version(max_age=0) != "v2":
+            other.activate("v2")  # forced, while this ingest writes the original namespace
+
+    store.upsert = upsert
+    uri = put_video(app_main, test_video)
+    res = app_main.run_split_shots(app_main.SplitShotsRequest(source_s3_uri=uri, stream_source=False))
+
+    vid = video_id_from_s3_uri(uri)
+    rows = sum(len(t) for t in res.thumbnail_s3_uris_by_scene)
+    for namespace in (vid, f"{vid}__v2"):
+        assert len(store.query(np.ones(768), top_k=100, namespace=namespace)) == rows
+    assert res.pc_namespace == f"{vid}__v2"
+    assert res.embeddings_s3_uri.endswith("/index/v2/embeddings.npy")
+    assert res.embeddings_s3_uri[len("s3://test/"):] in s3.objects
+    assert all("v2" in v["versions"] for v in list_videos(s3, "test").values())
@@ -0,0 +1,116 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from tests.conftest import put_video
+
+
+def test_failed_upsert_resumes_and_lands_every_row_once(app_main, test_video):
+    from app import vector_store
+
+    store = vector_store.get_vector_store()
+    real_upsert = store.upsert
+    landed = Counter()
+    calls = [0]
+
+    def flaky_upsert(vectors, namespace):
+        calls[0] += 1
+        if calls[0] == 2:
+            raise RuntimeError("index unavailable")
+        real_upsert(vectors, namespace)
+        landed.update(v[0] for v in vectors)
+
+    store.upsert = flaky_upsert
+    uri = put_video(app_main, test_video)
+    req = app_main.SplitShotsRequest(source_s3_uri=uri, stream_source=False)
+
+    with pytest.raises(RuntimeError, match="index unavailable"):
+        app_main.run_split_shots(req)
+    first_run = sum(landed.values())
+
+    stages = []
+    res = app_main.run_split_shots(req, lambda stage, **info: stages.append((stage, info)))
+
+    assert not res.already_processed
+    resumed = [info["resume_from"] for stage, info in stages if stage == "resume"]
+    assert resumed and resumed[0] in ("thumbnails", "embeddings", "upsert")
+    assert "detect" not in [s for s, _ in stages]  # resumed from the checkpoint, no second decode
+    rows = sum(len(scene) for scene in res.thumbnail_s3_uris_by_scene)
+    assert 0 < first_run < rows
+    assert set(landed.values()) == {1}
+    assert len(landed) == rows
+    assert app_main.run_split_shots(req).already_processed
+
+
+def test_a_dropped_checkpoint_takes_its_vectors_and_thumbnails_with_it(app_main, test_video):
+    from app import vector_store
+    from app.ingest import video_id_from_s3_uri
+
+    store = vector_store.get_vector_store()
+    real_upsert = store.upsert
+    calls = [0]
+
+    def flaky_upsert(vectors, namespace):
+        calls[0] += 1
+        if calls[0] == 3:
+            raise RuntimeError("index unavailable")
+        real_upsert(vectors, namespace)
+
+    store.upsert = flaky_upsert
+    uri = put_video(app_main, test_video)
+    vid = video_id_from_s3_uri(uri)
+    with pytest.raises(RuntimeError, match="index unavailable"):
+        app_main.run_split_shots(app_main.SplitShotsRequest(source_s3_uri=uri, threshold=10, stream_source=False))
+    store.upsert = real_upsert
+    stale = {m["id"] for m in store.query(np.ones(768), top_k=100, namespace=vid)}
+    assert any(i.endswith(":t01") for i in stale)
+
+    # Different parameters: the checkpoint is dropped and the video decoded again
+    res = app_main.run_split_shots(app_main.SplitShotsRequest(
+        source_s3_uri=uri, threshold=10, max_thumbs_per_scene=1, stream_source=False))
+
+    assert [len(t) for t in res.thumbnail_s3_uris_by_scene] == [1] * 6
+    ids = {m["id"] for m in store.query(np.ones(768), top_k=100, namespace=vid)}
+    assert ids == {f"{vid}:s{i:03d}:t00" for i in range(6)}
+    thumbs_prefix = uri[len("s3://test/"):] + "/thumbnails/"
+    kept = {k for k in app_main.s3.objects if k.startswith(thumbs_prefix)}
+    assert kept == {u[len("s3://test/"):] for scene in res.thumbnail_s3_uris_by_scene for u in scene}
+
+
+def test_resume_through_job_runner(app_main, test_video):
+    from app import vector_store
+
+    store = vector_store.get_vector_store()
+    real_upsert = store.upsert
+    fail = [True]
+
+    def flaky_upsert(vectors, namespace):
+        if fail[0]:
+            fail[0] = False
+            raise RuntimeError("index unavailable")
+        real_upsert(vectors, namespace)
+
+    store.upsert = flaky_upsert
+    uri = put_video(app_main, test_video, "jobfilm")
+    req = app_main.SplitShotsRequest(source_s3_uri=uri, stream_source=False)
+    job, _ = app_main.job_runner.submit("resume", req)
+    job = _wait(app_main, job["id"])
+    assert job["status"] == "failed" and "index unavailable" in job["error"], job
+
+    job, _ = app_main.job_runner.submit("resume", req)
+    job = _wait(app_main, job["id"])
+    assert job["status"] == "succeeded", job
+    assert any(s["name"] == "resume" and s["resume_from"] != "shots" for s in job["stages"])
+
+
+def _wait(main, job_id: str, timeout: float = 60.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = main.job_store.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
@@ -0,0 +1,86 @@
+import os, threading, time
+
+import pytest
+
+from app.scratch import ScratchQuotaTimeout, ScratchSpace
+from tests.conftest import put_video
+
+
+def test_workspace_is_removed_on_success_and_failure(tmp_path):
+    space = ScratchSpace(str(tmp_path))
+
+    with space.workspace("job_") as ok:
+        with open(os.path.join(ok, "video.mp4"), "wb") as f:
+            f.write(b"x" * 1000)
+        assert space.stats() == {"root": str(tmp_path), "quota_bytes": 0, "reserved_bytes": 0,
+                                 "workspaces": 1, "waiting": 0, "held_bytes": 1000}
+    with pytest.raises(RuntimeError):
+        with space.workspace("job_") as failed:
+            os.makedirs(os.path.join(failed, "thumbnails"))
+            raise RuntimeError("decode failed")
+
+    assert not os.path.exists(ok) and not os.path.exists(failed)
+    assert os.listdir(tmp_path) == []
+    assert space.stats()["workspaces"] == 0
+
+
+def test_jobs_wait_for_quota_and_start_when_space_frees(tmp_path):
+    space = ScratchSpace(str(tmp_path), quota_bytes=100)
+    started = threading.Event()
+
+    def second_job():
+        with space.workspace("b_", reserve_bytes=60):
+            started.set()
+
+    with space.workspace("a_", reserve_bytes=60):
+        t = threading.Thread(target=second_job)
+        t.start()
+        time.sleep(0.2)
+        assert not started.is_set()
+        assert space.stats(held=False) == {"root": str(tmp_path), "quota_bytes": 100, "reserved_bytes": 60,
+                                           "workspaces": 1, "waiting": 1}
+        with space.workspace("c_", reserve_bytes=40):  # still fits alongside the first
+            pass
+    t.join(5)
+    assert started.is_set() and space.stats(held=False)["reserved_bytes"] == 0
+
+
+def test_wait_times_out(tmp_path):
+    space = ScratchSpace(str(tmp_path), quota_bytes=100)
+    with space.workspace("a_", reserve_bytes=80):
+        with pytest.raises(ScratchQuotaTimeout, match="80/100 reserved"):
+            with space.workspace("b_", reserve_bytes=30, timeout=0.1):
+                pass
+        assert space.stats(held=False)["waiting"] == 0
+
+
+def test_job_larger_than_the_quota_runs_alone(tmp_path):
+    space = ScratchSpace(str(tmp_path), quota_bytes=100)
+    with space.workspace("big_", reserve_bytes=500):
+        assert space.stats(held=False)["reserved_bytes"] == 500
+        with pytest.raises(ScratchQuotaTimeout):
+            with space.workspace("small_", reserve_bytes=1, timeout=0.05):
+                pass
+
+
+def test_ingest_leaves_no_scratch_behind(app_main, test_video):
+    uri = put_video(app_main, test_video)
+    root = app_main.scratch.root
+    before = set(os.listdir(root))
+    real_upload = app_main.s3.upload_file
+    down = [True]
+
+    def upload_file(*args, **kwargs):
+        if down[0]:
+            raise OSError("S3 down")
+        return real_upload(*args, **kwargs)
+
+    app_main.s3.upload_file = upload_file
+    with pytest.raises(OSError, match="S3 down"):
+        app_main.run_split_shots(app_main.SplitShotsRequest(source_s3_uri=uri, stream_source=False))
+    assert set(os.listdir(root)) == before
+
+    down[0] = False
+    app_main.run_split_shots(app_main.SplitShotsRequest(source_s3_uri=uri, stream_source=False))
+    assert set(os.listdir(root)) == before
+    assert app_main.scratch.stats(held=False)["reserved_bytes"] == 0
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.vector_store import aggregate_scenes
+from tests.conftest import put_video
+
+
+def match(vid, scene, thumb, score, values=None):
+    m = {"id": f"{vid}:s{scene:03d}:t{thumb:02d}", "score": score,
+         "metadata": {"video_id": vid, "scene_index": scene, "thumb_index": thumb}}
+    if values is not None:
+        m["values"] = np.asarray(values, np.float32)
+    return m
+
+
+def test_scenes_pool_their_thumbnails():
+    matches = [match("v", 1, 0, 0.9), match("v", 2, 0, 0.8), match("v", 2, 1, 0.7), match("v", 1, 1, 0.1)]
+    by_max = aggregate_scenes(matches, top_k=5, pooling="max")
+    assert [(s["best"]["id"], s["score"]) for s in by_max] == [("v:s001:t00", 0.9), ("v:s002:t00", 0.8)]
+    assert [t["id"] for t in by_max[0]["thumbs"]] == ["v:s001:t00", "v:s001:t01"]
+    by_mean = aggregate_scenes(matches, top_k=1, pooling="mean")
+    assert [s["best"]["id"] for s in by_mean] == ["v:s002:t00"]
+    assert by_mean[0]["score"] == pytest.approx(0.75)
+    with pytest.raises(ValueError, match="pooling"):
+        aggregate_scenes(matches, top_k=5, pooling="median")
+
+
+def test_near_identical_adjacent_scenes_are_dropped():
+    matches = [match("v", 3, 0, 0.9, [1, 0]), match("v", 4, 0, 0.85, [0.99, 0.1]),
+               match("v", 6, 0, 0.8, [1, 0]), match("w", 4, 0, 0.7, [1, 0])]
+    kept = aggregate_scenes(matches, top_k=5, dedupe_threshold=0.95)
+    # scene 4 repeats its neighbour 3; scene 6 is not adjacent and "w" is another video
+    assert [s["best"]["id"] for s in kept] == ["v:s003:t00", "v:s006:t00", "w:s004:t00"]
+
+
+def test_invalid_search_parameters_are_rejected_with_400(app_main, test_video):
+    client = TestClient(app_main.app)
+    uri = put_video(app_main, test_video)
+    base = {"filename": uri, "text_search": "red", "group_by_scene": "true"}
+    res = client.post("/search_embeddings", data={**base, "pooling": "median"})
+    assert res.status_code == 400 and "pooling" in res.json()["detail"]
+    res = client.post("/search_embeddings", data={**base, "time_field": "end_s", "t_min": "1"})
+    assert res.status_code == 400
+    assert client.post("/search_embeddings", data={**base, "pooling": "mean"}).status_code == 200
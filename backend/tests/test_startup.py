@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_loads_no_model_and_no_index():
+    code = (
+        "import sys, app.main\n"
+        "from app import embeddings, vector_store\n"
+        "print(embeddings.is_model_loaded(), vector_store.is_vector_store_ready(),\n"
+        "      any(m in sys.modules for m in ('torch', 'transformers', 'pinecone')))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=dict(os.environ),
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1].split() == ["False", "False", "False"]
+
+
+def test_readyz_reports_not_ready_until_the_model_loads(app_main, monkeypatch):
+    from app import embeddings
+
+    client = TestClient(app_main.app)
+    assert client.get("/healthz").json() == {"status": "ok"}
+    monkeypatch.setattr(embeddings, "_clip", None)
+    res = client.get("/readyz")
+    assert res.status_code == 503 and res.json()["model_loaded"] is False
+
+    def no_weights():
+        raise OSError("no weights")
+
+    monkeypatch.setattr(app_main, "get_clip", no_weights)
+    monkeypatch.setitem(app_main.warmup_state, "error", None)
+    app_main.warm_up()
+    assert client.get("/readyz").json()["error"] == "no weights"
+
+
+def test_readyz_is_ready_once_loaded(app_main):
+    res = TestClient(app_main.app).get("/readyz")
+    assert res.status_code == 200
+    assert res.json()["clip"] == {"engine": "fake", "loaded": True, "parity_min_cosine": None}
@@ -0,0 +1,47 @@
+from app import storage
+from app.storage import PresignCache
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_presign_cache_reuses_until_near_expiry(mem_s3, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(storage.time, "time", clock.time)
+    cache = PresignCache(min_remaining=0.5)
+
+    url, expires_at = cache.url(mem_s3, "get_object", "test", "a.jpg", 1000)
+    assert expires_at == clock.now + 1000
+    clock.now += 400  # 600 of 1000 seconds left
+    assert cache.url(mem_s3, "get_object", "test", "a.jpg", 1000) == (url, expires_at)
+    clock.now += 200  # 400 left: below half the lifetime, signed again
+    _, renewed = cache.url(mem_s3, "get_object", "test", "a.jpg", 1000)
+    assert renewed == clock.now + 1000
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_presign_cache_never_hands_out_more_lifetime_than_asked(mem_s3, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(storage.time, "time", clock.time)
+    cache = PresignCache(min_remaining=0.5)
+
+    cache.url(mem_s3, "get_object", "test", "a.jpg", 3600)
+    _, expires_at = cache.url(mem_s3, "get_object", "test", "a.jpg", 600)
+    assert expires_at == clock.now + 600
+    # other methods and parameters are separate entries
+    cache.url(mem_s3, "put_object", "test", "a.jpg", 600, ContentType="image/jpeg")
+    assert cache.stats()["misses"] == 3
+
+
+def test_presign_cache_is_bounded(mem_s3):
+    cache = PresignCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.url(mem_s3, "get_object", "test", key, 600)
+    assert cache.stats()["entries"] == 2
+    cache.url(mem_s3, "get_object", "test", "a", 600)
+    assert cache.stats()["hits"] == 0  # "a" was the least recently used and got evicted
@@ -0,0 +1,105 @@
+import os, re, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tests.conftest import put_video
+
+
+class RangeServer:
+    """Serves in-memory objects over HTTP with Range support, standing in for presigned S3 GETs."""
+    def __init__(self):
+        self.objects = {}
+        self.ranges = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = server.objects.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                m = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                start, stop = (int(m.group(1)), int(m.group(2) or len(body) - 1) + 1) if m else (0, len(body))
+                server.ranges.append((start, stop))
+                self.send_response(206 if m else 200)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(stop - start))
+                if m:
+                    self.send_header("Content-Range", f"bytes {start}-{stop - 1}/{len(body)}")
+                self.end_headers()
+                self.wfile.write(body[start:stop])
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def range_server(app_main, monkeypatch):
+    """Presigned URLs from main.s3 point at a local range server serving the same objects."""
+    server = RangeServer()
+    signed = []
+
+    def generate_presigned_url(ClientMethod, Params, ExpiresIn=3600, **_):
+        signed.append(ExpiresIn)
+        path = f"/{Params['Bucket']}/{Params['Key']}"
+        server.objects[path] = app_main.s3.objects[Params["Key"]]
+        return server.base + path
+
+    monkeypatch.setattr(app_main.s3, "generate_presigned_url", generate_presigned_url)
+    server.signed = signed
+    yield server
+    server.httpd.shutdown()
+
+
+def no_download(*args, **kwargs):
+    raise AssertionError("streamed ingest downloaded the source video")
+
+
+def test_streamed_ingest_matches_a_local_one(app_main, test_video, range_server, monkeypatch):
+    uri = put_video(app_main, test_video)
+    local = app_main.run_split_shots(app_main.SplitShotsRequest(source_s3_uri=uri, threshold=10, stream_source=False))
+    streamed_uri = put_video(app_main, test_video, name="streamed")
+    monkeypatch.setattr(app_main.s3, "download_file", no_download)
+
+    stages = []
+    streamed = app_main.run_split_shots(
+        app_main.SplitShotsRequest(source_s3_uri=streamed_uri, threshold=10, stream_source=True),
+        lambda stage, **info: stages.append((stage, info)),
+    )
+
+    assert "download" not in [s for s, _ in stages]
+    reserved = [info["reserve_bytes"] for s, info in stages if s == "scratch"]
+    assert reserved == [app_main.SCRATCH_THUMB_BYTES]  # no room set aside for the video
+    assert len(streamed.shots) == len(local.shots) == 6
+    assert [(s.start_frame, s.end_frame) for s in streamed.shots] == [(s.start_frame, s.end_frame) for s in local.shots]
+    assert [len(t) for t in streamed.thumbnail_s3_uris_by_scene] == [len(t) for t in local.thumbnail_s3_uris_by_scene]
+    assert range_server.ranges  # the decoder read the object over HTTP
+
+
+def test_stream_urls_are_signed_fresh_for_the_full_ttl(app_main, range_server):
+    app_main.s3.put_bytes("videos/a.avi", b"video")
+    assert app_main.stream_url("test", "videos/a.avi") == app_main.stream_url("test", "videos/a.avi")
+    assert range_server.signed == [app_main.STREAM_URL_TTL] * 2  # never served from presign_cache
+
+
+def test_resolve_local_video_streams_or_downloads_into_scratch(app_main, test_video, range_server, monkeypatch):
+    uri = put_video(app_main, test_video)
+    key = uri[len("s3://test/"):]
+
+    with app_main.resolve_local_video(uri) as (path, bucket, got_key):
+        assert (bucket, got_key) == ("test", key)
+        assert os.path.getsize(path) == os.path.getsize(test_video)
+        scratch_dir = os.path.dirname(path)
+    assert not os.path.exists(scratch_dir)  # removed with the workspace
+
+    monkeypatch.setattr(app_main.s3, "download_file", no_download)
+    with app_main.resolve_local_video(uri, stream=True) as (url, bucket, got_key):
+        assert url == f"{range_server.base}/test/{key}" and got_key == key
+
+    with app_main.resolve_local_video("/data/film.mp4") as resolved:
+        assert resolved == ("/data/film.mp4", None, None)
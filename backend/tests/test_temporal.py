@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from app.temporal import search_windows
+
+
+def scores_for(rows):
+    return np.asarray(rows, dtype=np.float32)
+
+
+def test_sequence_mode_keeps_query_order():
+    # query 0 matches scene 1, query 1 matches scenes 0 and 3: only 1 -> 3 is in order
+    scores = scores_for([[0.0, 0.9], [0.8, 0.0], [0.0, 0.0], [0.0, 0.7], [0.0, 0.0]])
+    best = search_windows(scores, window=3, top_k=1, mode="sequence")[0]
+    assert best["scenes"] == [1, 3]
+    assert best["score"] == pytest.approx(0.75)
+
+
+def test_window_mode_ignores_order():
+    scores = scores_for([[0.0, 0.9], [0.8, 0.0], [0.0, 0.0], [0.0, 0.7], [0.0, 0.0]])
+    best = search_windows(scores, window=2, top_k=1, mode="window")[0]
+    assert best["scenes"] == [1, 0]
+    assert best["score"] == pytest.approx(0.85)
+
+
+def test_overlapping_windows_are_suppressed():
+    scores = scores_for([[0.9], [0.8], [0.1], [0.7]])
+    results = search_windows(scores, window=1, top_k=10, mode="window")
+    assert [r["scenes"] for r in results] == [[0], [1], [3], [2]]
+    two = search_windows(scores_for([[0.9, 0.9], [0.8, 0.8], [0.0, 0.0], [0.5, 0.6]]), window=2, top_k=10)
+    spans = [set(range(min(r["scenes"]), max(r["scenes"]) + 1)) for r in two]
+    assert all(not (a & b) for i, a in enumerate(spans) for b in spans[i + 1:])
+
+
+def test_search_windows_edge_cases():
+    assert search_windows(np.zeros((0, 2), np.float32), window=3, top_k=5) == []
+    # a window longer than the video is clamped to it
+    assert search_windows(scores_for([[0.5, 0.1], [0.2, 0.6]]), window=10, top_k=5)[0]["scenes"] == [0, 1]
+    with pytest.raises(ValueError, match="mode"):
+        search_windows(scores_for([[0.5]]), window=1, top_k=1, mode="bogus")
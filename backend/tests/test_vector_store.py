@@ -0,0 +1,134 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app import vector_store
+from app.vector_store import LocalVectorStore, search_library, time_range_filter
+
+
+def unit(i: int, dim: int = 8) -> np.ndarray:
+    v = np.zeros(dim, np.float32)
+    v[i] = 1.0
+    return v
+
+
+def test_local_store_ranks_by_cosine_and_persists(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([(f"v:s{i:03d}:t00", unit(i) * (i + 1), {"scene_index": i}) for i in range(4)], namespace="v")
+    q = unit(2) + 0.5 * unit(1)
+    matches = store.query(q, top_k=2, namespace="v", include_values=True)
+    assert [m["id"] for m in matches] == ["v:s002:t00", "v:s001:t00"]
+    assert matches[0]["score"] == pytest.approx(2 / np.sqrt(5), rel=1e-5)  # rows are stored unit length
+    assert np.allclose(matches[0]["values"], unit(2))
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.list_namespaces() == ["v"]
+    assert [m["id"] for m in reopened.query(q, top_k=2, namespace="v")] == ["v:s002:t00", "v:s001:t00"]
+    assert reopened.query(q, top_k=2, namespace="empty") == []
+
+
+def test_upserting_an_existing_id_replaces_its_row(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([("a", unit(0), {"n": 1}), ("b", unit(1), {"n": 2})], namespace="v")
+    store.upsert([("a", unit(3), {"n": 3})], namespace="v")
+    matches = store.query(unit(3), top_k=5, namespace="v")
+    assert len(matches) == 2
+    assert (matches[0]["id"], matches[0]["metadata"]) == ("a", {"n": 3})
+    assert [m["metadata"]["n"] for m in LocalVectorStore(str(tmp_path)).query(unit(3), 1, "v")] == [3]
+    with pytest.raises(ValueError, match="dim"):
+        store.upsert([("c", np.ones(4, np.float32), {})], namespace="v")
+
+
+def test_deleted_ids_stop_matching_and_can_come_back(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([(k, unit(i), {"t_sec": i}) for i, k in enumerate("abcd")], namespace="v")
+    store.delete(["b", "c", "missing"], namespace="v")
+    store.delete(["a"], namespace="other")  # unknown namespace: nothing to do
+
+    def ids(s, **kw):
+        return sorted(m["id"] for m in s.query(unit(1) + unit(2), top_k=10, namespace="v", **kw))
+
+    assert ids(store) == ["a", "d"]
+    assert ids(store, filter=time_range_filter(1, None)) == ["d"]
+    assert ids(LocalVectorStore(str(tmp_path))) == ["a", "d"]  # deletes persist
+    store.upsert([("b", unit(1), {"t_sec": 1})], namespace="v")
+    assert ids(store) == ["a", "b", "d"]
+    assert ids(LocalVectorStore(str(tmp_path))) == ["a", "b", "d"]
+
+
+def test_ivf_probing_finds_the_nearest_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "LOCAL_IVF_MIN_ROWS", 100)
+    rng = np.random.default_rng(1)
+    mat = rng.standard_normal((400, 16)).astype(np.float32)
+    store = LocalVectorStore(str(tmp_path), nprobe=20)  # every list: same answer as a full scan
+    store.upsert([(str(i), v, {}) for i, v in enumerate(mat)], namespace="v")
+    q = mat[123] + 0.01 * rng.standard_normal(16).astype(np.float32)
+    assert store._ns("v").ivf() is not None
+    assert store.query(q, top_k=1, namespace="v")[0]["id"] == "123"
+
+
+@pytest.fixture
+def timed_store(tmp_path) -> LocalVectorStore:
+    store = LocalVectorStore(str(tmp_path / "index"))
+    rng = np.random.default_rng(0)
+    store.upsert([
+        (f"v:s{i:03d}:t00", rng.standard_normal(8).astype(np.float32),
+         {"t_sec": 10.0 * i + 2.0, "start_s": 10.0 * i, "scene_index": i})
+        for i in range(10)
+    ], namespace="v")
+    return store
+
+
+def test_time_range_filter_builds_pinecone_conditions():
+    assert time_range_filter(None, None) is None
+    assert time_range_filter(30, None) == {"t_sec": {"$gte": 30.0}}
+    assert time_range_filter(30, 60, field="start_s") == {"start_s": {"$gte": 30.0, "$lte": 60.0}}
+    with pytest.raises(ValueError):
+        time_range_filter(0, 1, field="end_s")
+
+
+@pytest.mark.parametrize("field, t_min, t_max, scenes", [
+    ("t_sec", 30, 60, {3, 4, 5}),      # t_sec 32, 42, 52
+    ("start_s", 30, 60, {3, 4, 5, 6}),  # start_s 30 .. 60 inclusive
+    ("t_sec", None, 15, {0, 1}),
+    ("t_sec", 85, None, {9}),
+])
+def test_local_store_applies_time_range(timed_store, field, t_min, t_max, scenes):
+    matches = timed_store.query(np.ones(8, np.float32), top_k=10, namespace="v",
+                                filter=time_range_filter(t_min, t_max, field))
+    assert {m["metadata"]["scene_index"] for m in matches} == scenes
+
+
+def test_search_library_merges_namespaces_into_one_ranking(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([("a0", unit(0), {}), ("a1", unit(1) + 0.2 * unit(0), {})], namespace="a")
+    store.upsert([("b0", unit(0) + 0.1 * unit(1), {}), ("b1", unit(2), {})], namespace="b")
+    res = search_library(store, unit(0), top_k=3)
+    assert [(m["namespace"], m["id"]) for m in res["matches"]] == [("a", "a0"), ("b", "b0"), ("a", "a1")]
+    assert (res["searched"], res["timed_out"], res["failed"]) == (2, [], {})
+    assert [m["id"] for m in search_library(store, unit(0), top_k=5, namespaces=["b"])["matches"]] == ["b0", "b1"]
+
+
+def test_search_library_reports_slow_and_failing_namespaces(tmp_path):
+    release = threading.Event()
+    store = LocalVectorStore(str(tmp_path))
+    for ns in ("fast", "slow", "broken"):
+        store.upsert([(f"{ns}0", unit(0), {})], namespace=ns)
+    real_query = store.query
+
+    def query(vector, top_k, namespace, *args):
+        if namespace == "slow":
+            release.wait(5)
+        if namespace == "broken":
+            raise RuntimeError("shard offline")
+        return real_query(vector, top_k, namespace, *args)
+
+    store.query = query
+    try:
+        res = search_library(store, unit(0), top_k=5, timeout_s=0.2)
+    finally:
+        release.set()
+    assert [m["id"] for m in res["matches"]] == ["fast0"]
+    assert res["timed_out"] == ["slow"] and res["failed"] == {"broken": "shard offline"}
+    assert res["searched"] == 1
@@ -0,0 +1,75 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app import video
+from app.video import ShotFrameBuffer, ShotStream, detect_and_capture, detect_scenes, pick_timepoints, prune_keyframes
+from tests.conftest import SHOT_COLOURS
+
+
+def test_all_thumbnails_come_from_one_decode(test_video, tmp_path, monkeypatch):
+    opened = []
+    real_capture = cv2.VideoCapture
+
+    def counting_capture(*args, **kwargs):
+        opened.append(args)
+        return real_capture(*args, **kwargs)
+
+    monkeypatch.setattr(video.cv2, "VideoCapture", counting_capture)
+    shots, paths, times, fps = detect_and_capture(
+        test_video, threshold=10.0, min_scene_len=5, out_dir=str(tmp_path), per_scene=3,
+        dedupe_threshold=None, workers=1,
+    )
+    assert len(opened) == 1
+    assert fps == pytest.approx(24.0)
+    assert len(shots) == len(SHOT_COLOURS)
+    for i, (shot, scene_paths, scene_times) in enumerate(zip(shots, paths, times)):
+        assert [os.path.basename(p) for p in scene_paths] == [f"shot-{i:03d}_{j:02d}.jpg" for j in (1, 2, 3)]
+        assert all(os.path.getsize(p) > 0 for p in scene_paths)
+        for t, want in zip(scene_times, pick_timepoints(shot[0], shot[1], 3)):
+            assert shot[0] <= t < shot[1]
+            assert abs(t - want) <= 2 / fps
+
+
+def test_shot_buffer_holds_thumbnail_sized_frames_within_budget():
+    frame = np.zeros((2160, 3840, 3), np.uint8)  # 4K: ~25 MB at full size
+    buf = ShotFrameBuffer(max_bytes=8 * 1024 * 1024, max_side=640)
+    for i in range(24 * 60):
+        buf.offer(i, frame)
+        assert buf.nbytes <= buf.max_bytes
+    kept = buf.take_before(24 * 60)
+    assert all(f.shape == (360, 640, 3) for _, f in kept)
+    assert len(kept) >= buf.max_bytes // kept[0][1].nbytes // 2  # halving leaves at least half the budget used
+    idx = [i for i, _ in kept]
+    assert idx[0] == 0 and len({b - a for a, b in zip(idx, idx[1:])}) == 1  # evenly spaced
+    assert buf.nbytes == 0 and buf.stride == 1
+
+
+def test_shot_stream_matches_scene_detection_and_shrinks_keyframes(test_video):
+    stream = ShotStream(test_video, threshold=10.0, min_scene_len=5, per_scene=2, max_side=80)
+    out = list(stream)
+    _, detected = detect_scenes(test_video, threshold=10.0, min_scene_len=5)
+    assert [shot[2:] for shot, _ in out] == [s[2:] for s in detected]
+    for (start_s, end_s, _, _), keyframes in out:
+        assert len(keyframes) == 2
+        assert all(start_s <= t < end_s and f.shape == (60, 80, 3) for t, f in keyframes)
+
+
+def test_near_duplicate_keyframes_are_pruned_within_a_shot():
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    noisy = np.clip(base.astype(np.int16) + rng.integers(-2, 3, base.shape), 0, 255).astype(np.uint8)
+    other = rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    kept = prune_keyframes([(1.0, base), (1.5, noisy), (2.0, other), (2.5, base)], threshold=0.92)
+    assert [t for t, _ in kept] == [1.0, 2.0]
+    assert [t for t, _ in prune_keyframes([(1.0, base), (1.5, noisy)], threshold=1.01)] == [1.0, 1.5]
+
+
+def test_static_shots_keep_one_thumbnail(test_video, tmp_path):
+    kwargs = dict(threshold=10.0, min_scene_len=5, per_scene=3, workers=1)
+    _, all_paths, _, _ = detect_and_capture(test_video, out_dir=str(tmp_path / "all"), dedupe_threshold=None, **kwargs)
+    _, paths, _, _ = detect_and_capture(test_video, out_dir=str(tmp_path / "pruned"), dedupe_threshold=0.5, **kwargs)
+    assert all(len(p) == 3 for p in all_paths)
+    assert all(len(p) == 1 for p in paths)  # flat colour plus a frame counter: one thumbnail per shot